@@ -0,0 +1,184 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from metrics import ANALYSIS_HEDGES, FALLBACKS
+import logging
+
+# Number of background threads generating analyses in each web worker process
+ANALYSIS_WORKERS = int(os.environ.get('ANALYSIS_WORKERS', '4'))
+
+# Stored in place of the analysis when generation fails, so the case stops being pending
+ANALYSIS_FAILED_MESSAGE = "We apologize, but we are unable to generate a detailed analysis at this time. Please try again later."
+
+class AnalysisJobQueue:
+    """
+    Background pool that generates case analyses off the request thread and
+    writes them to Case.analysis. The database stays the source of truth:
+    a case is pending until its analysis column is filled in.
+    """
+
+    def __init__(self, app, processor, max_workers=None):
+        """
+        Args:
+            app (Flask): Application, for the database context of worker threads
+            processor (LegalQueryProcessor): Processor that generates the analysis
+            max_workers (int): Worker threads; defaults to ANALYSIS_WORKERS
+        """
+        self.app = app
+        self.processor = processor
+        self.max_workers = max_workers or ANALYSIS_WORKERS
+        self.executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='analysis')
+        self.lock = threading.Lock()
+        self.queued = 0
+        self.running = 0
+        self.completed = 0
+        self.failed = 0
+        # Upgrades that left the template analysis in place because the model gave no answer
+        self.kept = 0
+        # Events set when a case's job finishes, so waiters in this process wake immediately
+        self.done_events = {}
+        logging.info("Analysis job queue started with %d workers", self.max_workers)
+
+    def submit(self, case_id, case_details, results, upgrade=False):
+        """
+        Queue analysis generation for a case
+
+        Args:
+            case_id (int): Case to update when the analysis is ready
+            case_details (dict): Dictionary containing case details
+            results (dict): Results from process_query(include_analysis=False)
+            upgrade (bool): The case already holds the template analysis; replace it
+                with the language model analysis, and keep it if the model fails
+
+        Returns:
+            Future: Resolves to True once the analysis is stored
+        """
+        with self.lock:
+            self.queued += 1
+            self.done_events.setdefault(case_id, threading.Event())
+            depth = self.queued
+        logging.info("Queued analysis for case %s (queue depth %d)", case_id, depth)
+        return self.executor.submit(self._run, case_id, case_details, results, upgrade)
+
+    def hedge(self, case_id, case_details, results, deadline):
+        """
+        Upgrade a case whose template analysis is already stored, waiting at most
+        deadline seconds. If the language model answers in time the case holds its
+        analysis when this returns; otherwise the template stays and the worker
+        replaces it whenever the answer arrives. When no model is configured or its
+        circuit is open no job is queued and the template is kept.
+
+        Args:
+            case_id (int): Case to upgrade
+            case_details (dict): Dictionary containing case details
+            results (dict): Results holding the template analysis
+            deadline (float): Seconds to wait for the language model
+
+        Returns:
+            bool: True if the upgraded analysis was stored within the deadline
+        """
+        reason = self.processor.upgrade_unavailable_reason()
+        if reason:
+            FALLBACKS.inc(use='analysis', reason=reason)
+            ANALYSIS_HEDGES.inc(outcome='template')
+            logging.info("Hedged analysis for case %s: template (%s)", case_id, reason)
+            return False
+        future = self.submit(case_id, case_details, results, upgrade=True)
+        try:
+            upgraded = future.result(timeout=deadline)
+            outcome = 'model' if upgraded else 'template'
+        except TimeoutError:
+            upgraded = False
+            outcome = 'upgrade_pending'
+        ANALYSIS_HEDGES.inc(outcome=outcome)
+        logging.info("Hedged analysis for case %s: %s", case_id, outcome)
+        return upgraded
+
+    def _run(self, case_id, case_details, results, upgrade=False):
+        from app import db
+        from models import Case
+
+        with self.lock:
+            self.queued -= 1
+            self.running += 1
+        kept = False
+        try:
+            try:
+                if upgrade:
+                    analysis = self.processor.upgrade_analysis(case_details, results)
+                    kept = analysis is None
+                else:
+                    analysis = self.processor.complete_analysis(case_details, results)
+                succeeded = analysis is not None
+            except Exception as e:
+                logging.error("Error generating analysis for case %s: %s", case_id, str(e))
+                analysis = None if upgrade else ANALYSIS_FAILED_MESSAGE
+                succeeded = False
+            if analysis is None:
+                # The template analysis already stored stays in place
+                return False
+
+            with self.app.app_context():
+                case = db.session.query(Case).get(case_id)
+                if case:
+                    case.analysis = analysis
+                    db.session.commit()
+                else:
+                    logging.warning("Case %s was removed before its analysis was ready", case_id)
+                db.session.remove()
+            logging.info("Analysis for case %s stored (%d characters)", case_id, len(analysis))
+        except Exception as e:
+            logging.error("Error storing analysis for case %s: %s", case_id, str(e))
+            succeeded = False
+        finally:
+            with self.lock:
+                self.running -= 1
+                if succeeded:
+                    self.completed += 1
+                elif kept:
+                    self.kept += 1
+                else:
+                    self.failed += 1
+                done_event = self.done_events.pop(case_id, None)
+            if done_event:
+                done_event.set()
+        return succeeded
+
+    def wait(self, case_id, timeout):
+        """
+        Block until the case's job finishes in this process, or timeout elapses.
+        Jobs running in other processes are not visible here, so for those this
+        simply sleeps for the timeout and the caller re-checks the database.
+
+        Returns:
+            bool: True if the job finished in this process
+        """
+        with self.lock:
+            done_event = self.done_events.get(case_id)
+        if done_event is None:
+            time.sleep(timeout)
+            return False
+        return done_event.wait(timeout)
+
+    def is_pending(self, case_id):
+        """Return True if the case has a queued or running job in this process"""
+        with self.lock:
+            return case_id in self.done_events
+
+    def depth(self):
+        """Return the number of jobs waiting for a worker"""
+        with self.lock:
+            return self.queued
+
+    def stats(self):
+        """Return worker count, queue depth and job counters"""
+        with self.lock:
+            return {
+                'workers': self.max_workers,
+                'queued': self.queued,
+                'running': self.running,
+                'completed': self.completed,
+                'failed': self.failed,
+                'kept': self.kept
+            }
@@ -1,11 +1,18 @@
 import os
+import time
 import logging
-from flask import Flask
+from flask import Flask, request, g
 from flask_sqlalchemy import SQLAlchemy
 from sqlalchemy.orm import DeclarativeBase
+from startup import timed_startup, startup_report
+from request_trace import start_trace, finish_trace, TRACE_HEADER, TRACE_ID_HEADER
+from metrics import REQUEST_SECONDS, REQUESTS_IN_FLIGHT, start_request_timing, server_timing_header
+from profiling import request_profiler
 
-# Configure logging
-logging.basicConfig(level=logging.DEBUG)
+startup_started = time.perf_counter()
+
+# Configure logging; per-request scoring details go to request traces (see request_trace)
+logging.basicConfig(level=os.environ.get('LOG_LEVEL', 'INFO').upper())
 
 class Base(DeclarativeBase):
     pass
@@ -27,10 +34,57 @@ app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
 # Initialize the app with the extension
 db.init_app(app)
 
-with app.app_context():
+# Request traces: sampled at TRACE_SAMPLE_RATE, or forced with the debug header
+@app.before_request
+def begin_request_trace():
+    requested = request.headers.get(TRACE_HEADER, '').lower() not in ('', '0', 'false')
+    g.trace = start_trace(requested)
+
+# Request latency and in-flight metrics, and the per-stage Server-Timing header
+@app.before_request
+def begin_request_timing():
+    g.request_started = time.perf_counter()
+    REQUESTS_IN_FLIGHT.inc()
+    start_request_timing()
+
+@app.after_request
+def add_response_headers(response):
+    if g.get('trace') is not None:
+        response.headers[TRACE_ID_HEADER] = g.trace.trace_id
+    if 'request_started' in g:
+        elapsed = time.perf_counter() - g.request_started
+        REQUEST_SECONDS.observe(elapsed, endpoint=request.endpoint or 'unknown', method=request.method,
+                                status=response.status_code)
+        server_timing = server_timing_header(elapsed)
+        if server_timing:
+            response.headers['Server-Timing'] = server_timing
+    return response
+
+@app.teardown_request
+def end_request_trace(exception=None):
+    finish_trace()
+    if g.pop('request_started', None) is not None:
+        REQUESTS_IN_FLIGHT.dec()
+
+# On-demand cProfile dumps of selected requests (see profiling and the /admin/profiles routes)
+@app.before_request
+def begin_request_profile():
+    g.profile = request_profiler.start(request)
+
+@app.teardown_request
+def end_request_profile(exception=None):
+    profile = g.pop('profile', None)
+    if profile is not None:
+        request_profiler.stop(profile, request.endpoint)
+
+with app.app_context(), timed_startup('create database tables'):
     # Import models to ensure the tables are created
     import models
     db.create_all()
 
 # Import routes after app is created to avoid circular imports
-from routes import *
+with timed_startup('import routes'):
+    from routes import *
+
+logging.info("Startup completed in %.1f ms: %s",
+             (time.perf_counter() - startup_started) * 1000, startup_report())
@@ -0,0 +1,283 @@
+#!/usr/bin/env python3
+"""
+Benchmark the matching pipeline against the bundled corpus and synthetic
+corpora scaled up from it.
+
+Times extract_keywords, find_relevant_ipc_sections, find_relevant_precedents,
+generate_template_analysis and the full process_query over the evaluation
+dataset cases, and reports p50/p95/p99 latency, throughput and peak memory as JSON.
+A stored baseline can be compared against to flag regressions.
+
+    python benchmark.py                                  # real corpus plus 500, 5000 and 50000
+    python benchmark.py --scales 500 --iterations 3      # quicker run
+    python benchmark.py --output run.json --save-baseline benchmark_baseline.json
+    python benchmark.py --baseline benchmark_baseline.json   # exits with status 1 on regressions
+"""
+import argparse
+import copy
+import json
+import os
+import platform
+import random
+import sys
+import time
+import tracemalloc
+from stats import percentile
+import logging
+
+DEFAULT_SCALES = (500, 5000, 50000)
+
+# A function regresses when its p95 latency grows by more than this fraction over the baseline
+DEFAULT_TOLERANCE = 0.25
+
+def synthetic_corpus(size, seed=0):
+    """
+    Scale the bundled corpus up to size sections and size precedents
+
+    Each synthetic section is a copy of a real one with a new id and number and a
+    few extra description words, so term statistics stay realistic as the corpus
+    grows. Each synthetic precedent copies a real one, and its related sections
+    point at one randomly chosen copy of the real related sections.
+
+    Args:
+        size (int): Number of sections, and of precedents
+        seed (int): Random seed for the extra description words
+
+    Returns:
+        tuple: (sections, precedents) dicts in the ipc_data / precedents_data format
+    """
+    from ipc_data import ipc_sections
+    from precedents_data import legal_precedents
+
+    rng = random.Random(seed)
+    real_sections = list(ipc_sections.items())
+    real_precedents = list(legal_precedents.items())
+    vocabulary = sorted({word for section in ipc_sections.values() for word in section['description'].lower().split()
+                         if word.isalpha() and len(word) > 3})
+
+    sections = {}
+    for position in range(size):
+        section_id, section = real_sections[position % len(real_sections)]
+        copy_round = position // len(real_sections)
+        synthetic = copy.deepcopy(section)
+        synthetic['number'] = str(1000 + position)
+        synthetic['description'] = section['description'] + ' ' + ' '.join(rng.sample(vocabulary, 5))
+        sections[f"{section_id}_{copy_round}"] = synthetic
+
+    section_rounds = (size + len(real_sections) - 1) // len(real_sections)
+    precedents = {}
+    for position in range(size):
+        precedent_id, precedent = real_precedents[position % len(real_precedents)]
+        section_round = rng.randrange(section_rounds)
+        synthetic = copy.deepcopy(precedent)
+        synthetic['related_sections'] = [
+            f"{section_id}_{section_round}" for section_id in precedent.get('related_sections', [])
+            if f"{section_id}_{section_round}" in sections
+        ]
+        precedents[f"{precedent_id}_{position // len(real_precedents)}"] = synthetic
+    return sections, precedents
+
+def load_cases(path=None):
+    """
+    Return the benchmark workload: case details dicts from a JSONL file (any labels
+    in it are dropped), or from the quick and enhanced evaluation datasets
+    """
+    from evaluate import DEFAULT_DATASETS, CASE_FIELDS
+
+    paths = [path] if path else [os.path.join(DEFAULT_DATASETS, name) for name in ('quick.jsonl', 'enhanced.jsonl')]
+    cases = []
+    for dataset_path in paths:
+        with open(dataset_path) as f:
+            for line in f:
+                if line.strip():
+                    case = json.loads(line)
+                    cases.append({field: case[field] for field in CASE_FIELDS if field in case})
+    return cases
+
+def measure(function, arguments, iterations):
+    """
+    Time function over every argument tuple, iterations times, then run one more
+    pass under tracemalloc for the peak memory (kept separate so tracing does not
+    skew the latencies)
+
+    Returns:
+        dict: calls, p50/p95/p99/mean latency in ms, throughput per second and peak memory in KiB
+    """
+    latencies = []
+    started = time.perf_counter()
+    for _ in range(iterations):
+        for args in arguments:
+            call_started = time.perf_counter()
+            function(*args)
+            latencies.append(time.perf_counter() - call_started)
+    elapsed = time.perf_counter() - started
+
+    tracemalloc.start()
+    for args in arguments:
+        function(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        'calls': len(latencies),
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 3),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 3),
+        'mean_ms': round(sum(latencies) / len(latencies) * 1000, 3) if latencies else 0.0,
+        'throughput_per_s': round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        'peak_memory_kib': round(peak / 1024, 1)
+    }
+
+def benchmark_corpus(cases, indexes, iterations, include_template=True):
+    """
+    Benchmark every pipeline function over the cases against one set of indexes
+
+    Args:
+        cases (list): Case details dicts
+        indexes (MatchingIndexes): Indexes to match against (None for the bundled corpus)
+        iterations (int): Timed passes over the cases
+        include_template (bool): Also time generate_template_analysis (it only
+            reads the bundled corpus, so it is timed against that alone)
+
+    Returns:
+        dict: measure() results keyed by function name
+    """
+    from utils import extract_keywords, find_relevant_ipc_sections, find_relevant_precedents, generate_template_analysis
+    from nlp_processor import LegalQueryProcessor
+
+    texts = [(case.get('query', '') + " " + case.get('offense_description', ''),) for case in cases]
+    keywords_list = [extract_keywords(text) for (text,) in texts]
+    section_ids_list = [find_relevant_ipc_sections(keywords, case, indexes) for keywords, case in zip(keywords_list, cases)]
+    precedent_ids_list = [find_relevant_precedents(section_ids, keywords, indexes)
+                          for section_ids, keywords in zip(section_ids_list, keywords_list)]
+    processor = LegalQueryProcessor(indexes=indexes)
+
+    results = {
+        'extract_keywords': measure(extract_keywords, texts, iterations),
+        'find_relevant_ipc_sections': measure(
+            find_relevant_ipc_sections, [(keywords, case, indexes) for keywords, case in zip(keywords_list, cases)], iterations),
+        'find_relevant_precedents': measure(
+            find_relevant_precedents, [(section_ids, keywords, indexes)
+                                       for section_ids, keywords in zip(section_ids_list, keywords_list)], iterations),
+    }
+    if include_template:
+        results['generate_template_analysis'] = measure(
+            generate_template_analysis, list(zip(cases, section_ids_list, precedent_ids_list)), iterations)
+    results['process_query'] = measure(lambda case: processor.process_query(case, use_cache=False),
+                                       [(case,) for case in cases], iterations)
+    return results
+
+def run_benchmarks(scales=DEFAULT_SCALES, iterations=5, cases_path=None, seed=0):
+    """
+    Benchmark the real corpus and a synthetic corpus per scale
+
+    Returns:
+        dict: Report with 'meta' and per-corpus 'results' (index build time and memory plus function timings)
+    """
+    from utils import build_matching_indexes
+    try:
+        import numpy
+        numpy_version = numpy.__version__
+    except ImportError:
+        numpy_version = None
+
+    cases = load_cases(cases_path)
+    report = {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'numpy': numpy_version,
+            'cases': len(cases),
+            'iterations': iterations,
+            'seed': seed
+        },
+        'results': {}
+    }
+
+    print(f"Benchmarking real corpus ({len(cases)} cases x {iterations} iterations)...", file=sys.stderr)
+    report['results']['real'] = {'functions': benchmark_corpus(cases, None, iterations)}
+
+    for scale in scales:
+        print(f"Building synthetic corpus of {scale} sections and precedents...", file=sys.stderr)
+        sections, precedents = synthetic_corpus(scale, seed)
+        tracemalloc.start()
+        build_started = time.perf_counter()
+        indexes = build_matching_indexes(sections, precedents)
+        build_seconds = time.perf_counter() - build_started
+        _, build_peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        print(f"Benchmarking synthetic-{scale}...", file=sys.stderr)
+        report['results'][f'synthetic-{scale}'] = {
+            'build': {'seconds': round(build_seconds, 3), 'peak_memory_kib': round(build_peak / 1024, 1)},
+            'functions': benchmark_corpus(cases, indexes, iterations, include_template=False)
+        }
+    return report
+
+def compare_to_baseline(report, baseline, tolerance=DEFAULT_TOLERANCE):
+    """
+    Compare p95 latencies with a baseline report
+
+    Returns:
+        list: (corpus, function, baseline p95, current p95) for every regression
+    """
+    regressions = []
+    for corpus, result in report['results'].items():
+        baseline_functions = baseline.get('results', {}).get(corpus, {}).get('functions', {})
+        for function, stats in result['functions'].items():
+            baseline_stats = baseline_functions.get(function)
+            if baseline_stats and stats['p95_ms'] > baseline_stats['p95_ms'] * (1 + tolerance):
+                regressions.append((corpus, function, baseline_stats['p95_ms'], stats['p95_ms']))
+    return regressions
+
+def print_report(report):
+    for corpus, result in report['results'].items():
+        build = result.get('build')
+        print(f"\n{corpus}" + (f" (index build {build['seconds']}s, {build['peak_memory_kib']} KiB)" if build else ''))
+        for function, stats in result['functions'].items():
+            print(f"  {function:28} p50 {stats['p50_ms']:9.3f} ms  p95 {stats['p95_ms']:9.3f} ms  "
+                  f"p99 {stats['p99_ms']:9.3f} ms  {stats['throughput_per_s']:9.1f}/s  peak {stats['peak_memory_kib']} KiB")
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the section and precedent matching pipeline')
+    parser.add_argument('--scales', type=int, nargs='*', default=list(DEFAULT_SCALES),
+                        help='Synthetic corpus sizes (sections and precedents each)')
+    parser.add_argument('--iterations', type=int, default=5, help='Timed passes over the cases')
+    parser.add_argument('--cases', help='JSONL file of case details to use instead of the evaluation datasets')
+    parser.add_argument('--seed', type=int, default=0, help='Seed for the synthetic corpora')
+    parser.add_argument('--output', help='Write the JSON report to this file (default: stdout)')
+    parser.add_argument('--baseline', help='Baseline report to compare against; exit with status 1 on regressions')
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help='Allowed p95 growth over the baseline, as a fraction')
+    parser.add_argument('--save-baseline', help='Also write the report to this baseline file')
+    args = parser.parse_args()
+
+    # Benchmarks never call a language model or reuse cached results. Set before the
+    # application modules are imported, since the model client is created on import
+    os.environ['LLM_PROVIDER'] = 'none'
+    os.environ['RESULT_CACHE_BACKEND'] = 'none'
+    logging.basicConfig(level=logging.ERROR)
+    report = run_benchmarks(args.scales, args.iterations, args.cases, args.seed)
+    print_report(report)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare_to_baseline(report, json.load(f), args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} regressions (p95 more than {args.tolerance:.0%} over baseline):")
+            for corpus, function, baseline_p95, p95 in regressions:
+                print(f"  {corpus} {function}: {baseline_p95} ms -> {p95} ms")
+            sys.exit(1)
+        print("\nNo regressions against the baseline")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,313 @@
+#!/usr/bin/env python3
+"""
+Evaluate IPC section matching against labelled cases.
+
+Cases are read from JSONL datasets, one case per line: the case details
+fields (case_type, offense_description, query, ...) plus the labelled
+expected_sections and an optional case_name. They are processed matcher-only
+across a process pool, each worker building the matching indexes once, and
+scored by precision, recall and F1 of the identified sections. The report
+holds a summary per dataset and overall, and every case with its latency.
+Cases from generate_cases.py are labelled from the matcher's own rule table,
+so they are kept out of datasets/ and give no accuracy figures.
+
+    python evaluate.py                                   # every dataset in datasets/
+    python evaluate.py datasets/enhanced.jsonl --workers 4
+    python evaluate.py --save-baseline evaluation_baseline.json
+    python evaluate.py --baseline evaluation_baseline.json   # exits with status 1 on regressions
+"""
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from stats import percentile
+import logging
+
+DEFAULT_DATASETS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'datasets')
+
+# Case details fields passed to the processor; the rest of a dataset line is labels
+CASE_FIELDS = ('case_type', 'offense_description', 'query', 'incident_date', 'incident_location',
+               'victim_details', 'accused_details', 'evidence_summary')
+
+# A case counts as accurate when both its precision and its recall reach this
+ACCURATE_THRESHOLD = 0.7
+
+# Summary metrics gated against the baseline, and the drop each may take before it is a regression
+GATED_METRICS = ('accuracy', 'precision', 'recall', 'f1')
+DEFAULT_TOLERANCE = 0.01
+
+def dataset_paths(paths):
+    """Expand directories to the .jsonl files they contain"""
+    expanded = []
+    for path in paths:
+        if os.path.isdir(path):
+            expanded.extend(sorted(glob.glob(os.path.join(path, '*.jsonl'))))
+        else:
+            expanded.append(path)
+    return expanded
+
+def iter_cases(paths):
+    """
+    Yield the labelled cases of the datasets, one at a time
+
+    Yields:
+        dict: The dataset line, with 'dataset' (file name without extension) and a
+              'case_name' (defaulting to the line number) filled in
+    """
+    for path in paths:
+        dataset = os.path.splitext(os.path.basename(path))[0]
+        with open(path) as f:
+            for line_number, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                case = json.loads(line)
+                case['dataset'] = dataset
+                case.setdefault('case_name', f"line {line_number}")
+                yield case
+
+def iter_chunks(cases, chunk_size):
+    chunk = []
+    for case in cases:
+        chunk.append(case)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def score_case(expected_sections, identified_sections):
+    """
+    Score identified sections against the expected ones
+
+    Returns:
+        dict: correct, missed and extra sections, precision, recall, f1_score and accurate
+    """
+    expected = set(expected_sections)
+    identified = set(identified_sections)
+    correct = identified & expected
+    precision = len(correct) / len(identified) if identified else 0
+    recall = len(correct) / len(expected) if expected else 1
+    f1_score = 2 * precision * recall / (precision + recall) if (precision + recall) > 0 else 0
+    return {
+        'correct_sections': sorted(correct),
+        'missed_sections': sorted(expected - identified),
+        'extra_sections': sorted(identified - expected),
+        'precision': precision,
+        'recall': recall,
+        'f1_score': f1_score,
+        'accurate': precision >= ACCURATE_THRESHOLD and recall >= ACCURATE_THRESHOLD
+    }
+
+_processor = None
+
+def _init_worker():
+    # Build the processor, and with it the indexes, once per worker process
+    global _processor
+    logging.disable(logging.WARNING)
+    from nlp_processor import LegalQueryProcessor
+    _processor = LegalQueryProcessor()
+
+def evaluate_chunk(cases):
+    """
+    Process and score a chunk of labelled cases; runs in a worker process
+
+    Returns:
+        list: Per-case results: dataset, case_name, expected and identified sections,
+              the score_case fields and latency_ms (or 'error' if processing failed)
+    """
+    if _processor is None:
+        _init_worker()
+    results = []
+    for case in cases:
+        case_details = {field: case[field] for field in CASE_FIELDS if field in case}
+        started = time.perf_counter()
+        processed = _processor.process_query(case_details, use_cache=False, include_analysis=False)
+        latency = time.perf_counter() - started
+
+        result = {'dataset': case['dataset'], 'case_name': case['case_name'],
+                  'expected_sections': case.get('expected_sections', [])}
+        if 'error' in processed:
+            result.update({'error': processed['error'], 'accurate': False})
+        else:
+            result['identified_sections'] = [section['id'] for section in processed['ipc_sections']]
+            result.update(score_case(result['expected_sections'], result['identified_sections']))
+        result['latency_ms'] = round(latency * 1000, 3)
+        results.append(result)
+    return results
+
+def summarize(results):
+    """
+    Summarize case results: accuracy, macro-averaged precision/recall/F1 (errors
+    count as zero), micro-averaged over all sections, and latency percentiles
+    """
+    scored = [result for result in results if 'error' not in result]
+    count = len(results)
+    correct = sum(len(result['correct_sections']) for result in scored)
+    identified = sum(len(result['identified_sections']) for result in scored)
+    expected = sum(len(result['expected_sections']) for result in results)
+    micro_precision = correct / identified if identified else 0
+    micro_recall = correct / expected if expected else 1
+    latencies = [result['latency_ms'] for result in results]
+    return {
+        'cases': count,
+        'errors': count - len(scored),
+        'accuracy': sum(result['accurate'] for result in results) / count if count else 0,
+        'precision': sum(result['precision'] for result in scored) / count if count else 0,
+        'recall': sum(result['recall'] for result in scored) / count if count else 0,
+        'f1': sum(result['f1_score'] for result in scored) / count if count else 0,
+        'micro_precision': micro_precision,
+        'micro_recall': micro_recall,
+        'micro_f1': (2 * micro_precision * micro_recall / (micro_precision + micro_recall)
+                     if (micro_precision + micro_recall) > 0 else 0),
+        'latency_p50_ms': round(percentile(latencies, 0.50), 3),
+        'latency_p95_ms': round(percentile(latencies, 0.95), 3),
+        'latency_p99_ms': round(percentile(latencies, 0.99), 3)
+    }
+
+def evaluate(paths, workers=None, chunk_size=200):
+    """
+    Evaluate every case of the datasets across a process pool
+
+    Args:
+        paths (list): Dataset files (or directories of .jsonl files)
+        workers (int): Worker processes; defaults to the CPU count, 1 evaluates in this process
+        chunk_size (int): Cases sent to a worker at a time
+
+    Returns:
+        dict: Report with 'meta', 'summary' ('overall' and one entry per dataset) and 'cases'
+    """
+    paths = dataset_paths(paths)
+    workers = workers or os.cpu_count() or 1
+    started = time.perf_counter()
+    results = []
+    chunks = iter_chunks(iter_cases(paths), chunk_size)
+
+    if workers == 1:
+        for chunk in chunks:
+            results.extend(evaluate_chunk(chunk))
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as executor:
+            # A few chunks per worker in flight keeps the pool busy while bounding memory
+            in_flight = deque()
+            while True:
+                while len(in_flight) < workers * 2:
+                    chunk = next(chunks, None)
+                    if chunk is None:
+                        break
+                    in_flight.append(executor.submit(evaluate_chunk, chunk))
+                if not in_flight:
+                    break
+                results.extend(in_flight.popleft().result())
+                print(f"{len(results)} cases evaluated", file=sys.stderr, flush=True)
+    elapsed = time.perf_counter() - started
+
+    summary = {'overall': summarize(results)}
+    for dataset in dict.fromkeys(result['dataset'] for result in results):
+        summary[dataset] = summarize([result for result in results if result['dataset'] == dataset])
+    return {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'datasets': paths,
+            'workers': workers,
+            'seconds': round(elapsed, 3),
+            'cases_per_second': round(len(results) / elapsed, 1) if elapsed else 0.0
+        },
+        'summary': summary,
+        'cases': results
+    }
+
+def compare_to_baseline(report, baseline, tolerance=DEFAULT_TOLERANCE, latency_tolerance=None):
+    """
+    Compare the summaries with a baseline report
+
+    Args:
+        tolerance (float): Allowed drop of each GATED_METRICS value
+        latency_tolerance (float): Allowed p95 latency growth, as a fraction; None skips the latency check
+
+    Returns:
+        list: (summary name, metric, baseline value, current value) for every regression
+    """
+    regressions = []
+    for name, summary in report['summary'].items():
+        baseline_summary = baseline.get('summary', {}).get(name)
+        if not baseline_summary:
+            continue
+        for metric in GATED_METRICS:
+            if summary[metric] < baseline_summary[metric] - tolerance:
+                regressions.append((name, metric, baseline_summary[metric], summary[metric]))
+        if summary['errors'] > baseline_summary['errors']:
+            regressions.append((name, 'errors', baseline_summary['errors'], summary['errors']))
+        if (latency_tolerance is not None
+                and summary['latency_p95_ms'] > baseline_summary['latency_p95_ms'] * (1 + latency_tolerance)):
+            regressions.append((name, 'latency_p95_ms', baseline_summary['latency_p95_ms'], summary['latency_p95_ms']))
+    return regressions
+
+def newly_inaccurate(report, baseline):
+    """Return the (dataset, case_name) of cases accurate in the baseline but not now"""
+    accurate_before = {(case['dataset'], case['case_name']) for case in baseline.get('cases', []) if case.get('accurate')}
+    return [(case['dataset'], case['case_name']) for case in report['cases']
+            if not case['accurate'] and (case['dataset'], case['case_name']) in accurate_before]
+
+def print_summary(report):
+    meta = report['meta']
+    print(f"\n{meta['workers']} workers, {meta['seconds']}s ({meta['cases_per_second']} cases/s)")
+    print(f"{'DATASET':<20} | {'CASES':>6} | {'ERRORS':>6} | {'ACCURACY':>8} | {'PRECISION':>9} | "
+          f"{'RECALL':>6} | {'F1':>5} | {'P50 MS':>7} | {'P95 MS':>7}")
+    print("-" * 100)
+    for name, summary in report['summary'].items():
+        print(f"{name:<20} | {summary['cases']:>6} | {summary['errors']:>6} | {summary['accuracy']:>8.2f} | "
+              f"{summary['precision']:>9.2f} | {summary['recall']:>6.2f} | {summary['f1']:>5.2f} | "
+              f"{summary['latency_p50_ms']:>7.2f} | {summary['latency_p95_ms']:>7.2f}")
+
+def main():
+    parser = argparse.ArgumentParser(description='Evaluate IPC section matching against labelled JSONL datasets')
+    parser.add_argument('datasets', nargs='*', default=[DEFAULT_DATASETS],
+                        help='Dataset files or directories of .jsonl files (default: datasets/)')
+    parser.add_argument('--workers', type=int, help='Worker processes (default: CPU count; 1 runs in this process)')
+    parser.add_argument('--chunk-size', type=int, default=200, help='Cases sent to a worker at a time')
+    parser.add_argument('--output', help='Report file (default: evaluation_results_<timestamp>.json)')
+    parser.add_argument('--baseline', help='Baseline report to compare against; exit with status 1 on regressions')
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help='Allowed drop in accuracy, precision, recall and F1')
+    parser.add_argument('--latency-tolerance', type=float,
+                        help='Allowed p95 latency growth over the baseline, as a fraction (default: not checked)')
+    parser.add_argument('--save-baseline', help='Also write the report to this baseline file')
+    args = parser.parse_args()
+
+    # Evaluation only needs the matches; results are never cached between runs.
+    # Worker processes inherit the setting
+    os.environ['RESULT_CACHE_BACKEND'] = 'none'
+    logging.basicConfig(level=logging.ERROR)
+    report = evaluate(args.datasets, args.workers, args.chunk_size)
+    print_summary(report)
+
+    output = args.output or f"evaluation_results_{time.strftime('%Y%m%d_%H%M%S')}.json"
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nReport saved to {output}")
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare_to_baseline(report, baseline, args.tolerance, args.latency_tolerance)
+        cases = newly_inaccurate(report, baseline)
+        if cases:
+            print(f"\n{len(cases)} cases accurate in the baseline no longer are:")
+            for dataset, case_name in cases[:20]:
+                print(f"  {dataset}: {case_name}")
+        if regressions:
+            print(f"\n{len(regressions)} regressions against the baseline:")
+            for name, metric, baseline_value, value in regressions:
+                print(f"  {name} {metric}: {baseline_value:.3f} -> {value:.3f}")
+            sys.exit(1)
+        print("\nNo regressions against the baseline")
+
+if __name__ == "__main__":
+    main()
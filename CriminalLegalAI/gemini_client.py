@@ -0,0 +1,74 @@
+import os
+import threading
+import google.generativeai as genai
+import logging
+
+GEMINI_API_KEY = os.environ.get('GEMINI_API_KEY')
+
+# Gemini-compatible REST endpoint to call instead of Google's, e.g. the
+# stub_llm.py server during load tests (http://host:port)
+GEMINI_API_ENDPOINT = os.environ.get('GEMINI_API_ENDPOINT')
+
+# Model settings per use; models are only built when first requested
+MODEL_PROFILES = {
+    'analysis': {
+        'model_name': 'gemini-1.5-pro'
+    },
+    'chat': {
+        'model_name': 'models/gemini-1.5-pro',
+        'generation_config': {
+            "temperature": 0.7,
+            "top_p": 0.95,
+            "top_k": 64,
+            "max_output_tokens": 1024,
+        },
+        'safety_settings': [
+            {"category": "HARM_CATEGORY_HARASSMENT", "threshold": "BLOCK_MEDIUM_AND_ABOVE"},
+            {"category": "HARM_CATEGORY_HATE_SPEECH", "threshold": "BLOCK_MEDIUM_AND_ABOVE"},
+            {"category": "HARM_CATEGORY_SEXUALLY_EXPLICIT", "threshold": "BLOCK_MEDIUM_AND_ABOVE"},
+            {"category": "HARM_CATEGORY_DANGEROUS_CONTENT", "threshold": "BLOCK_MEDIUM_AND_ABOVE"},
+        ]
+    }
+}
+
+_models = {}
+_configured = False
+_lock = threading.Lock()
+
+def gemini_available():
+    """Return True if a Gemini API key is configured"""
+    return bool(GEMINI_API_KEY)
+
+def get_gemini_model(profile='analysis'):
+    """
+    Return the Gemini model for a profile, configuring the API on first use.
+    Nothing here touches the network; requests are only made when content is generated.
+
+    Args:
+        profile (str): Key of MODEL_PROFILES
+
+    Returns:
+        GenerativeModel: The model, or None if Gemini is not configured or setup failed
+    """
+    global _configured
+    if not GEMINI_API_KEY:
+        return None
+    if profile in _models:
+        return _models[profile]
+
+    with _lock:
+        if profile not in _models:
+            try:
+                if not _configured:
+                    if GEMINI_API_ENDPOINT:
+                        genai.configure(api_key=GEMINI_API_KEY, transport='rest',
+                                        client_options={'api_endpoint': GEMINI_API_ENDPOINT})
+                    else:
+                        genai.configure(api_key=GEMINI_API_KEY)
+                    _configured = True
+                _models[profile] = genai.GenerativeModel(**MODEL_PROFILES[profile])
+                logging.info("Gemini model configured for %s (%s)", profile, MODEL_PROFILES[profile]['model_name'])
+            except Exception as e:
+                logging.error("Error configuring Gemini API: %s", str(e))
+                _models[profile] = None
+    return _models[profile]
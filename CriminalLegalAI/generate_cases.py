@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+Generate synthetic labelled cases for load and scale testing.
+
+Each case is built around one crime category of the rule table and a few of
+its scenarios. The offense description combines the category's vocabulary,
+keyword phrases of the labelled sections and scenario terms; the labels are
+the sections the rule table maps that category and those scenarios to. The
+same seed always yields the same cases, and they are streamed, so any number
+can be generated.
+
+The labels come from the same priority rules in scoring_rules.json that the
+matcher scores with, so evaluate.py on generated cases measures the matcher
+against its own rule table. Use them for load tests, benchmarks and checking
+that evaluation runs, not for accuracy figures; those come from the
+hand-labelled datasets in datasets/.
+
+The default output is the evaluation dataset format (case details plus
+case_name and expected_sections), read by evaluate.py and benchmark.py
+--cases. --format form writes the /submit_case form fields instead.
+
+    python generate_cases.py --count 10000 --seed 1 --output synthetic.jsonl
+    python generate_cases.py --count 500 --format form --output posts.jsonl
+"""
+import argparse
+import datetime
+import json
+import random
+import sys
+from ipc_data import ipc_sections
+from scoring_rules import scoring_rules
+
+# Case type offered on the submission form for each crime category
+CASE_TYPES = {
+    'theft': 'Theft', 'robbery': 'Theft', 'assault': 'Assault', 'sexual_offense': 'Rape', 'fraud': 'Fraud',
+    'criminal_breach_of_trust': 'Fraud', 'kidnapping': 'Other', 'murder': 'Murder',
+    'domestic_violence': 'Domestic Violence', 'cybercrime': 'Cybercrime', 'extortion': 'Other', 'defamation': 'Other'
+}
+
+# Phrases that describe each scenario of the rule table in a case narrative
+SCENARIO_TERMS = {
+    'group_crime': ['several men', 'multiple persons', 'many people', 'a gang of several individuals'],
+    'weapon_used': ['a knife', 'a gun', 'an iron rod', 'a sharp blade', 'a cricket bat'],
+    'violence_involved': ['the victim was injured', 'they hit the victim', 'the victim was beaten', 'force was used'],
+    'night_time': ['late at night', 'around midnight', 'in the evening', 'after sunset'],
+    'dwelling_house': ['at the victim\'s house', 'inside the apartment', 'at our home', 'in the residence'],
+    'public_place': ['in a crowded market', 'on the main road', 'at the railway station', 'outside a shop'],
+    'electronic_device': ['a mobile phone', 'a laptop', 'a tablet', 'a smartphone'],
+    'valuable_property': ['gold jewellery', 'cash worth fifty thousand rupees', 'an expensive watch', 'a wallet'],
+    'vehicle_involved': ['a motorcycle', 'a car', 'a scooter', 'an auto'],
+    'intoxication': ['while drunk', 'after drinking alcohol', 'in an intoxicated state'],
+    'repeat_offense': ['had done this before', 'has a history of such acts', 'did it again'],
+    'minor_involved': ['a minor', 'a child', 'a teenager', 'an underage girl'],
+    'online_component': ['through a website', 'over email', 'on an online platform', 'via the internet'],
+    'professional_relationship': ['an employee of the company', 'the victim\'s employer', 'a business partner at work']
+}
+
+OPENINGS = ['I want to report an incident.', 'This complaint concerns the following events.',
+            'The victim approached the police with the following account.', 'Here is what happened.']
+CLAUSES = ['The complaint describes {phrase}.', 'It involved {phrase}.', 'Witnesses mentioned {phrase}.',
+           'The victim alleges {phrase}.', 'There are signs of {phrase}.']
+QUERIES = ['What IPC sections apply to this {case_type} case?', 'What legal action can I take?',
+           'Can I file an FIR for {phrase}?', 'What punishment can the accused face?',
+           'How should I proceed with this {case_type} case?']
+LOCATIONS = ['Connaught Place, Delhi', 'Andheri West, Mumbai', 'Koramangala, Bengaluru', 'Salt Lake, Kolkata',
+             'T. Nagar, Chennai', 'Banjara Hills, Hyderabad', 'Civil Lines, Jaipur', 'Hazratganj, Lucknow']
+VICTIMS = ['Self', 'Self and family', 'My elderly mother', 'A shopkeeper', 'A college student', 'My neighbour']
+ACCUSED = ['Unknown', 'A known acquaintance', 'A neighbour', 'A former colleague', 'Two unidentified men', 'A relative']
+EVIDENCE = ['None', 'CCTV footage', 'Eyewitness statements', 'Medical report', 'Bank statements',
+            'Screenshots of messages', 'Call records', 'Photographs of the scene']
+
+# Incident dates fall in the two years before this date, so a seed always gives the same cases
+DATE_ANCHOR = datetime.date(2025, 1, 1)
+
+def case_rules():
+    """
+    Return the rule-table combinations cases are built around
+
+    Returns:
+        dict: {category: {scenario or None: sections}} for the categories with mapped sections
+    """
+    rules = {}
+    for _, category, scenario, sections in scoring_rules.priority_rules:
+        rules.setdefault(category, {})[scenario] = sections
+    return rules
+
+def generate_case(rng, index, rules=None):
+    """
+    Generate one labelled case
+
+    Args:
+        rng (random.Random): Source of randomness
+        index (int): Case number, used in the case name
+        rules (dict): case_rules() result (computed when not given)
+
+    Returns:
+        dict: Case details fields plus case_name and expected_sections
+    """
+    rules = rules or case_rules()
+    category = rng.choice(sorted(rules))
+    scenario_rules = rules[category]
+    mapped_scenarios = sorted(scenario for scenario in scenario_rules if scenario)
+    # Up to two scenarios the rule table maps for this category, and now and then one it does not
+    scenarios = rng.sample(mapped_scenarios, min(len(mapped_scenarios), rng.randint(0, 2)))
+    if rng.random() < 0.3:
+        scenarios.append(rng.choice(sorted(set(SCENARIO_TERMS) - set(scenario_rules))))
+
+    expected_sections = []
+    for scenario in [None] + scenarios:
+        for section_id in scenario_rules.get(scenario, []):
+            if section_id in ipc_sections and section_id not in expected_sections:
+                expected_sections.append(section_id)
+
+    phrases = rng.sample(scoring_rules.crime_categories[category],
+                         min(2, len(scoring_rules.crime_categories[category])))
+    phrases.extend(rng.choice(ipc_sections[section_id]['keywords'])
+                   for section_id in expected_sections if ipc_sections[section_id]['keywords'])
+    rng.shuffle(phrases)
+
+    sentences = [rng.choice(OPENINGS)]
+    sentences.extend(rng.choice(CLAUSES).format(phrase=phrase) for phrase in phrases)
+    if scenarios:
+        sentences.append("It happened with " + ", ".join(rng.choice(SCENARIO_TERMS[scenario]) for scenario in scenarios) + ".")
+
+    case_type = CASE_TYPES.get(category, 'Other')
+    incident_date = DATE_ANCHOR - datetime.timedelta(days=rng.randint(1, 730))
+    return {
+        'case_name': f"synthetic {index}: {'+'.join([category] + scenarios)}",
+        'case_type': case_type,
+        'offense_description': ' '.join(sentences),
+        'query': rng.choice(QUERIES).format(case_type=case_type.lower(), phrase=rng.choice(phrases)),
+        'incident_date': incident_date.strftime('%Y-%m-%d'),
+        'incident_location': rng.choice(LOCATIONS),
+        'victim_details': rng.choice(VICTIMS),
+        'accused_details': rng.choice(ACCUSED),
+        'evidence_summary': ', '.join(rng.sample(EVIDENCE, rng.randint(1, 3))),
+        'expected_sections': expected_sections
+    }
+
+def generate_cases(count, seed=0):
+    """
+    Yield count labelled cases; the same seed always yields the same cases
+
+    Args:
+        count (int): Number of cases
+        seed (int): Random seed
+    """
+    rng = random.Random(seed)
+    rules = case_rules()
+    for index in range(1, count + 1):
+        yield generate_case(rng, index, rules)
+
+def form_post(case, index):
+    """
+    Return the /submit_case form fields for a generated case, with a made-up user
+
+    Args:
+        case (dict): Generated case
+        index (int): Case number, which makes the user's email and phone unique
+    """
+    form = {field: value for field, value in case.items() if field not in ('case_name', 'expected_sections')}
+    form.update({'name': f"Test User {index}", 'email': f"user{index}@example.com", 'phone': f"9{index:09d}"[:10]})
+    return form
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate synthetic labelled cases')
+    parser.add_argument('--count', type=int, default=1000, help='Number of cases')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed')
+    parser.add_argument('--format', choices=('dataset', 'form'), default='dataset',
+                        help='dataset: case details with labels; form: /submit_case form fields')
+    parser.add_argument('--output', help='JSONL file to write (default: stdout)')
+    args = parser.parse_args()
+
+    out = open(args.output, 'w') if args.output else sys.stdout
+    try:
+        for index, case in enumerate(generate_cases(args.count, args.seed), 1):
+            out.write(json.dumps(form_post(case, index) if args.format == 'form' else case) + '\n')
+    finally:
+        if args.output:
+            out.close()
+    if args.output:
+        print(f"Wrote {args.count} cases to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,270 @@
+from collections import Counter
+from functools import lru_cache
+import re
+from ipc_data import ipc_sections
+from phrase_matcher import PhraseMatcher
+from precedents_data import legal_precedents
+from text_processing import preprocess_text
+from scoring_rules import scoring_rules
+from startup import timed_startup
+import logging
+
+# Alphanumeric runs that may contain a section number such as "379" or "498A"
+NUMBER_RUN_PATTERN = re.compile(r'\d+[A-Za-z0-9]*')
+
+# Title lookups remembered per index: the rule table's strings plus recent case types,
+# which come from the request and so must not grow the cache without bound
+TITLE_MATCH_CACHE_SIZE = 1024
+
+class InvertedIndex:
+    """
+    Posting lists from lemmatized token to the documents containing it,
+    with the term frequency of the token in each document
+    """
+
+    def __init__(self):
+        self.postings = {}
+
+    def add(self, doc_id, tokens):
+        """Add a document's token list to the index"""
+        for token, frequency in Counter(tokens).items():
+            self.postings.setdefault(token, {})[doc_id] = frequency
+
+    def get(self, token):
+        """Return the {doc_id: term_frequency} postings for a token"""
+        return self.postings.get(token, {})
+
+    def candidates(self, tokens):
+        """Return the ids of all documents sharing at least one token"""
+        matched = set()
+        for token in tokens:
+            posting = self.postings.get(token)
+            if posting:
+                matched.update(posting)
+        return matched
+
+    def __len__(self):
+        return len(self.postings)
+
+class IndexedSection:
+    """
+    Pre-processed form of a single IPC section used during relevance scoring
+    """
+    __slots__ = ('id', 'position', 'data', 'number', 'title', 'combined_text', 'tokens', 'title_tokens', 'phrases')
+
+    def __init__(self, section_id, position, section_data, tokens):
+        self.id = section_id
+        self.position = position
+        self.data = section_data
+        self.number = section_data.get('number', '')
+        self.title = section_data['title'].lower()
+        self.combined_text = f"{self.title} {section_data['description'].lower()}"
+        self.tokens = frozenset(tokens)
+        self.title_tokens = frozenset(preprocess_text(self.title))
+        self.phrases = frozenset(phrase.lower().strip() for phrase in section_data.get('keywords', []))
+
+class IpcIndex:
+    """
+    Index over the IPC sections, built once so that matching a case only
+    needs set lookups instead of re-lemmatizing every section per request
+    """
+
+    def __init__(self, sections):
+        """
+        Build the index
+
+        Args:
+            sections (dict): IPC sections keyed by section id (see ipc_data)
+        """
+        self.sections = {}
+        self.inverted = InvertedIndex()
+        for position, (section_id, section_data) in enumerate(sections.items()):
+            combined_text = f"{section_data['title']} {section_data['description']}".lower()
+            tokens = preprocess_text(combined_text)
+            self.sections[section_id] = IndexedSection(section_id, position, section_data, tokens)
+            self.inverted.add(section_id, tokens)
+
+        # Sections eligible for each scenario boost: those whose text contains
+        # one of the scenario's phrases from the rule table
+        self.scenario_sections = {
+            scenario: frozenset(
+                section_id for section_id, indexed_section in self.sections.items()
+                if any(phrase in indexed_section.combined_text for phrase in phrases)
+            )
+            for scenario, phrases in scoring_rules.scenario_section_phrases.items()
+        }
+        self.numbers = {}
+        for section_id, indexed_section in self.sections.items():
+            if indexed_section.number:
+                self.numbers.setdefault(indexed_section.number, []).append(section_id)
+        # Longest section number, so a digit run is only searched for substrings that could match
+        self.max_number_length = max(map(len, self.numbers), default=0)
+        self.sections_with_title_containing = lru_cache(maxsize=TITLE_MATCH_CACHE_SIZE)(
+            self._sections_with_title_containing)
+        logging.info("IpcIndex built with %d IPC sections and %d terms",
+                     len(self.sections), len(self.inverted))
+
+    def __len__(self):
+        return len(self.sections)
+
+    def __contains__(self, section_id):
+        return section_id in self.sections
+
+    def get(self, section_id):
+        return self.sections.get(section_id)
+
+    def items(self):
+        return self.sections.items()
+
+    def candidates(self, tokens):
+        """Return ids of sections sharing at least one token with the case"""
+        return self.inverted.candidates(tokens)
+
+    def _sections_with_title_containing(self, text):
+        """
+        Return ids of sections whose lowercased title contains text; called through
+        sections_with_title_containing, which keeps the last TITLE_MATCH_CACHE_SIZE results
+        """
+        return frozenset(
+            section_id for section_id, indexed_section in self.sections.items()
+            if text in indexed_section.title
+        )
+
+    def sections_numbered_in(self, text):
+        """Return ids of sections whose number appears in text"""
+        matched = set()
+        for run in NUMBER_RUN_PATTERN.findall(text):
+            for start in range(len(run)):
+                for end in range(start + 1, min(start + self.max_number_length, len(run)) + 1):
+                    matched.update(self.numbers.get(run[start:end], ()))
+        return matched
+
+    def build_phrase_matcher(self, category_terms=None):
+        """
+        Build a single automaton over every section keyword phrase and,
+        optionally, the crime category vocabulary
+
+        Section phrases report ('section', section_id) and only match whole
+        words; category terms report ('category', category) and match anywhere
+        in the text, like a plain substring test.
+
+        Args:
+            category_terms (dict): Crime category name -> list of terms
+
+        Returns:
+            PhraseMatcher: The compiled matcher
+        """
+        matcher = PhraseMatcher()
+        for section_id, indexed_section in self.sections.items():
+            for phrase in indexed_section.phrases:
+                matcher.add(phrase, ('section', section_id))
+        for category, terms in (category_terms or {}).items():
+            for term in terms:
+                matcher.add(term, ('category', category), whole_words=False)
+        matcher.build()
+        logging.info("Phrase matcher built with %d phrases", len(matcher))
+        return matcher
+
+    def ordered(self, section_ids):
+        """Yield (section_id, IndexedSection) for the given ids in corpus order"""
+        indexed_sections = [self.sections[section_id] for section_id in section_ids if section_id in self.sections]
+        indexed_sections.sort(key=lambda indexed_section: indexed_section.position)
+        for indexed_section in indexed_sections:
+            yield indexed_section.id, indexed_section
+
+class IndexedPrecedent:
+    """
+    Pre-processed form of a single legal precedent
+    """
+    __slots__ = ('id', 'position', 'data', 'tokens', 'recency_factor', 'court_weight')
+
+    def __init__(self, precedent_id, position, precedent_data, tokens):
+        self.id = precedent_id
+        self.position = position
+        self.data = precedent_data
+        self.tokens = frozenset(tokens)
+        # Static priors: more recent cases score slightly higher (1.0 to 1.5 based on year)
+        # and Supreme Court decisions get higher weight
+        year = precedent_data.get('year', 2000)
+        self.recency_factor = min(1.5, max(1.0, (year - 1950) / 50))
+        self.court_weight = 1.5 if 'supreme' in precedent_data.get('court', '').lower() else 1.0
+
+class PrecedentIndex:
+    """
+    Index over the legal precedents with pre-tokenized summary and
+    implications text, token posting lists and a reverse map from IPC
+    section to the precedents listing it in related_sections
+    """
+
+    def __init__(self, precedents):
+        """
+        Build the index
+
+        Args:
+            precedents (dict): Precedents keyed by precedent id (see precedents_data)
+        """
+        self.precedents = {}
+        self.inverted = InvertedIndex()
+        # section_id -> precedent ids in corpus order
+        self.section_postings = {}
+        for position, (precedent_id, precedent_data) in enumerate(precedents.items()):
+            precedent_text = precedent_data.get('summary', '') + ' ' + precedent_data.get('implications', '')
+            tokens = preprocess_text(precedent_text)
+            self.precedents[precedent_id] = IndexedPrecedent(precedent_id, position, precedent_data, tokens)
+            self.inverted.add(precedent_id, tokens)
+            for section_id in dict.fromkeys(precedent_data.get('related_sections', [])):
+                self.section_postings.setdefault(section_id, []).append(precedent_id)
+        logging.info("PrecedentIndex built with %d precedents, %d terms and %d sections",
+                     len(self.precedents), len(self.inverted), len(self.section_postings))
+
+    def __len__(self):
+        return len(self.precedents)
+
+    def __contains__(self, precedent_id):
+        return precedent_id in self.precedents
+
+    def get(self, precedent_id):
+        return self.precedents.get(precedent_id)
+
+    def items(self):
+        return self.precedents.items()
+
+    def candidates(self, tokens):
+        """Return ids of precedents sharing at least one token"""
+        return self.inverted.candidates(tokens)
+
+    def for_section(self, section_id):
+        """Return ids of the precedents related to an IPC section, in corpus order"""
+        return self.section_postings.get(section_id, [])
+
+    def keyword_matches(self, keywords, weights):
+        """
+        Count the keyword matches of every precedent sharing a keyword, from the posting lists
+
+        Args:
+            keywords (list): Case keywords
+            weights (dict): Extra weight of important terms
+
+        Returns:
+            dict: {precedent_id: (matched keywords, summed weights of matched important terms)}
+        """
+        matches = {}
+        for keyword in keywords:
+            weight = weights.get(keyword, 0)
+            for precedent_id in self.inverted.get(keyword):
+                basic_matches, weighted_matches = matches.get(precedent_id, (0, 0))
+                matches[precedent_id] = (basic_matches + 1, weighted_matches + weight)
+        return matches
+
+    def ordered(self, precedent_ids):
+        """Yield (precedent_id, IndexedPrecedent) for the given ids in corpus order"""
+        indexed_precedents = [self.precedents[precedent_id] for precedent_id in precedent_ids if precedent_id in self.precedents]
+        indexed_precedents.sort(key=lambda indexed_precedent: indexed_precedent.position)
+        for indexed_precedent in indexed_precedents:
+            yield indexed_precedent.id, indexed_precedent
+
+# Shared indexes built at import time
+with timed_startup('build IPC section index'):
+    ipc_index = IpcIndex(ipc_sections)
+with timed_startup('build precedent index'):
+    precedent_index = PrecedentIndex(legal_precedents)
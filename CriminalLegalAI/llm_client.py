@@ -0,0 +1,428 @@
+import codecs
+import http.client
+import json
+import os
+import random
+import threading
+import time
+import urllib.parse
+from gemini_client import GEMINI_API_KEY, MODEL_PROFILES, get_gemini_model
+from metrics import Gauge, LLM_CALLS, LLM_CALLS_IN_FLIGHT, LLM_RETRIES
+import logging
+
+# Which provider answers language model calls: 'gemini', 'http' (a Gemini-compatible
+# REST endpoint at LLM_HTTP_URL, such as stub_llm.py) or 'none' (template answers only).
+# Defaults to Gemini when GEMINI_API_KEY is set.
+LLM_PROVIDER = os.environ.get('LLM_PROVIDER', 'gemini' if GEMINI_API_KEY else 'none')
+LLM_HTTP_URL = os.environ.get('LLM_HTTP_URL', 'http://127.0.0.1:8089')
+
+# Time budget of one call, retries included; a stream must produce each chunk within it
+LLM_DEADLINE_SECONDS = float(os.environ.get('LLM_DEADLINE_SECONDS', '30'))
+
+# Retries of failed calls that may succeed on a second try (timeouts, connection errors,
+# 429 and 5xx), with full-jitter exponential backoff starting at LLM_RETRY_BACKOFF_SECONDS
+LLM_MAX_RETRIES = int(os.environ.get('LLM_MAX_RETRIES', '2'))
+LLM_RETRY_BACKOFF_SECONDS = float(os.environ.get('LLM_RETRY_BACKOFF_SECONDS', '0.5'))
+LLM_RETRY_BACKOFF_CAP_SECONDS = 8.0
+
+# Calls in flight per process; callers beyond this wait until their deadline, then fall back
+LLM_MAX_CONCURRENCY = int(os.environ.get('LLM_MAX_CONCURRENCY', '8'))
+
+# After this many consecutive failed calls, calls fail fast for the cooldown; then one
+# trial call decides whether the circuit closes again
+LLM_BREAKER_FAILURES = int(os.environ.get('LLM_BREAKER_FAILURES', '5'))
+LLM_BREAKER_COOLDOWN_SECONDS = float(os.environ.get('LLM_BREAKER_COOLDOWN_SECONDS', '30'))
+
+class LLMUnavailable(Exception):
+    """
+    The call was not attempted; callers serve their template answer instead
+
+    Attributes:
+        reason (str): 'unavailable' (no provider), 'circuit_open' or 'busy' (concurrency cap)
+    """
+
+    def __init__(self, reason):
+        super().__init__(f"Language model unavailable: {reason}")
+        self.reason = reason
+
+class LLMHTTPError(Exception):
+    """Error status from the HTTP provider; code is the HTTP status, as on google.api_core errors"""
+
+    def __init__(self, code, message):
+        super().__init__(f"{code}: {message}")
+        self.code = code
+
+class GeminiProvider:
+    """Gemini through the google-generativeai client (see gemini_client)"""
+    name = 'gemini'
+
+    def ready(self, profile):
+        """Return True if the model is configured (API key set and client library set up)"""
+        return get_gemini_model(profile) is not None
+
+    def _model(self, profile):
+        model = get_gemini_model(profile)
+        if model is None:
+            raise LLMUnavailable('unavailable')
+        return model
+
+    def generate(self, prompt, profile, timeout):
+        # Retries are done by LLMClient, so the client library's own retry is turned off
+        response = self._model(profile).generate_content(prompt, request_options={'timeout': timeout, 'retry': None})
+        return response.text
+
+    def stream(self, prompt, profile, timeout):
+        for chunk in self._model(profile).generate_content(prompt, stream=True,
+                                                           request_options={'timeout': timeout, 'retry': None}):
+            text = _response_text(chunk)
+            if text:
+                yield text
+
+class HttpProvider:
+    """
+    A Gemini-compatible REST endpoint called over kept-alive connections (one per
+    thread), without the client library; stub_llm.py serves one for tests
+    """
+    name = 'http'
+
+    def __init__(self, url=LLM_HTTP_URL):
+        parsed = urllib.parse.urlsplit(url)
+        self.scheme = parsed.scheme
+        self.netloc = parsed.netloc
+        self.prefix = parsed.path.rstrip('/')
+        self.local = threading.local()
+
+    def ready(self, profile):
+        return True
+
+    def _request(self, profile, method, prompt, timeout):
+        settings = MODEL_PROFILES[profile]
+        model = settings['model_name'].split('/')[-1]
+        body = {'contents': [{'role': 'user', 'parts': [{'text': prompt}]}]}
+        if settings.get('generation_config'):
+            body['generationConfig'] = {_camel_case(key): value for key, value in settings['generation_config'].items()}
+        headers = {'Content-Type': 'application/json'}
+        if GEMINI_API_KEY:
+            headers['x-goog-api-key'] = GEMINI_API_KEY
+
+        connection = getattr(self.local, 'connection', None)
+        if connection is None:
+            connection_class = http.client.HTTPSConnection if self.scheme == 'https' else http.client.HTTPConnection
+            connection = self.local.connection = connection_class(self.netloc, timeout=timeout)
+        connection.timeout = timeout
+        if connection.sock is not None:
+            connection.sock.settimeout(timeout)
+        try:
+            connection.request('POST', f"{self.prefix}/v1beta/models/{model}:{method}", json.dumps(body), headers)
+            response = connection.getresponse()
+        except Exception:
+            # A broken connection is reopened on the next call
+            connection.close()
+            self.local.connection = None
+            raise
+        if response.status >= 400:
+            message = response.read().decode(errors='replace')
+            raise LLMHTTPError(response.status, message[:200])
+        return response
+
+    def generate(self, prompt, profile, timeout):
+        response = self._request(profile, 'generateContent', prompt, timeout)
+        return _candidate_text(json.loads(response.read()))
+
+    def stream(self, prompt, profile, timeout):
+        # The streamed answer is one JSON array whose elements arrive as they are generated
+        response = self._request(profile, 'streamGenerateContent', prompt, timeout)
+        decoder = json.JSONDecoder()
+        text_decoder = codecs.getincrementaldecoder('utf-8')()
+        buffer = ''
+        try:
+            while True:
+                data = response.read1(65536)
+                if not data:
+                    break
+                buffer += text_decoder.decode(data)
+                while True:
+                    buffer = buffer.lstrip(' \r\n\t[,]')
+                    try:
+                        chunk, end = decoder.raw_decode(buffer)
+                    except ValueError:
+                        break
+                    buffer = buffer[end:]
+                    text = _candidate_text(chunk)
+                    if text:
+                        yield text
+        finally:
+            # A response abandoned part way leaves the connection unusable
+            if not response.isclosed():
+                self.local.connection.close()
+                self.local.connection = None
+
+def _camel_case(name):
+    first, *rest = name.split('_')
+    return first + ''.join(part.title() for part in rest)
+
+def _response_text(response):
+    # response.text raises ValueError on chunks without parts (safety-blocked or finish-only)
+    if not response.candidates:
+        return ''
+    return ''.join(part.text for part in response.candidates[0].content.parts)
+
+def _candidate_text(response):
+    candidates = response.get('candidates') or [{}]
+    return ''.join(part.get('text', '') for part in candidates[0].get('content', {}).get('parts', []))
+
+PROVIDERS = {'gemini': GeminiProvider, 'http': HttpProvider}
+
+class CircuitBreaker:
+    """
+    Fails calls fast while the provider is failing: opens after a run of failed
+    calls, and after the cooldown lets a single trial call through (half-open)
+    whose outcome closes or re-opens it
+    """
+
+    def __init__(self, failures=LLM_BREAKER_FAILURES, cooldown=LLM_BREAKER_COOLDOWN_SECONDS):
+        self.failures = failures
+        self.cooldown = cooldown
+        self.lock = threading.Lock()
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        if self.trial_in_flight or time.monotonic() - self.opened_at >= self.cooldown:
+            return 'half_open'
+        return 'open'
+
+    def allow(self):
+        """Return True if a call may be made now"""
+        with self.lock:
+            if self.opened_at is None:
+                return True
+            if self.trial_in_flight or time.monotonic() - self.opened_at < self.cooldown:
+                return False
+            self.trial_in_flight = True
+            return True
+
+    def record_success(self):
+        with self.lock:
+            if self.opened_at is not None:
+                logging.info("Language model circuit closed")
+            self.consecutive_failures = 0
+            self.opened_at = None
+            self.trial_in_flight = False
+
+    def record_failure(self):
+        with self.lock:
+            self.consecutive_failures += 1
+            if self.trial_in_flight or (self.opened_at is None and self.consecutive_failures >= self.failures):
+                logging.warning("Language model circuit opened after %d consecutive failures", self.consecutive_failures)
+                self.opened_at = time.monotonic()
+            self.trial_in_flight = False
+
+    def release(self):
+        """Give back a call allowed by allow() that never reached the provider"""
+        with self.lock:
+            self.trial_in_flight = False
+
+def is_retryable(error):
+    """Return True for failures a second attempt may not hit: timeouts, connection errors, 429 and 5xx"""
+    code = getattr(error, 'code', None)
+    if isinstance(code, int):
+        return code == 429 or code >= 500
+    # requests' exceptions, socket timeouts and refused connections are all OSErrors
+    return isinstance(error, OSError)
+
+class LLMClient:
+    """
+    Shared entry point for language model calls: enforces a deadline per call,
+    retries transient failures with jittered backoff, caps concurrent calls and
+    stops calling a failing provider (circuit breaker). When a call cannot be
+    made it raises LLMUnavailable, and when it fails the provider's error, so
+    callers fall back to their template answers.
+    """
+
+    def __init__(self, provider, deadline=LLM_DEADLINE_SECONDS, max_retries=LLM_MAX_RETRIES,
+                 backoff=LLM_RETRY_BACKOFF_SECONDS, max_concurrency=LLM_MAX_CONCURRENCY, breaker=None):
+        """
+        Args:
+            provider: GeminiProvider, HttpProvider or any object with ready(profile),
+                generate(prompt, profile, timeout) and stream(prompt, profile, timeout);
+                None makes every call LLMUnavailable
+            deadline (float): Seconds allowed per call, retries included
+            max_retries (int): Retries after the first attempt
+            backoff (float): Base of the exponential backoff, in seconds
+            max_concurrency (int): Calls in flight at once
+            breaker (CircuitBreaker): Defaults to one with the LLM_BREAKER_* settings
+        """
+        self.provider = provider
+        self.deadline = deadline
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_concurrency = max_concurrency
+        self.slots = threading.BoundedSemaphore(max_concurrency)
+        self.breaker = breaker or CircuitBreaker()
+
+    def available(self):
+        """Return True if a provider is configured (its circuit may still be open)"""
+        return self.provider is not None
+
+    def unavailable_reason(self, use='analysis'):
+        """
+        Return why a call for this use would be refused without reaching the provider
+        ('unavailable' or 'circuit_open'), or None if it may be made now
+        """
+        if self.provider is None or not self.provider.ready(use):
+            return 'unavailable'
+        if self.breaker.state == 'open':
+            return 'circuit_open'
+        return None
+
+    def _start_call(self, deadline_at, use):
+        # A provider that is not configured is not failing, so it never reaches the breaker
+        if self.provider is None or not self.provider.ready(use):
+            raise LLMUnavailable('unavailable')
+        if not self.slots.acquire(timeout=max(0.0, deadline_at - time.monotonic())):
+            raise LLMUnavailable('busy')
+        if not self.breaker.allow():
+            self.slots.release()
+            raise LLMUnavailable('circuit_open')
+
+    def _retry_delay(self, attempt, error, deadline_at):
+        """Return the backoff before the next attempt, or None if the error should be raised"""
+        if attempt >= self.max_retries or not is_retryable(error):
+            return None
+        delay = random.uniform(0, min(LLM_RETRY_BACKOFF_CAP_SECONDS, self.backoff * 2 ** attempt))
+        if time.monotonic() + delay >= deadline_at:
+            return None
+        return delay
+
+    def generate(self, prompt, use='analysis', deadline=None):
+        """
+        Generate the complete answer to a prompt
+
+        Args:
+            prompt (str): The prompt
+            use (str): Key of gemini_client.MODEL_PROFILES, also the metrics label
+            deadline (float): Seconds allowed, retries included (default: the client's deadline)
+
+        Returns:
+            str: The answer
+
+        Raises:
+            LLMUnavailable: The call was not made
+            Exception: The provider's error from the last attempt
+        """
+        deadline_at = time.monotonic() + (deadline or self.deadline)
+        self._start_call(deadline_at, use)
+        try:
+            with LLM_CALLS_IN_FLIGHT.track_in_progress():
+                attempt = 0
+                while True:
+                    try:
+                        remaining = deadline_at - time.monotonic()
+                        if remaining <= 0:
+                            raise TimeoutError(f"Language model deadline of {deadline or self.deadline}s exceeded")
+                        text = self.provider.generate(prompt, use, remaining)
+                        break
+                    except LLMUnavailable:
+                        self.breaker.release()
+                        raise
+                    except Exception as e:
+                        delay = self._retry_delay(attempt, e, deadline_at)
+                        if delay is None:
+                            self.breaker.record_failure()
+                            LLM_CALLS.inc(use=use, outcome='error')
+                            raise
+                        logging.warning("Language model call failed (%s), retrying in %.2fs", str(e), delay)
+                        LLM_RETRIES.inc(use=use)
+                        time.sleep(delay)
+                        attempt += 1
+            self.breaker.record_success()
+            LLM_CALLS.inc(use=use, outcome='success')
+            return text
+        finally:
+            self.slots.release()
+
+    def stream(self, prompt, use='analysis', deadline=None):
+        """
+        Yield the answer to a prompt in chunks as it is generated. Failures before
+        the first chunk are retried like generate; later ones are raised, since
+        text already passed on cannot be taken back.
+
+        Args:
+            prompt (str): The prompt
+            use (str): Key of gemini_client.MODEL_PROFILES, also the metrics label
+            deadline (float): Seconds allowed until the first chunk, and between chunks
+
+        Raises:
+            LLMUnavailable: The call was not made (raised on the first next())
+            Exception: The provider's error
+        """
+        timeout = deadline or self.deadline
+        deadline_at = time.monotonic() + timeout
+        self._start_call(deadline_at, use)
+        try:
+            with LLM_CALLS_IN_FLIGHT.track_in_progress():
+                attempt = 0
+                produced_output = False
+                while True:
+                    try:
+                        remaining = deadline_at - time.monotonic()
+                        if remaining <= 0:
+                            raise TimeoutError(f"Language model deadline of {timeout}s exceeded")
+                        for text in self.provider.stream(prompt, use, remaining if not produced_output else timeout):
+                            produced_output = True
+                            yield text
+                        break
+                    except LLMUnavailable:
+                        self.breaker.release()
+                        raise
+                    except Exception as e:
+                        delay = None if produced_output else self._retry_delay(attempt, e, deadline_at)
+                        if delay is None:
+                            self.breaker.record_failure()
+                            LLM_CALLS.inc(use=use, outcome='error')
+                            raise
+                        logging.warning("Language model stream failed (%s), retrying in %.2fs", str(e), delay)
+                        LLM_RETRIES.inc(use=use)
+                        time.sleep(delay)
+                        attempt += 1
+            self.breaker.record_success()
+            LLM_CALLS.inc(use=use, outcome='success')
+        except GeneratorExit:
+            # The caller stopped reading (e.g. the browser went away); the provider was answering
+            self.breaker.record_success()
+            raise
+        finally:
+            self.slots.release()
+
+    def stats(self):
+        return {
+            'provider': self.provider.name if self.provider is not None else None,
+            'circuit': self.breaker.state,
+            'consecutive_failures': self.breaker.consecutive_failures,
+            'max_concurrency': self.max_concurrency,
+            'deadline_seconds': self.deadline,
+            'max_retries': self.max_retries
+        }
+
+def create_llm_client(provider=LLM_PROVIDER):
+    """
+    Build the client for a provider name ('gemini', 'http' or 'none')
+
+    Returns:
+        LLMClient: The client; with 'none' or an unknown name every call is LLMUnavailable
+    """
+    if provider not in PROVIDERS and provider != 'none':
+        logging.error("Unknown LLM_PROVIDER %r; language model calls are disabled", provider)
+    provider_class = PROVIDERS.get(provider)
+    return LLMClient(provider_class() if provider_class else None)
+
+# Shared client for the application
+llm_client = create_llm_client()
+
+Gauge('legalai_llm_circuit_open', 'Whether language model calls are failing fast (1 open, 0.5 half-open, 0 closed)',
+      function=lambda: {'closed': 0, 'half_open': 0.5, 'open': 1}[llm_client.breaker.state])
@@ -0,0 +1,412 @@
+#!/usr/bin/env python3
+"""
+Load-test a running deployment with synthetic or recorded case submissions.
+
+Each simulated user submits a case to /submit_case, opens the analysis page,
+views the case at /case/<id>, optionally waits for the analysis and asks
+follow-up questions at /chat_response. Users run closed-loop (each of the
+--concurrency users starts the next session when one ends) or, with --rate,
+arrive open-loop at that many sessions per second. While the test runs the
+driver samples /metrics and /analysis_queue for in-flight requests, model
+calls and queue depth (under gunicorn each sample comes from whichever worker
+answers). The report has throughput, latency percentiles and error rates per
+step, how late sessions started (the driver itself saturating) and the
+saturation samples.
+
+To run fully offline, start the application against the stub model server:
+
+    python loadtest.py --start-app "gunicorn -w 4 -b 127.0.0.1:5000 main:app" --llm-latency-ms 800
+    python loadtest.py --base-url http://127.0.0.1:5000 --concurrency 32 --sessions 500
+    python loadtest.py --rate 5 --duration 120 --cases posts.jsonl --chat 2 --wait-analysis
+"""
+import argparse
+import http.cookiejar
+import json
+import os
+import random
+import re
+import shlex
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from stats import percentile
+import logging
+
+DEFAULT_BASE_URL = 'http://127.0.0.1:5000'
+
+# Follow-up questions asked at /chat_response
+CHAT_QUESTIONS = ['What evidence should I collect?', 'How long will the trial take?',
+                  'Can the accused get bail?', 'Should I hire a lawyer now?', 'What happens after I file the FIR?']
+
+# Case id in the analysis page (the status URL it polls)
+CASE_ID_PATTERN = re.compile(r'/case/(\d+)/status')
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        return None
+
+class Recorder:
+    """Collects per-step latencies and outcomes from every simulated user"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.steps = {}
+        self.start_lags = []
+        self.sessions = 0
+        self.failed_sessions = 0
+
+    def record(self, step, seconds, ok, status=None):
+        with self.lock:
+            entry = self.steps.setdefault(step, {'latencies': [], 'errors': 0, 'statuses': {}})
+            entry['latencies'].append(seconds)
+            if not ok:
+                entry['errors'] += 1
+            key = str(status if status is not None else 'exception')
+            entry['statuses'][key] = entry['statuses'].get(key, 0) + 1
+
+    def session_done(self, ok, start_lag):
+        with self.lock:
+            self.sessions += 1
+            if not ok:
+                self.failed_sessions += 1
+            self.start_lags.append(start_lag)
+
+class SaturationSampler:
+    """Samples the server's in-flight gauges and analysis queue depth in the background"""
+
+    GAUGES = ('legalai_http_requests_in_flight', 'legalai_llm_calls_in_flight')
+
+    def __init__(self, base_url, interval=1.0):
+        self.base_url = base_url
+        self.interval = interval
+        self.samples = []
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+
+    def _run(self):
+        while not self.stopped.wait(self.interval):
+            sample = {'t': time.time()}
+            try:
+                with urllib.request.urlopen(self.base_url + '/metrics', timeout=5) as response:
+                    for line in response.read().decode().splitlines():
+                        name, _, value = line.partition(' ')
+                        if name in self.GAUGES:
+                            sample[name] = float(value)
+                with urllib.request.urlopen(self.base_url + '/analysis_queue', timeout=5) as response:
+                    sample['analysis_queue_depth'] = json.load(response).get('depth', 0)
+            except (OSError, ValueError) as e:
+                sample['error'] = str(e)
+            self.samples.append(sample)
+
+    def summary(self):
+        summary = {'samples': len(self.samples), 'failed_samples': sum('error' in sample for sample in self.samples)}
+        for name in self.GAUGES + ('analysis_queue_depth',):
+            values = [sample[name] for sample in self.samples if name in sample]
+            if values:
+                summary[name] = {'max': max(values), 'mean': round(sum(values) / len(values), 2)}
+        return summary
+
+def _request(opener, recorder, step, url, data=None, json_body=None, timeout=60):
+    """
+    Make one request and record it
+
+    Returns:
+        tuple: (status or None, headers, body text)
+    """
+    headers = {}
+    if json_body is not None:
+        data = json.dumps(json_body).encode()
+        headers['Content-Type'] = 'application/json'
+    elif data is not None:
+        data = urllib.parse.urlencode(data).encode()
+    started = time.perf_counter()
+    try:
+        with opener.open(urllib.request.Request(url, data=data, headers=headers), timeout=timeout) as response:
+            body = response.read().decode(errors='replace')
+            status, response_headers = response.status, response.headers
+    except urllib.error.HTTPError as e:
+        body = e.read().decode(errors='replace')
+        status, response_headers = e.code, e.headers
+    except OSError as e:
+        recorder.record(step, time.perf_counter() - started, False)
+        logging.debug("%s failed: %s", step, e)
+        return None, {}, ''
+    # Redirects are not followed, so a 302 from /submit_case is a normal answer
+    ok = status < 400
+    recorder.record(step, time.perf_counter() - started, ok, status)
+    return status, response_headers, body
+
+def run_session(base_url, form, recorder, chat_questions=0, wait_analysis=False, analysis_timeout=120, rng=None):
+    """
+    Play one user: submit the case, open its analysis and case pages, optionally
+    wait for the analysis and ask follow-up questions
+
+    Returns:
+        bool: True if every step succeeded
+    """
+    rng = rng or random.Random()
+    opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()), _NoRedirect)
+    submitted = time.perf_counter()
+
+    status, headers, _ = _request(opener, recorder, 'submit_case', base_url + '/submit_case', data=form)
+    # A successful submission redirects to the analysis page, a failed one back to the form
+    if status != 302 or not headers.get('Location', '').rstrip('/').endswith('/analysis'):
+        if status is not None:
+            recorder.record('submit_case_rejected', 0.0, False, status)
+        return False
+
+    status, _, body = _request(opener, recorder, 'analysis', base_url + '/analysis')
+    match = CASE_ID_PATTERN.search(body) if status == 200 else None
+    if not match:
+        return False
+    case_id = match.group(1)
+
+    status, _, _ = _request(opener, recorder, 'case', f"{base_url}/case/{case_id}")
+    ok = status == 200
+
+    if wait_analysis:
+        deadline = submitted + analysis_timeout
+        while True:
+            status, _, body = _request(opener, recorder, 'case_status', f"{base_url}/case/{case_id}/status")
+            if status == 200 and json.loads(body).get('status') == 'complete':
+                recorder.record('analysis_ready', time.perf_counter() - submitted, True, 200)
+                break
+            if status != 200 or time.perf_counter() > deadline:
+                recorder.record('analysis_ready', time.perf_counter() - submitted, False, status)
+                ok = False
+                break
+            time.sleep(0.5)
+
+    for _ in range(chat_questions):
+        status, _, _ = _request(opener, recorder, 'chat_response', base_url + '/chat_response',
+                                json_body={'case_id': int(case_id), 'question': rng.choice(CHAT_QUESTIONS)})
+        ok = ok and status == 200
+    return ok
+
+def load_forms(path=None, count=1000, seed=0):
+    """
+    Return the form posts to replay: a JSONL file of form posts or evaluation
+    dataset cases, or count generated cases
+    """
+    from generate_cases import generate_cases, form_post
+
+    if not path:
+        return [form_post(case, index) for index, case in enumerate(generate_cases(count, seed), 1)]
+    forms = []
+    with open(path) as f:
+        for index, line in enumerate(f, 1):
+            if line.strip():
+                case = json.loads(line)
+                forms.append(case if 'email' in case else form_post(case, index))
+    return forms
+
+def run_load(base_url, forms, concurrency=8, sessions=None, duration=None, rate=None, chat_questions=0,
+             wait_analysis=False, seed=0):
+    """
+    Run the load test
+
+    Args:
+        base_url (str): Application URL
+        forms (list): Form posts, replayed in order (and cycled)
+        concurrency (int): Simulated users running at once
+        sessions (int): Stop after this many sessions
+        duration (float): Stop starting sessions after this many seconds
+        rate (float): Open-loop arrivals per second (Poisson); None runs closed-loop
+        chat_questions (int): Follow-up questions per session
+        wait_analysis (bool): Poll the case status until the analysis is complete
+        seed (int): Random seed for arrivals and questions
+
+    Returns:
+        dict: Report with 'meta', 'steps', 'sessions' and 'saturation'
+    """
+    if sessions is None and duration is None:
+        sessions = len(forms)
+    rng = random.Random(seed)
+    recorder = Recorder()
+    sampler = SaturationSampler(base_url)
+    sampler.start()
+    counter = iter(range(sys.maxsize))
+    counter_lock = threading.Lock()
+    started = time.perf_counter()
+
+    def next_session():
+        with counter_lock:
+            number = next(counter)
+        if (sessions is not None and number >= sessions) or (duration is not None and time.perf_counter() - started > duration):
+            return None
+        return number
+
+    def play(number, scheduled):
+        lag = time.perf_counter() - scheduled
+        ok = run_session(base_url, forms[number % len(forms)], recorder, chat_questions, wait_analysis,
+                         rng=random.Random(seed + number))
+        recorder.session_done(ok, lag)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        if rate:
+            # Open loop: arrivals keep coming on schedule however slow the server gets;
+            # a session that cannot start on time shows up as start lag
+            scheduled = time.perf_counter()
+            while True:
+                number = next_session()
+                if number is None:
+                    break
+                scheduled += rng.expovariate(rate)
+                time.sleep(max(0.0, scheduled - time.perf_counter()))
+                executor.submit(play, number, scheduled)
+        else:
+            def user():
+                while True:
+                    number = next_session()
+                    if number is None:
+                        return
+                    play(number, time.perf_counter())
+            for _ in range(concurrency):
+                executor.submit(user)
+    elapsed = time.perf_counter() - started
+    sampler.stop()
+
+    steps = {}
+    for step, entry in recorder.steps.items():
+        latencies = entry['latencies']
+        steps[step] = {
+            'requests': len(latencies),
+            'errors': entry['errors'],
+            'error_rate': round(entry['errors'] / len(latencies), 4) if latencies else 0.0,
+            'throughput_per_s': round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+            'p50_ms': round(percentile(latencies, 0.50) * 1000, 1),
+            'p95_ms': round(percentile(latencies, 0.95) * 1000, 1),
+            'p99_ms': round(percentile(latencies, 0.99) * 1000, 1),
+            'max_ms': round(max(latencies) * 1000, 1) if latencies else 0.0,
+            'statuses': entry['statuses']
+        }
+    return {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'base_url': base_url,
+            'concurrency': concurrency,
+            'rate': rate,
+            'seconds': round(elapsed, 2),
+            'chat_questions': chat_questions,
+            'wait_analysis': wait_analysis
+        },
+        'sessions': {
+            'completed': recorder.sessions,
+            'failed': recorder.failed_sessions,
+            'per_second': round(recorder.sessions / elapsed, 2) if elapsed else 0.0,
+            'start_lag_p95_ms': round(percentile(recorder.start_lags, 0.95) * 1000, 1),
+            'start_lag_max_ms': round(max(recorder.start_lags, default=0.0) * 1000, 1)
+        },
+        'steps': steps,
+        'saturation': sampler.summary()
+    }
+
+def start_app(command, base_url, llm_settings, database_url=None, ready_timeout=180):
+    """
+    Start the stub model server and the application, wired to it
+
+    Args:
+        command (str): Command that serves the application at base_url
+        base_url (str): Application URL, polled until it answers
+        llm_settings (StubSettings): Stub latency and failure distribution
+        database_url (str): DATABASE_URL for the application; defaults to a fresh SQLite file
+
+    Returns:
+        tuple: (application process, stub server)
+    """
+    from stub_llm import start_stub_server
+
+    stub = start_stub_server(llm_settings, port=0)
+    env = dict(os.environ,
+               GEMINI_API_KEY='stub',
+               GEMINI_API_ENDPOINT=f"http://127.0.0.1:{stub.server_address[1]}",
+               DATABASE_URL=database_url or 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'loadtest.db'),
+               RESULT_CACHE_BACKEND=os.environ.get('RESULT_CACHE_BACKEND', 'none'),
+               LOG_LEVEL=os.environ.get('LOG_LEVEL', 'WARNING'))
+    process = subprocess.Popen(shlex.split(command), env=env, cwd=os.path.dirname(os.path.abspath(__file__)))
+    deadline = time.time() + ready_timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Application exited with status {process.returncode}")
+        try:
+            urllib.request.urlopen(base_url + '/', timeout=2).read()
+            return process, stub
+        except OSError:
+            time.sleep(0.5)
+    process.terminate()
+    raise RuntimeError(f"Application did not answer at {base_url} within {ready_timeout}s")
+
+def print_report(report):
+    meta, sessions = report['meta'], report['sessions']
+    mode = f"{meta['rate']}/s arrivals" if meta['rate'] else f"{meta['concurrency']} users"
+    print(f"\n{sessions['completed']} sessions in {meta['seconds']}s ({mode}): {sessions['per_second']}/s, "
+          f"{sessions['failed']} failed, start lag p95 {sessions['start_lag_p95_ms']} ms")
+    print(f"{'STEP':<22} | {'REQUESTS':>8} | {'ERRORS':>7} | {'RATE/S':>7} | {'P50 MS':>8} | {'P95 MS':>8} | {'P99 MS':>8}")
+    print("-" * 86)
+    for step, stats in report['steps'].items():
+        print(f"{step:<22} | {stats['requests']:>8} | {stats['error_rate']:>7.2%} | {stats['throughput_per_s']:>7.2f} | "
+              f"{stats['p50_ms']:>8.1f} | {stats['p95_ms']:>8.1f} | {stats['p99_ms']:>8.1f}")
+    saturation = report['saturation']
+    for name in SaturationSampler.GAUGES + ('analysis_queue_depth',):
+        if name in saturation:
+            print(f"{name}: max {saturation[name]['max']}, mean {saturation[name]['mean']}")
+
+def main():
+    parser = argparse.ArgumentParser(description='Load-test /submit_case, /case/<id> and /chat_response')
+    parser.add_argument('--base-url', default=DEFAULT_BASE_URL, help='Application URL')
+    parser.add_argument('--cases', help='JSONL of form posts or dataset cases to replay (default: generated cases)')
+    parser.add_argument('--seed', type=int, default=0, help='Seed for generated cases, arrivals and questions')
+    parser.add_argument('--concurrency', type=int, default=8, help='Simulated users at once (closed loop), or the cap on them')
+    parser.add_argument('--rate', type=float, help='Open-loop session arrivals per second')
+    parser.add_argument('--sessions', type=int, help='Sessions to run (default: one per case)')
+    parser.add_argument('--duration', type=float, help='Stop starting sessions after this many seconds')
+    parser.add_argument('--chat', type=int, default=1, help='Follow-up questions per session')
+    parser.add_argument('--wait-analysis', action='store_true', help='Poll each case until its analysis is complete')
+    parser.add_argument('--output', help='Write the JSON report to this file')
+    parser.add_argument('--start-app', metavar='COMMAND',
+                        help='Start the application with this command, wired to a local stub model server')
+    parser.add_argument('--database', help='DATABASE_URL for --start-app (default: a fresh SQLite file)')
+    parser.add_argument('--llm-latency-ms', type=float, default=500, help='Stub model mean latency')
+    parser.add_argument('--llm-latency-sd-ms', type=float, default=100, help='Stub model latency standard deviation')
+    parser.add_argument('--llm-error-rate', type=float, default=0.0, help='Share of stub model calls that fail')
+    parser.add_argument('--llm-hang-rate', type=float, default=0.0, help='Share of stub model calls that stall')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    forms = load_forms(args.cases, args.sessions or 1000, args.seed)
+
+    process = None
+    if args.start_app:
+        from stub_llm import StubSettings
+        settings = StubSettings(args.llm_latency_ms, args.llm_latency_sd_ms, args.llm_error_rate,
+                                hang_rate=args.llm_hang_rate, seed=args.seed)
+        print(f"Starting the application: {args.start_app}", file=sys.stderr)
+        process, _ = start_app(args.start_app, args.base_url, settings, args.database)
+    try:
+        report = run_load(args.base_url, forms, args.concurrency, args.sessions, args.duration, args.rate,
+                          args.chat, args.wait_analysis, args.seed)
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait(timeout=30)
+
+    print_report(report)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+if __name__ == "__main__":
+    main()
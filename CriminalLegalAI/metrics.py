@@ -0,0 +1,215 @@
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# Upper bounds (seconds) of the latency histogram buckets
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+# Metrics are exposed on /metrics in the Prometheus text format. Each worker
+# process keeps its own values, so scrape every worker (or run one per port).
+_registry = []
+
+# (name, seconds) of the stages timed during the current request, for the Server-Timing header
+_request_timings = ContextVar('request_timings', default=None)
+
+class Metric:
+    """
+    Base for the metric types: a name, help text and one value per combination of label values
+    """
+    kind = 'untyped'
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.lock = threading.Lock()
+        self.values = {}
+        _registry.append(self)
+
+    def _key(self, labels):
+        if set(labels) != set(self.labels):
+            raise ValueError(f"{self.name} expects labels {self.labels}, got {tuple(labels)}")
+        return tuple(str(labels[label]) for label in self.labels)
+
+    def _label_text(self, key, extra=()):
+        pairs = list(zip(self.labels, key)) + list(extra)
+        if not pairs:
+            return ''
+        return '{' + ','.join(f'{label}="{_escape(value)}"' for label, value in pairs) + '}'
+
+    def samples(self):
+        """Yield (suffix, label text, value) for every exposed sample"""
+        with self.lock:
+            items = list(self.values.items())
+        for key, value in items:
+            yield '', self._label_text(key), value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(f"{self.name}{suffix}{labels} {_format_value(value)}" for suffix, labels, value in self.samples())
+        return '\n'.join(lines)
+
+class Counter(Metric):
+    """Monotonically increasing count, e.g. cache hits"""
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self.values.get(self._key(labels), 0)
+
+class Gauge(Metric):
+    """Value that goes up and down, e.g. requests in flight"""
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, labels=(), function=None):
+        """
+        Args:
+            function (callable): Returns the current value when scraped, instead of set/inc/dec
+        """
+        super().__init__(name, documentation, labels)
+        self.function = function
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def value(self, **labels):
+        return self.values.get(self._key(labels), 0)
+
+    @contextmanager
+    def track_in_progress(self, **labels):
+        """Count the block as in progress while it runs"""
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+    def samples(self):
+        if self.function is not None:
+            yield '', '', self.function()
+            return
+        yield from super().samples()
+
+class Histogram(Metric):
+    """Distribution of observed values (latencies in seconds) over cumulative buckets"""
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self.lock:
+            counts, total = self.values.get(key, ([0] * (len(self.buckets) + 1), 0.0))
+            for position, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[position] += 1
+                    break
+            else:
+                counts[-1] += 1
+            self.values[key] = (counts, total + value)
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe how long the block takes"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels):
+        counts, _ = self.values.get(self._key(labels), ([0], 0.0))
+        return sum(counts)
+
+    def samples(self):
+        with self.lock:
+            items = [(key, list(counts), total) for key, (counts, total) in self.values.items()]
+        for key, counts, total in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                yield '_bucket', self._label_text(key, [('le', _format_value(bound))]), cumulative
+            yield '_sum', self._label_text(key), total
+            yield '_count', self._label_text(key), cumulative
+
+# Application metrics
+STAGE_SECONDS = Histogram('legalai_stage_duration_seconds', 'Time spent in each stage of case processing', ['stage'])
+REQUEST_SECONDS = Histogram('legalai_http_request_duration_seconds', 'HTTP request latency', ['endpoint', 'method', 'status'])
+REQUESTS_IN_FLIGHT = Gauge('legalai_http_requests_in_flight', 'HTTP requests being handled')
+CACHE_LOOKUPS = Counter('legalai_result_cache_lookups_total', 'Result cache lookups', ['result'])
+LLM_CALLS = Counter('legalai_llm_calls_total', 'Calls to the language model', ['use', 'outcome'])
+LLM_CALLS_IN_FLIGHT = Gauge('legalai_llm_calls_in_flight', 'Language model calls in progress')
+LLM_RETRIES = Counter('legalai_llm_retries_total', 'Language model calls retried after a transient failure', ['use'])
+FALLBACKS = Counter('legalai_fallbacks_total', 'Template responses served instead of the language model', ['use', 'reason'])
+ANALYSIS_HEDGES = Counter('legalai_analysis_hedges_total', 'Hedged analyses by what the page was rendered with', ['outcome'])
+
+@contextmanager
+def time_stage(stage):
+    """
+    Time a stage of case processing: observed in STAGE_SECONDS and, during a
+    request, added to its Server-Timing header
+
+    Args:
+        stage (str): Stage name (a token: letters, digits, '_' or '-')
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.observe(elapsed, stage=stage)
+        timings = _request_timings.get()
+        if timings is not None:
+            timings.append((stage, elapsed))
+
+def start_request_timing():
+    """Start collecting stage timings for the current request"""
+    _request_timings.set([])
+
+def server_timing_header(total=None):
+    """
+    Return the Server-Timing header value for the stages timed so far in the current request
+
+    Args:
+        total (float): Request time in seconds, added as a 'total' entry
+
+    Returns:
+        str: Header value, or None if nothing was timed
+    """
+    timings = list(_request_timings.get() or [])
+    if total is not None:
+        timings.append(('total', total))
+    if not timings:
+        return None
+    return ', '.join(f"{stage};dur={elapsed * 1000:.1f}" for stage, elapsed in timings)
+
+def render_metrics():
+    """Return every registered metric in the Prometheus text exposition format"""
+    return '\n'.join(metric.render() for metric in _registry) + '\n'
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer() and abs(value) < 1e15:
+        return str(int(value))
+    return str(value)
@@ -1,31 +1,77 @@
-from utils import preprocess_text, extract_keywords, find_relevant_ipc_sections, find_relevant_precedents, generate_legal_analysis
+import copy
+import os
+from utils import extract_keywords, find_relevant_ipc_sections, find_relevant_ipc_sections_many, find_relevant_precedents, generate_legal_analysis_with_source, stream_legal_analysis, generate_model_analysis, generate_template_analysis
+from llm_client import llm_client, LLMUnavailable
 from ipc_data import ipc_sections
 from precedents_data import legal_precedents
+from result_cache import create_result_cache, case_cache_key
+from metrics import time_stage, FALLBACKS
 import logging
 
+# Cases scored together by process_many / iter_many; bounds the memory of one batch
+BATCH_SIZE = int(os.environ.get('BATCH_SIZE', '256'))
+
+def _collect(stream, chunks):
+    """Re-yield the chunks of stream, appending them to chunks, and return the stream's return value"""
+    while True:
+        try:
+            chunk = next(stream)
+        except StopIteration as stop:
+            return stop.value
+        chunks.append(chunk)
+        yield chunk
+
 class LegalQueryProcessor:
     """
     Process legal queries and generate relevant legal analysis
     """
     
-    def __init__(self):
-        """Initialize the NLP processor"""
-        self.ipc_data = ipc_sections
-        self.precedents = legal_precedents
+    def __init__(self, result_cache=None, indexes=None):
+        """
+        Initialize the NLP processor
+        
+        Args:
+            result_cache (ResultCache): Cache for processed results; defaults to the
+                one configured through the RESULT_CACHE_* environment settings
+            indexes (MatchingIndexes): Indexes to match against (see utils.build_matching_indexes);
+                defaults to the bundled corpus
+        """
+        self.indexes = indexes
+        if indexes is None:
+            self.ipc_data = ipc_sections
+            self.precedents = legal_precedents
+        else:
+            self.ipc_data = {section_id: indexed.data for section_id, indexed in indexes.ipc_index.items()}
+            self.precedents = {precedent_id: indexed.data for precedent_id, indexed in indexes.precedent_index.items()}
+        self.result_cache = result_cache if result_cache is not None else create_result_cache()
         logging.info("LegalQueryProcessor initialized with %d IPC sections and %d precedents", 
                      len(self.ipc_data), len(self.precedents))
     
-    def process_query(self, case_details):
+    def process_query(self, case_details, use_cache=True, include_analysis=True):
         """
         Process a legal query and return analysis
         
         Args:
             case_details (dict): Dictionary containing case details
+            use_cache (bool): Set to False to skip the result cache lookup and recompute
+            include_analysis (bool): Set to False for matcher-only processing: stop after
+                section and precedent retrieval and return without the analysis ('analysis'
+                is None), so the language model is never called. Complete it later with
+                complete_analysis, or use it as is to evaluate the matching alone
             
         Returns:
             dict: Results including relevant IPC sections, precedents, and analysis
         """
         logging.info("LegalQueryProcessor: Starting to process query")
+        
+        # Repeat submissions of the same case are served from the result cache
+        if self.result_cache and use_cache:
+            with time_stage('cache'):
+                cached_results = self.result_cache.get(case_details)
+            if cached_results is not None:
+                logging.info("LegalQueryProcessor: Returning cached results")
+                return cached_results
+        
         try:
             # Extract query text
             query_text = case_details.get('query', '')
@@ -40,8 +86,9 @@ class LegalQueryProcessor:
             # Extract keywords from the query
             logging.info("Extracting keywords")
             try:
-                keywords = extract_keywords(combined_text)
-                logging.info("Extracted %d keywords: %s", len(keywords), str(keywords[:10]))
+                with time_stage('keywords'):
+                    keywords = extract_keywords(combined_text)
+                logging.info("Extracted %d keywords: %s", len(keywords), keywords[:10])
             except Exception as e:
                 logging.error("Error extracting keywords: %s", str(e))
                 keywords = []
@@ -50,8 +97,9 @@ class LegalQueryProcessor:
             # Find relevant IPC sections
             logging.info("Finding relevant IPC sections")
             try:
-                relevant_ipc_ids = find_relevant_ipc_sections(keywords, case_details)
-                logging.info("Found %d relevant IPC sections: %s", len(relevant_ipc_ids), str(relevant_ipc_ids))
+                with time_stage('sections'):
+                    relevant_ipc_ids = find_relevant_ipc_sections(keywords, case_details, self.indexes)
+                logging.info("Found %d relevant IPC sections: %s", len(relevant_ipc_ids), relevant_ipc_ids)
             except Exception as e:
                 logging.error("Error finding relevant IPC sections: %s", str(e))
                 relevant_ipc_ids = []
@@ -60,16 +108,8 @@ class LegalQueryProcessor:
             # Get the detailed section data
             logging.info("Getting detailed IPC section data")
             try:
-                relevant_ipc_sections = [
-                    {
-                        'id': section_id,
-                        'number': self.ipc_data[section_id]['number'],
-                        'title': self.ipc_data[section_id]['title'],
-                        'description': self.ipc_data[section_id]['description'],
-                        'punishment': self.ipc_data[section_id]['punishment']
-                    }
-                    for section_id in relevant_ipc_ids if section_id in self.ipc_data
-                ]
+                with time_stage('section_details'):
+                    relevant_ipc_sections = self._section_details(relevant_ipc_ids)
                 logging.info("Processed %d detailed IPC sections", len(relevant_ipc_sections))
             except Exception as e:
                 logging.error("Error getting detailed section data: %s", str(e))
@@ -79,8 +119,9 @@ class LegalQueryProcessor:
             # Find relevant legal precedents
             logging.info("Finding relevant precedents")
             try:
-                relevant_precedent_ids = find_relevant_precedents(relevant_ipc_ids, keywords)
-                logging.info("Found %d relevant precedents: %s", len(relevant_precedent_ids), str(relevant_precedent_ids))
+                with time_stage('precedents'):
+                    relevant_precedent_ids = find_relevant_precedents(relevant_ipc_ids, keywords, self.indexes)
+                logging.info("Found %d relevant precedents: %s", len(relevant_precedent_ids), relevant_precedent_ids)
             except Exception as e:
                 logging.error("Error finding relevant precedents: %s", str(e))
                 relevant_precedent_ids = []
@@ -89,18 +130,8 @@ class LegalQueryProcessor:
             # Get the detailed precedent data
             logging.info("Getting detailed precedent data")
             try:
-                relevant_precedents = [
-                    {
-                        'id': precedent_id,
-                        'case_name': self.precedents[precedent_id]['case_name'],
-                        'citation': self.precedents[precedent_id]['citation'],
-                        'court': self.precedents[precedent_id]['court'],
-                        'year': self.precedents[precedent_id]['year'],
-                        'summary': self.precedents[precedent_id]['summary'],
-                        'implications': self.precedents[precedent_id]['implications']
-                    }
-                    for precedent_id in relevant_precedent_ids if precedent_id in self.precedents
-                ]
+                with time_stage('precedent_details'):
+                    relevant_precedents = self._precedent_details(relevant_precedent_ids)
                 logging.info("Processed %d detailed precedents", len(relevant_precedents))
             except Exception as e:
                 logging.error("Error getting detailed precedent data: %s", str(e))
@@ -108,14 +139,10 @@ class LegalQueryProcessor:
                 raise
             
             # Generate legal analysis
-            logging.info("Generating legal analysis")
-            try:
-                analysis = generate_legal_analysis(case_details, relevant_ipc_ids, relevant_precedent_ids)
-                logging.info("Legal analysis generated successfully (%d characters)", len(analysis) if analysis else 0)
-            except Exception as e:
-                logging.error("Error generating legal analysis: %s", str(e))
-                analysis = "We apologize, but we are unable to generate a detailed analysis at this time. Please try again later."
-                raise
+            analysis = None
+            from_model = False
+            if include_analysis:
+                analysis, from_model = self.generate_analysis(case_details, relevant_ipc_ids, relevant_precedent_ids)
             
             # If we don't have any IPC sections or precedents, provide some feedback
             if not relevant_ipc_sections:
@@ -128,11 +155,6 @@ class LegalQueryProcessor:
                 if relevant_ipc_sections:
                     logging.info("However, %d relevant IPC sections were found", len(relevant_ipc_sections))
             
-            # If we don't have any analysis, provide a fallback
-            if not analysis:
-                logging.warning("No analysis was generated")
-                analysis = "We apologize, but we could not generate a detailed analysis for your case at this time. Please try with more specific details."
-            
             # Compile and return results
             results = {
                 'ipc_sections': relevant_ipc_sections,
@@ -141,6 +163,13 @@ class LegalQueryProcessor:
                 'keywords': keywords
             }
             
+            # Error results never reach this point. Only language model analyses are
+            # cached: a template served because the model failed would otherwise be
+            # repeated for every identical case until it expired. Results without
+            # analysis are cached once complete_analysis fills them in
+            if self.result_cache and from_model:
+                self.result_cache.set(case_details, results)
+            
             logging.info("LegalQueryProcessor: Query processing completed successfully")
             return results
             
@@ -149,10 +178,328 @@ class LegalQueryProcessor:
             logging.error("Error in process_query: %s", str(e))
             logging.error(traceback.format_exc())
             # Provide a fallback result with error information
-            return {
-                'ipc_sections': [],
-                'precedents': [],
-                'analysis': f"We apologize, but an error occurred while processing your case: {str(e)}. Please try again later or with different information.",
-                'keywords': [],
-                'error': str(e)
+            return self._error_results(e)
+    
+    def process_many(self, cases, use_cache=True, include_analysis=True, batch_size=None):
+        """
+        Process a list of legal queries at once
+        
+        Args:
+            cases (list): Case details dicts
+            use_cache (bool): Set to False to skip the result cache lookup and recompute
+            include_analysis (bool): As for process_query
+            batch_size (int): Cases scored together; defaults to BATCH_SIZE
+            
+        Returns:
+            list: One result dict per case, in input order, as returned by process_query
+        """
+        return list(self.iter_many(cases, use_cache, include_analysis, batch_size))
+    
+    def iter_many(self, cases, use_cache=True, include_analysis=True, batch_size=None):
+        """
+        Process any iterable of legal queries in batches, so very large inputs are
+        streamed through in bounded memory
+        
+        Args:
+            cases (iterable): Case details dicts
+            use_cache (bool): Set to False to skip the result cache lookup and recompute
+            include_analysis (bool): As for process_query
+            batch_size (int): Cases scored together; defaults to BATCH_SIZE
+            
+        Yields:
+            dict: One result dict per case, in input order
+        """
+        batch_size = batch_size or BATCH_SIZE
+        batch = []
+        for case_details in cases:
+            batch.append(case_details)
+            if len(batch) >= batch_size:
+                yield from self._process_batch(batch, use_cache, include_analysis)
+                batch = []
+        if batch:
+            yield from self._process_batch(batch, use_cache, include_analysis)
+    
+    def _process_batch(self, batch, use_cache, include_analysis):
+        """
+        Process one batch: identical cases are processed once, and the section
+        scores of all remaining cases come from a single matrix product
+        
+        Returns:
+            list: One result dict per case, in batch order
+        """
+        logging.info("LegalQueryProcessor: Processing batch of %d cases", len(batch))
+        keys = [case_cache_key(case_details) for case_details in batch]
+        unique_cases = {}
+        for key, case_details in zip(keys, batch):
+            unique_cases.setdefault(key, case_details)
+        logging.info("%d unique cases in batch", len(unique_cases))
+        
+        results_by_key = {}
+        if self.result_cache and use_cache:
+            for key, case_details in unique_cases.items():
+                cached_results = self.result_cache.get(case_details)
+                if cached_results is not None:
+                    results_by_key[key] = cached_results
+        
+        # Keywords per case; a case whose keywords fail gets an error result on its own
+        pending = []
+        for key, case_details in unique_cases.items():
+            if key in results_by_key:
+                continue
+            try:
+                combined_text = case_details.get('query', '') + " " + case_details.get('offense_description', '')
+                with time_stage('keywords'):
+                    pending.append((key, case_details, extract_keywords(combined_text)))
+            except Exception as e:
+                logging.error("Error extracting keywords: %s", str(e))
+                results_by_key[key] = self._error_results(e)
+        
+        if pending:
+            try:
+                with time_stage('sections_batch'):
+                    section_ids_list = find_relevant_ipc_sections_many(
+                        [keywords for _, _, keywords in pending], [case_details for _, case_details, _ in pending],
+                        self.indexes)
+            except Exception as e:
+                # One bad case must not fail the batch; process_query isolates the failure
+                logging.error("Error scoring batch, processing cases one at a time: %s", str(e))
+                for key, case_details, _ in pending:
+                    results_by_key[key] = self.process_query(case_details, use_cache=False,
+                                                             include_analysis=include_analysis)
+                pending, section_ids_list = [], []
+            
+            for (key, case_details, keywords), relevant_ipc_ids in zip(pending, section_ids_list):
+                try:
+                    with time_stage('precedents'):
+                        relevant_precedent_ids = find_relevant_precedents(relevant_ipc_ids, keywords, self.indexes)
+                    analysis = None
+                    from_model = False
+                    if include_analysis:
+                        analysis, from_model = self.generate_analysis(case_details, relevant_ipc_ids,
+                                                                      relevant_precedent_ids)
+                    results = {
+                        'ipc_sections': self._section_details(relevant_ipc_ids),
+                        'precedents': self._precedent_details(relevant_precedent_ids),
+                        'analysis': analysis,
+                        'keywords': keywords
+                    }
+                except Exception as e:
+                    logging.error("Error processing case in batch: %s", str(e))
+                    results_by_key[key] = self._error_results(e)
+                    continue
+                if self.result_cache and from_model:
+                    self.result_cache.set(case_details, results)
+                results_by_key[key] = results
+        
+        # Duplicates get their own copy, so callers can update results independently
+        ordered_results = []
+        returned = set()
+        for key in keys:
+            results = results_by_key[key]
+            ordered_results.append(copy.deepcopy(results) if key in returned else results)
+            returned.add(key)
+        return ordered_results
+    
+    def _section_details(self, section_ids):
+        """Return the detailed section data for section IDs"""
+        return [
+            {
+                'id': section_id,
+                'number': self.ipc_data[section_id]['number'],
+                'title': self.ipc_data[section_id]['title'],
+                'description': self.ipc_data[section_id]['description'],
+                'punishment': self.ipc_data[section_id]['punishment']
             }
+            for section_id in section_ids if section_id in self.ipc_data
+        ]
+    
+    def _precedent_details(self, precedent_ids):
+        """Return the detailed precedent data for precedent IDs"""
+        return [
+            {
+                'id': precedent_id,
+                'case_name': self.precedents[precedent_id]['case_name'],
+                'citation': self.precedents[precedent_id]['citation'],
+                'court': self.precedents[precedent_id]['court'],
+                'year': self.precedents[precedent_id]['year'],
+                'summary': self.precedents[precedent_id]['summary'],
+                'implications': self.precedents[precedent_id]['implications']
+            }
+            for precedent_id in precedent_ids if precedent_id in self.precedents
+        ]
+    
+    def results_from_matches(self, case_details, ipc_section_ids, precedent_ids):
+        """
+        Rebuild process_query(include_analysis=False) results from matches stored
+        earlier, e.g. with a case, so that complete_analysis or stream_analysis
+        cache them in the same shape as process_query does
+        
+        Args:
+            case_details (dict): Dictionary containing case details
+            ipc_section_ids (list): Stored IPC section IDs
+            precedent_ids (list): Stored precedent IDs
+            
+        Returns:
+            dict: Results with 'analysis' None
+        """
+        combined_text = (case_details.get('query') or '') + " " + (case_details.get('offense_description') or '')
+        return {
+            'ipc_sections': self._section_details(ipc_section_ids),
+            'precedents': self._precedent_details(precedent_ids),
+            'analysis': None,
+            'keywords': extract_keywords(combined_text)
+        }
+    
+    def _error_results(self, error):
+        """Return the fallback result for a case that could not be processed"""
+        return {
+            'ipc_sections': [],
+            'precedents': [],
+            'analysis': f"We apologize, but an error occurred while processing your case: {str(error)}. Please try again later or with different information.",
+            'keywords': [],
+            'error': str(error)
+        }
+    
+    def generate_analysis(self, case_details, relevant_ipc_ids, relevant_precedent_ids):
+        """
+        Generate the legal analysis for already matched sections and precedents
+        
+        Args:
+            case_details (dict): Dictionary containing case details
+            relevant_ipc_ids (list): Matched IPC section IDs
+            relevant_precedent_ids (list): Matched precedent IDs
+            
+        Returns:
+            tuple: (HTML analysis, True if the language model wrote it rather than the template fallback)
+        """
+        logging.info("Generating legal analysis")
+        try:
+            with time_stage('analysis'):
+                analysis, from_model = generate_legal_analysis_with_source(case_details, relevant_ipc_ids,
+                                                                           relevant_precedent_ids)
+            logging.info("Legal analysis generated successfully (%d characters)", len(analysis) if analysis else 0)
+        except Exception as e:
+            logging.error("Error generating legal analysis: %s", str(e))
+            raise
+        
+        # If we don't have any analysis, provide a fallback
+        if not analysis:
+            logging.warning("No analysis was generated")
+            analysis = "We apologize, but we could not generate a detailed analysis for your case at this time. Please try with more specific details."
+            from_model = False
+        return analysis, from_model
+    
+    def complete_analysis(self, case_details, results):
+        """
+        Fill in the analysis of results returned by process_query(include_analysis=False)
+        
+        Args:
+            case_details (dict): Dictionary containing case details
+            results (dict): Results from process_query; updated in place
+            
+        Returns:
+            str: HTML analysis
+        """
+        relevant_ipc_ids = [section['id'] for section in results['ipc_sections']]
+        relevant_precedent_ids = [precedent['id'] for precedent in results['precedents']]
+        results['analysis'], from_model = self.generate_analysis(case_details, relevant_ipc_ids, relevant_precedent_ids)
+        # Template fallbacks are not cached (see process_query)
+        if self.result_cache and from_model:
+            self.result_cache.set(case_details, results)
+        return results['analysis']
+    
+    def template_analysis(self, case_details, results):
+        """
+        Fill in the template analysis of results returned by
+        process_query(include_analysis=False), without calling the language model.
+        The results are not cached, so a later upgrade_analysis can replace it.
+        
+        Args:
+            case_details (dict): Dictionary containing case details
+            results (dict): Results from process_query; updated in place
+            
+        Returns:
+            str: HTML analysis
+        """
+        relevant_ipc_ids = [section['id'] for section in results['ipc_sections']]
+        relevant_precedent_ids = [precedent['id'] for precedent in results['precedents']]
+        with time_stage('template_analysis'):
+            results['analysis'] = generate_template_analysis(case_details, relevant_ipc_ids, relevant_precedent_ids)
+        return results['analysis']
+    
+    def upgrade_unavailable_reason(self):
+        """
+        Return why upgrade_analysis would keep the template without calling the
+        language model ('unavailable' or 'circuit_open'), or None if it may call it
+        """
+        return llm_client.unavailable_reason('analysis')
+    
+    def upgrade_analysis(self, case_details, results):
+        """
+        Generate the language model analysis for results that already carry the
+        template analysis. Unlike complete_analysis there is no template fallback:
+        if the model fails the results are left as they are.
+        
+        Args:
+            case_details (dict): Dictionary containing case details
+            results (dict): Results from process_query; updated in place on success
+            
+        Returns:
+            str: HTML analysis, or None if the language model gave no answer
+        """
+        relevant_ipc_ids = [section['id'] for section in results['ipc_sections']]
+        relevant_precedent_ids = [precedent['id'] for precedent in results['precedents']]
+        try:
+            with time_stage('analysis'):
+                analysis = generate_model_analysis(case_details, relevant_ipc_ids, relevant_precedent_ids)
+        except LLMUnavailable as e:
+            logging.warning("Keeping the template analysis: %s", str(e))
+            FALLBACKS.inc(use='analysis', reason=e.reason)
+            return None
+        except Exception as e:
+            logging.error("Error generating analysis with the language model: %s", str(e))
+            FALLBACKS.inc(use='analysis', reason='error')
+            return None
+        if not analysis:
+            logging.warning("The language model returned an empty analysis")
+            FALLBACKS.inc(use='analysis', reason='error')
+            return None
+        
+        results['analysis'] = analysis
+        if self.result_cache:
+            self.result_cache.set(case_details, results)
+        return analysis
+    
+    def stream_analysis(self, case_details, results):
+        """
+        Stream the analysis of results returned by process_query(include_analysis=False),
+        yielding HTML chunks as they are generated. Once the stream is exhausted the
+        complete analysis is stored in results['analysis'], and cached if the
+        language model wrote it.
+        
+        Args:
+            case_details (dict): Dictionary containing case details
+            results (dict): Results from process_query; updated in place
+            
+        Yields:
+            str: Chunks of the HTML analysis
+        """
+        relevant_ipc_ids = [section['id'] for section in results['ipc_sections']]
+        relevant_precedent_ids = [precedent['id'] for precedent in results['precedents']]
+        logging.info("Streaming legal analysis")
+        chunks = []
+        # The stream's return value says whether the language model wrote the analysis
+        from_model = yield from _collect(stream_legal_analysis(case_details, relevant_ipc_ids, relevant_precedent_ids),
+                                         chunks)
+        
+        analysis = "".join(chunks)
+        if not analysis:
+            logging.warning("No analysis was generated")
+            analysis = "We apologize, but we could not generate a detailed analysis for your case at this time. Please try with more specific details."
+            from_model = False
+            yield analysis
+        logging.info("Legal analysis streamed successfully (%d characters)", len(analysis))
+        results['analysis'] = analysis
+        # Template fallbacks are not cached (see process_query)
+        if self.result_cache and from_model:
+            self.result_cache.set(case_details, results)
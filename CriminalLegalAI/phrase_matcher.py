@@ -0,0 +1,108 @@
+from collections import deque
+
+class PhraseMatcher:
+    """
+    Aho-Corasick automaton that finds every occurrence of a set of phrases
+    in a single pass over the text, independent of the number of phrases
+    """
+
+    def __init__(self):
+        # Trie transitions, failure links, the patterns ending at each node and,
+        # once built, those plus the patterns of the node's failure chain
+        self.transitions = [{}]
+        self.fail = [0]
+        self.terminals = [[]]
+        self.outputs = [[]]
+        self.patterns = []
+        self.built = False
+
+    def add(self, phrase, payload, whole_words=True):
+        """
+        Add a phrase to the automaton
+
+        Args:
+            phrase (str): Phrase to look for (matched case-sensitively, so pass lowercase text)
+            payload: Value reported with every match of this phrase
+            whole_words (bool): Only report matches that start and end on word boundaries
+        """
+        if not phrase:
+            return
+        node = 0
+        for character in phrase:
+            next_node = self.transitions[node].get(character)
+            if next_node is None:
+                next_node = len(self.transitions)
+                self.transitions[node][character] = next_node
+                self.transitions.append({})
+                self.fail.append(0)
+                self.terminals.append([])
+            node = next_node
+        self.terminals[node].append(len(self.patterns))
+        self.patterns.append((phrase, payload, whole_words))
+        self.built = False
+
+    def build(self):
+        """Compute failure links; called automatically before the first scan"""
+        # Start from each node's own patterns, so building again never repeats inherited ones
+        self.outputs = [list(terminal) for terminal in self.terminals]
+        queue = deque()
+        for next_node in self.transitions[0].values():
+            self.fail[next_node] = 0
+            queue.append(next_node)
+        while queue:
+            node = queue.popleft()
+            for character, next_node in self.transitions[node].items():
+                queue.append(next_node)
+                fallback = self.fail[node]
+                while fallback and character not in self.transitions[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[next_node] = self.transitions[fallback].get(character, 0)
+                if self.fail[next_node] == next_node:
+                    self.fail[next_node] = 0
+                # Inherit the matches of the longest proper suffix
+                self.outputs[next_node] = self.outputs[next_node] + self.outputs[self.fail[next_node]]
+        self.built = True
+
+    def find_all(self, text):
+        """
+        Find all phrase occurrences in text
+
+        Args:
+            text (str): Text to scan
+
+        Returns:
+            list: (start, end, phrase, payload) tuples in order of their end position
+        """
+        if not self.built:
+            self.build()
+        transitions = self.transitions
+        fail = self.fail
+        outputs = self.outputs
+        patterns = self.patterns
+        matches = []
+        node = 0
+        for index, character in enumerate(text):
+            while node and character not in transitions[node]:
+                node = fail[node]
+            node = transitions[node].get(character, 0)
+            for pattern_id in outputs[node]:
+                phrase, payload, whole_words = patterns[pattern_id]
+                start = index - len(phrase) + 1
+                if whole_words and not _on_word_boundaries(text, start, index + 1):
+                    continue
+                matches.append((start, index + 1, phrase, payload))
+        return matches
+
+    def __len__(self):
+        return len(self.patterns)
+
+def _is_word_character(character):
+    return character.isalnum() or character == '_'
+
+def _on_word_boundaries(text, start, end):
+    """Check that text[start:end] is not part of a longer word"""
+    if start > 0 and _is_word_character(text[start - 1]) and _is_word_character(text[start]):
+        return False
+    if end < len(text) and _is_word_character(text[end]) and _is_word_character(text[end - 1]):
+        return False
+    return True
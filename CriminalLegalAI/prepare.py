@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Verify (and by default download) the NLTK data the application needs.
+
+Run once per environment, e.g. during the image build, before starting the
+web workers; the workers themselves never download anything:
+
+    python prepare.py            # download whatever is missing
+    python prepare.py --check    # only verify; exits with status 1 if data is missing
+"""
+import argparse
+import sys
+import nltk
+
+# NLTK resource name -> path checked with nltk.data.find
+NLTK_RESOURCES = {
+    'punkt': 'tokenizers/punkt',
+    'punkt_tab': 'tokenizers/punkt_tab',
+    'stopwords': 'corpora/stopwords',
+    'wordnet': 'corpora/wordnet'
+}
+
+def missing_nltk_resources(resources=None):
+    """
+    Return the names of the NLTK resources that are not installed
+
+    Args:
+        resources (iterable): Names to check (default: every key of NLTK_RESOURCES)
+    """
+    missing = []
+    for resource in resources or NLTK_RESOURCES:
+        try:
+            nltk.data.find(NLTK_RESOURCES[resource])
+        except LookupError:
+            missing.append(resource)
+    return missing
+
+def prepare(download=True, download_dir=None):
+    """
+    Check the NLTK data and download anything missing
+
+    Args:
+        download (bool): Download missing resources instead of only reporting them
+        download_dir (str): Where to download to (defaults to NLTK's own choice)
+
+    Returns:
+        list: Resources still missing afterwards
+    """
+    missing = missing_nltk_resources()
+    for resource in NLTK_RESOURCES:
+        print(f"- {resource}: {'missing' if resource in missing else 'ok'}")
+
+    if missing and download:
+        for resource in missing:
+            print(f"- Downloading {resource}...")
+            nltk.download(resource, download_dir=download_dir, quiet=True)
+        missing = missing_nltk_resources()
+
+    return missing
+
+def main():
+    parser = argparse.ArgumentParser(description='Verify and download the NLTK data used by the application')
+    parser.add_argument('--check', action='store_true', help='Only verify; do not download')
+    parser.add_argument('--download-dir', help='Directory to download NLTK data into')
+    args = parser.parse_args()
+
+    print("Checking NLTK dependencies...")
+    missing = prepare(download=not args.check, download_dir=args.download_dir)
+    if missing:
+        print(f"Missing NLTK data: {', '.join(missing)}")
+        sys.exit(1)
+    print("All NLTK dependencies are available")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+import cProfile
+import hmac
+import os
+import re
+import threading
+import time
+import logging
+
+# Profiling is only available when an admin token is configured; requests and the
+# profile endpoints authenticate with it in the PROFILE_TOKEN_HEADER header
+PROFILE_ADMIN_TOKEN = os.environ.get('PROFILE_ADMIN_TOKEN')
+PROFILE_TOKEN_HEADER = 'X-Admin-Token'
+
+# Header that profiles the request it is sent with (together with the admin token)
+PROFILE_REQUEST_HEADER = 'X-Profile'
+
+# Where the cProfile dumps go, and how many are kept (oldest are deleted first)
+PROFILE_DIR = os.environ.get('PROFILE_DIR', 'profiles')
+PROFILE_KEEP = int(os.environ.get('PROFILE_KEEP', '50'))
+
+# Dump file names: <timestamp>-<endpoint>-<pid>-<sequence>.prof; the pid keeps dumps of
+# different workers apart, and dumps named before it was added still match
+PROFILE_NAME_PATTERN = re.compile(r'^[0-9]{8}T[0-9]{6}-[A-Za-z0-9_.]+(-[0-9]+)?-[0-9]+\.prof$')
+
+def is_admin(request):
+    """Return True if the request carries the configured admin token"""
+    if not PROFILE_ADMIN_TOKEN:
+        return False
+    token = request.headers.get(PROFILE_TOKEN_HEADER, '')
+    return hmac.compare_digest(token.encode(), PROFILE_ADMIN_TOKEN.encode())
+
+class RequestProfiler:
+    """
+    Runs selected requests under cProfile and writes each one's stats to a
+    rotating directory of .prof dumps (load them with pstats or snakeviz).
+
+    A request is profiled when it asks for it with the admin token and the
+    X-Profile header, or while the "next N requests" switch is armed. When
+    neither applies the cost per request is a couple of attribute checks.
+    Only one request is profiled at a time; others run normally meanwhile.
+    """
+
+    def __init__(self, directory=PROFILE_DIR, keep=PROFILE_KEEP):
+        self.directory = directory
+        self.keep = keep
+        self.lock = threading.Lock()
+        self.remaining = 0
+        self.active = False
+        self.sequence = 0
+
+    def arm(self, count):
+        """Profile the next count requests (0 disarms)"""
+        with self.lock:
+            self.remaining = max(0, int(count))
+        logging.info("Profiling armed for the next %d requests", self.remaining)
+        return self.remaining
+
+    def start(self, request):
+        """
+        Start profiling the current request if it should be profiled
+
+        Returns:
+            cProfile.Profile: The running profiler, or None
+        """
+        if not self.remaining and not (PROFILE_ADMIN_TOKEN and request.headers.get(PROFILE_REQUEST_HEADER)):
+            return None
+        with self.lock:
+            if self.active:
+                return None
+            if self.remaining:
+                self.remaining -= 1
+            elif not is_admin(request):
+                return None
+            self.active = True
+            self.sequence += 1
+        profile = cProfile.Profile()
+        profile.enable()
+        return profile
+
+    def stop(self, profile, endpoint):
+        """
+        Stop a profiler returned by start and write its dump
+
+        Returns:
+            str: File name of the dump
+        """
+        profile.disable()
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            name = f"{time.strftime('%Y%m%dT%H%M%S')}-{re.sub(r'[^A-Za-z0-9_.]', '_', endpoint or 'unknown')}-{os.getpid()}-{self.sequence}.prof"
+            profile.dump_stats(os.path.join(self.directory, name))
+            self._rotate()
+            logging.info("Request profile written to %s", name)
+            return name
+        finally:
+            with self.lock:
+                self.active = False
+
+    def _rotate(self):
+        dumps = self.list()
+        for dump in dumps[self.keep:]:
+            try:
+                os.remove(os.path.join(self.directory, dump['name']))
+            except OSError:
+                pass
+
+    def list(self):
+        """
+        Return the available dumps, newest first
+
+        Returns:
+            list: {'name', 'size', 'created'} for each dump
+        """
+        if not os.path.isdir(self.directory):
+            return []
+        dumps = []
+        for name in os.listdir(self.directory):
+            if PROFILE_NAME_PATTERN.match(name):
+                stat = os.stat(os.path.join(self.directory, name))
+                dumps.append({'name': name, 'size': stat.st_size, 'created': stat.st_mtime})
+        dumps.sort(key=lambda dump: dump['created'], reverse=True)
+        return dumps
+
+    def path(self, name):
+        """Return the path of a dump, or None if there is no such dump"""
+        if not PROFILE_NAME_PATTERN.match(name):
+            return None
+        path = os.path.join(self.directory, name)
+        return path if os.path.isfile(path) else None
+
+    def stats(self):
+        return {'enabled': bool(PROFILE_ADMIN_TOKEN), 'remaining': self.remaining,
+                'active': self.active, 'directory': self.directory, 'keep': self.keep}
+
+# Shared profiler for the web application
+request_profiler = RequestProfiler()
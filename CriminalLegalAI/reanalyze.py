@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+"""
+Re-run IPC section and precedent matching over every stored case, e.g. after
+the scoring rules or the corpus change, and write the new matches back.
+
+Cases are read in keyset-paginated chunks (WHERE id > last id ORDER BY id),
+matched across a process pool and written back one transaction per chunk, so
+memory stays bounded however many rows the table has. After each committed
+chunk the last case id is saved to a checkpoint file, along with the id
+ranges of chunks that failed; --resume first retries those ranges and then
+continues after the last case id. The exit status is 1 while any cases
+remain failed.
+
+    python reanalyze.py                    # re-match all cases and update them
+    python reanalyze.py --dry-run          # only print what would change
+    python reanalyze.py --resume           # retry failed chunks and continue an interrupted run
+"""
+import argparse
+import itertools
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from sqlalchemy import create_engine, MetaData, Table, select, update, func, bindparam
+import logging
+
+# Same database as the web application (see app.py); relative SQLite paths live in the instance folder
+DEFAULT_DATABASE_URL = os.environ.get(
+    'DATABASE_URL',
+    'sqlite:///' + os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instance', 'legal_assistant.db'))
+
+DEFAULT_CHECKPOINT = 'reanalyze.checkpoint.json'
+
+# Columns read for matching, in addition to the current matches
+CASE_COLUMNS = ('id', 'case_type', 'offense_description', 'query', 'incident_date', 'incident_location',
+                'victim_details', 'accused_details', 'evidence_summary', 'ipc_sections', 'relevant_precedents')
+
+def case_details_from_row(row):
+    """Build the case details dictionary used by the processor from a case row"""
+    return {
+        'case_type': row['case_type'] or '',
+        'offense_description': row['offense_description'] or '',
+        'query': row['query'] or '',
+        'incident_date': row['incident_date'].strftime('%Y-%m-%d') if row['incident_date'] else "Unknown",
+        'incident_location': row['incident_location'] if row['incident_location'] else "Unknown",
+        'victim_details': row['victim_details'] or '',
+        'accused_details': row['accused_details'] or '',
+        'evidence_summary': row['evidence_summary'] or ''
+    }
+
+def _init_worker():
+    # Build the indexes once per worker process rather than once per chunk
+    logging.disable(logging.INFO)
+    import utils  # noqa: F401
+
+def match_chunk(rows):
+    """
+    Re-match a chunk of cases; runs in a worker process
+
+    Args:
+        rows (list): Case rows as dicts with the CASE_COLUMNS keys
+
+    Returns:
+        list: (case_id, ipc_sections, relevant_precedents) per case, the
+              matches as comma-separated IDs
+    """
+    from utils import extract_keywords, find_relevant_ipc_sections_many, find_relevant_precedents
+
+    details_list = [case_details_from_row(row) for row in rows]
+    keywords_list = [
+        extract_keywords(case_details['query'] + " " + case_details['offense_description'])
+        for case_details in details_list
+    ]
+    section_ids_list = find_relevant_ipc_sections_many(keywords_list, details_list)
+    return [
+        (row['id'], ','.join(section_ids), ','.join(find_relevant_precedents(section_ids, keywords)))
+        for row, keywords, section_ids in zip(rows, keywords_list, section_ids_list)
+    ]
+
+def iter_chunks(engine, cases, after_id, chunk_size):
+    """Yield lists of case rows with id > after_id, chunk_size at a time, using keyset pagination"""
+    columns = [cases.c[name] for name in CASE_COLUMNS]
+    while True:
+        with engine.connect() as connection:
+            rows = connection.execute(
+                select(*columns).where(cases.c.id > after_id).order_by(cases.c.id).limit(chunk_size)
+            ).mappings().all()
+        if not rows:
+            return
+        yield [dict(row) for row in rows]
+        after_id = rows[-1]['id']
+
+def iter_failed_chunks(engine, cases, failed_ranges):
+    """
+    Re-read the cases of each failed chunk
+
+    Args:
+        failed_ranges (list): [first_id, last_id, count] of each failed chunk
+
+    Yields:
+        tuple: (failed range, case rows with first_id <= id <= last_id)
+    """
+    columns = [cases.c[name] for name in CASE_COLUMNS]
+    for failed_range in list(failed_ranges):
+        first_id, last_id, _ = failed_range
+        with engine.connect() as connection:
+            rows = connection.execute(
+                select(*columns).where(cases.c.id.between(first_id, last_id)).order_by(cases.c.id)
+            ).mappings().all()
+        yield failed_range, [dict(row) for row in rows]
+
+def load_checkpoint(path):
+    """Return the saved checkpoint, or a fresh one if there is none"""
+    if path and os.path.exists(path):
+        with open(path) as f:
+            checkpoint = json.load(f)
+        # Checkpoints written before failed chunks were tracked only have the count
+        checkpoint.setdefault('failed_ranges', [])
+        return checkpoint
+    return {'last_id': 0, 'processed': 0, 'changed': 0, 'failed': 0, 'failed_ranges': []}
+
+def save_checkpoint(path, checkpoint):
+    """Write the checkpoint atomically, so an interrupted write never loses the previous one"""
+    temporary_path = path + '.tmp'
+    with open(temporary_path, 'w') as f:
+        json.dump(checkpoint, f)
+    os.replace(temporary_path, path)
+
+def _diff_ids(old, new):
+    old_ids = set(old.split(',')) if old else set()
+    new_ids = set(new.split(',')) if new else set()
+    return sorted(new_ids - old_ids), sorted(old_ids - new_ids)
+
+def print_diff(row, ipc_sections, relevant_precedents):
+    """Print how a case's matches would change"""
+    print(f"Case {row['id']} ({row['case_type']}):")
+    for label, old, new in (('sections', row['ipc_sections'], ipc_sections),
+                            ('precedents', row['relevant_precedents'], relevant_precedents)):
+        if (old or '') == new:
+            continue
+        added, removed = _diff_ids(old, new)
+        order_only = ' (order only)' if not added and not removed else ''
+        print(f"  {label}: {old or '-'} -> {new or '-'}{order_only}")
+        for section_id in added:
+            print(f"    + {section_id}")
+        for section_id in removed:
+            print(f"    - {section_id}")
+
+def reanalyze(database_url=DEFAULT_DATABASE_URL, workers=None, chunk_size=500, checkpoint_path=DEFAULT_CHECKPOINT,
+              resume=False, dry_run=False, limit=None):
+    """
+    Re-match stored cases and write the changed matches back
+
+    Args:
+        database_url (str): SQLAlchemy database URL
+        workers (int): Worker processes; defaults to the CPU count
+        chunk_size (int): Cases per chunk, which is also the unit of each write transaction
+        checkpoint_path (str): Checkpoint file, updated after every committed chunk
+        resume (bool): Retry the chunks that failed, then continue after the case id
+            saved in the checkpoint
+        dry_run (bool): Print the changes instead of writing them; the checkpoint is left alone
+        limit (int): Stop after this many cases (chunks being retried are taken whole)
+
+    Returns:
+        dict: The final checkpoint: last_id, processed, changed and failed counts, and
+              the [first_id, last_id, count] ranges of the chunks that failed
+    """
+    engine = create_engine(database_url)
+    cases = Table('case', MetaData(), autoload_with=engine)
+    checkpoint = load_checkpoint(checkpoint_path) if resume else load_checkpoint(None)
+    if resume:
+        print(f"Resuming after case {checkpoint['last_id']} ({checkpoint['processed']} already processed, "
+              f"{checkpoint['failed']} failed to retry)")
+
+    with engine.connect() as connection:
+        remaining = connection.execute(
+            select(func.count()).select_from(cases).where(cases.c.id > checkpoint['last_id'])).scalar()
+    remaining += checkpoint['failed']
+    if limit is not None:
+        remaining = min(remaining, limit)
+    print(f"{remaining} cases to re-analyze{' (dry run)' if dry_run else ''}")
+
+    write_matches = update(cases).where(cases.c.id == bindparam('case_id')).values(
+        ipc_sections=bindparam('new_ipc_sections'), relevant_precedents=bindparam('new_relevant_precedents'))
+
+    workers = workers or os.cpu_count() or 1
+    started = time.perf_counter()
+    done = 0
+    # Failed chunks are retried first; new chunks carry no failed range
+    chunks = itertools.chain(
+        iter_failed_chunks(engine, cases, checkpoint['failed_ranges']),
+        ((None, rows) for rows in iter_chunks(engine, cases, checkpoint['last_id'], chunk_size)))
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as executor:
+        # A few chunks per worker in flight keeps the pool busy while bounding memory;
+        # chunks are completed in submission order so the checkpoint is always a safe restart point
+        in_flight = deque()
+        submitted = 0
+        while True:
+            while len(in_flight) < workers * 2 and (limit is None or submitted < limit):
+                retried_range, rows = next(chunks, (None, None))
+                if rows is None:
+                    break
+                if not rows:
+                    # Every case of the failed chunk has been deleted since
+                    checkpoint['failed_ranges'].remove(retried_range)
+                    checkpoint['failed'] -= retried_range[2]
+                    continue
+                if limit is not None and retried_range is None:
+                    rows = rows[:limit - submitted]
+                submitted += len(rows)
+                in_flight.append((retried_range, rows, executor.submit(match_chunk, rows)))
+            if not in_flight:
+                break
+
+            retried_range, rows, future = in_flight.popleft()
+            try:
+                matches = future.result()
+                failed = False
+            except Exception as e:
+                # The cases keep their current matches; the range is saved so --resume retries it
+                logging.error("Error re-analyzing cases %d-%d: %s", rows[0]['id'], rows[-1]['id'], str(e))
+                matches = []
+                failed = True
+
+            rows_by_id = {row['id']: row for row in rows}
+            changes = []
+            for case_id, ipc_sections, relevant_precedents in matches:
+                row = rows_by_id[case_id]
+                if (row['ipc_sections'] or '') != ipc_sections or (row['relevant_precedents'] or '') != relevant_precedents:
+                    changes.append({'case_id': case_id, 'new_ipc_sections': ipc_sections,
+                                    'new_relevant_precedents': relevant_precedents})
+                    if dry_run:
+                        print_diff(row, ipc_sections, relevant_precedents)
+
+            if changes and not dry_run:
+                with engine.begin() as connection:
+                    connection.execute(write_matches, changes)
+
+            done += len(rows)
+            if retried_range is None:
+                checkpoint['last_id'] = rows[-1]['id']
+                checkpoint['processed'] += len(rows)
+            else:
+                checkpoint['failed_ranges'].remove(retried_range)
+                checkpoint['failed'] -= retried_range[2]
+            if failed:
+                checkpoint['failed_ranges'].append([rows[0]['id'], rows[-1]['id'], len(rows)])
+                checkpoint['failed'] += len(rows)
+            checkpoint['changed'] += len(changes)
+            if not dry_run and checkpoint_path:
+                save_checkpoint(checkpoint_path, checkpoint)
+
+            elapsed = time.perf_counter() - started
+            rate = done / elapsed if elapsed else 0
+            eta = (remaining - done) / rate if rate else 0
+            print(f"{done}/{remaining} cases ({rate:.0f}/s, eta {eta:.0f}s), "
+                  f"{checkpoint['changed']} changed, {checkpoint['failed']} failed", file=sys.stderr, flush=True)
+
+    print(f"Done: {checkpoint['processed']} processed, {checkpoint['changed']} "
+          f"{'would change' if dry_run else 'changed'}, {checkpoint['failed']} failed")
+    if checkpoint['failed'] and not dry_run:
+        print("Run again with --resume to retry the failed cases")
+    return checkpoint
+
+def main():
+    parser = argparse.ArgumentParser(description='Re-run section and precedent matching over stored cases')
+    parser.add_argument('--database', default=DEFAULT_DATABASE_URL, help='Database URL (default: DATABASE_URL or the app database)')
+    parser.add_argument('--workers', type=int, help='Worker processes (default: CPU count)')
+    parser.add_argument('--chunk-size', type=int, default=500, help='Cases per chunk and write transaction')
+    parser.add_argument('--checkpoint', default=DEFAULT_CHECKPOINT, help='Checkpoint file')
+    parser.add_argument('--resume', action='store_true', help='Retry failed chunks, then continue after the last checkpointed case')
+    parser.add_argument('--dry-run', action='store_true', help='Print the changes without writing them')
+    parser.add_argument('--limit', type=int, help='Stop after this many cases')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    checkpoint = reanalyze(args.database, args.workers, args.chunk_size, args.checkpoint, args.resume,
+                           args.dry_run, args.limit)
+    if checkpoint['failed']:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+import json
+import os
+import random
+import time
+import uuid
+from contextvars import ContextVar
+import logging
+
+# Fraction of requests traced without being asked (0 disables sampling)
+TRACE_SAMPLE_RATE = float(os.environ.get('TRACE_SAMPLE_RATE', '0'))
+
+# Request header that forces a trace of that request; the trace id is returned in TRACE_ID_HEADER
+TRACE_HEADER = 'X-Debug-Trace'
+TRACE_ID_HEADER = 'X-Trace-Id'
+
+_current_trace = ContextVar('request_trace', default=None)
+
+class RequestTrace:
+    """
+    Structured explanation of how one request was scored: each stage records
+    a small dict of plain data, and nothing is formatted until the trace is
+    serialized at the end of the request
+    """
+
+    def __init__(self, trace_id=None, reason='sampled'):
+        """
+        Args:
+            trace_id (str): Identifier returned to the client; generated if not given
+            reason (str): Why the request is traced ('sampled' or 'header')
+        """
+        self.trace_id = trace_id or uuid.uuid4().hex[:16]
+        self.reason = reason
+        self.started = time.perf_counter()
+        self.events = []
+
+    def record(self, stage, **data):
+        """Record a stage's data; values must be JSON serializable (sets are fine)"""
+        self.events.append((round((time.perf_counter() - self.started) * 1000, 2), stage, data))
+
+    def to_dict(self):
+        return {
+            'trace_id': self.trace_id,
+            'reason': self.reason,
+            'events': [dict(data, stage=stage, ms=ms) for ms, stage, data in self.events]
+        }
+
+    def to_json(self):
+        return json.dumps(self.to_dict(), separators=(',', ':'), default=_json_default)
+
+def current_trace():
+    """Return the trace of the current request, or None when it is not traced"""
+    return _current_trace.get()
+
+def start_trace(requested=False, trace_id=None):
+    """
+    Start tracing the current request if it was requested or is sampled
+
+    Args:
+        requested (bool): The client asked for a trace (debug header)
+        trace_id (str): Identifier to use for the trace
+
+    Returns:
+        RequestTrace: The trace, or None when the request is not traced
+    """
+    if requested:
+        trace = RequestTrace(trace_id, 'header')
+    elif TRACE_SAMPLE_RATE > 0 and random.random() < TRACE_SAMPLE_RATE:
+        trace = RequestTrace(trace_id, 'sampled')
+    else:
+        trace = None
+    _current_trace.set(trace)
+    return trace
+
+def finish_trace():
+    """
+    Stop tracing the current request and log the trace as one JSON line
+
+    Returns:
+        RequestTrace: The finished trace, or None when the request was not traced
+    """
+    trace = _current_trace.get()
+    _current_trace.set(None)
+    if trace is not None:
+        logging.info("Request trace: %s", trace.to_json())
+    return trace
+
+def _json_default(value):
+    if isinstance(value, (set, frozenset)):
+        return sorted(value)
+    if hasattr(value, 'item'):
+        # NumPy scalars
+        return value.item()
+    return str(value)
@@ -0,0 +1,300 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from ipc_data import ipc_sections
+from precedents_data import legal_precedents
+from scoring_rules import scoring_rules
+from metrics import CACHE_LOOKUPS
+import logging
+
+# Case fields that influence the processed result, and so the cache key
+CACHE_KEY_FIELDS = (
+    'case_type', 'offense_description', 'query', 'incident_date', 'incident_location',
+    'victim_details', 'accused_details', 'evidence_summary'
+)
+
+# Bump when a code change alters the processed result for the same inputs
+RESULT_CACHE_VERSION = 1
+
+def data_digest(sections, precedents, rules):
+    """
+    Fingerprint of everything besides the case that a cached result depends on
+
+    Args:
+        sections (dict): IPC sections (see ipc_data)
+        precedents (dict): Legal precedents (see precedents_data)
+        rules (ScoringRules): Compiled rule table
+
+    Returns:
+        str: Hex digest that changes whenever the corpus or rule table does
+    """
+    corpus = json.dumps([sections, precedents], sort_keys=True, separators=(',', ':'), default=str)
+    digest = hashlib.sha256(corpus.encode('utf-8'))
+    digest.update(rules.digest.encode('ascii'))
+    return digest.hexdigest()
+
+# Part of every key, so the persistent backends stop serving results computed
+# from an older corpus or rule table once workers restart with the new one
+CACHE_KEY_PREFIX = f"v{RESULT_CACHE_VERSION}:{data_digest(ipc_sections, legal_precedents, scoring_rules)[:16]}:"
+
+def normalize_case_details(case_details):
+    """
+    Canonical form of the case fields: trimmed, whitespace collapsed and
+    case-folded, so trivially different resubmissions share a cache entry
+    """
+    return {
+        field: ' '.join(str(case_details.get(field) or '').split()).casefold()
+        for field in CACHE_KEY_FIELDS
+    }
+
+def case_cache_key(case_details):
+    """Return a stable hash of the normalized case details, under the cache version and data digest"""
+    canonical = json.dumps(normalize_case_details(case_details), sort_keys=True, separators=(',', ':'))
+    return CACHE_KEY_PREFIX + hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+class MemoryCacheBackend:
+    """
+    In-process LRU cache with per-entry expiry
+    """
+
+    def __init__(self, max_entries=1000):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at <= time.time():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self.lock:
+            self.entries[key] = (value, time.time() + ttl)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def delete(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+class SQLiteCacheBackend:
+    """
+    On-disk cache in a SQLite file, shared by every worker on the host.
+    Expired rows are dropped on read and the least recently used rows are
+    evicted once the table grows past max_entries.
+    """
+
+    def __init__(self, path, max_entries=10000):
+        self.path = path
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        with self._connect() as connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS result_cache ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL, last_access REAL NOT NULL)"
+            )
+            connection.execute("CREATE INDEX IF NOT EXISTS result_cache_last_access ON result_cache (last_access)")
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=5)
+
+    def get(self, key):
+        now = time.time()
+        with self.lock, self._connect() as connection:
+            row = connection.execute(
+                "SELECT value, expires_at FROM result_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if row[1] <= now:
+                connection.execute("DELETE FROM result_cache WHERE key = ?", (key,))
+                return None
+            connection.execute("UPDATE result_cache SET last_access = ? WHERE key = ?", (now, key))
+            return row[0]
+
+    def set(self, key, value, ttl):
+        now = time.time()
+        with self.lock, self._connect() as connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO result_cache (key, value, expires_at, last_access) VALUES (?, ?, ?, ?)",
+                (key, value, now + ttl, now)
+            )
+            count = connection.execute("SELECT COUNT(*) FROM result_cache").fetchone()[0]
+            if count > self.max_entries:
+                connection.execute("DELETE FROM result_cache WHERE expires_at <= ?", (now,))
+                connection.execute(
+                    "DELETE FROM result_cache WHERE key IN "
+                    "(SELECT key FROM result_cache ORDER BY last_access LIMIT ?)",
+                    (max(0, count - self.max_entries),)
+                )
+
+    def delete(self, key):
+        with self.lock, self._connect() as connection:
+            connection.execute("DELETE FROM result_cache WHERE key = ?", (key,))
+
+    def clear(self):
+        with self.lock, self._connect() as connection:
+            connection.execute("DELETE FROM result_cache")
+
+class RedisCacheBackend:
+    """
+    Cache stored in Redis (or anything speaking its get/set/delete API).
+    Entries expire through Redis TTLs; size-based eviction is left to the
+    server's maxmemory policy.
+    """
+
+    def __init__(self, client, prefix='legalai:result:'):
+        self.client = client
+        self.prefix = prefix
+
+    def get(self, key):
+        value = self.client.get(self.prefix + key)
+        if isinstance(value, bytes):
+            value = value.decode('utf-8')
+        return value
+
+    def set(self, key, value, ttl):
+        self.client.set(self.prefix + key, value, ex=max(1, int(ttl)))
+
+    def delete(self, key):
+        self.client.delete(self.prefix + key)
+
+    def clear(self):
+        for key in list(self.client.scan_iter(match=self.prefix + '*')):
+            self.client.delete(key)
+
+class FakeRedis:
+    """
+    Minimal in-process stand-in for a Redis client, for tests and local runs
+    without a Redis server
+    """
+
+    def __init__(self):
+        self.store = {}
+        self.lock = threading.Lock()
+
+    def get(self, name):
+        with self.lock:
+            entry = self.store.get(name)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= time.time():
+                del self.store[name]
+                return None
+            return value.encode('utf-8')
+
+    def set(self, name, value, ex=None):
+        with self.lock:
+            self.store[name] = (value, time.time() + ex if ex else None)
+        return True
+
+    def delete(self, *names):
+        with self.lock:
+            return sum(1 for name in names if self.store.pop(name, None) is not None)
+
+    def scan_iter(self, match=None):
+        prefix = match[:-1] if match and match.endswith('*') else match
+        with self.lock:
+            names = list(self.store)
+        return [name for name in names if prefix is None or name.startswith(prefix)]
+
+class ResultCache:
+    """
+    Cache of processed case results keyed on the normalized case details
+    """
+
+    def __init__(self, backend, ttl=3600):
+        """
+        Args:
+            backend: Storage backend (memory, SQLite or Redis)
+            ttl (int): Seconds a result stays valid
+        """
+        self.backend = backend
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, case_details):
+        """Return the cached result for these case details, or None"""
+        try:
+            value = self.backend.get(case_cache_key(case_details))
+        except Exception as e:
+            logging.error("Result cache lookup failed: %s", str(e))
+            value = None
+        if value is None:
+            self.misses += 1
+            CACHE_LOOKUPS.inc(result='miss')
+            return None
+        self.hits += 1
+        CACHE_LOOKUPS.inc(result='hit')
+        return json.loads(value)
+
+    def set(self, case_details, result):
+        """Store a result for these case details"""
+        try:
+            self.backend.set(case_cache_key(case_details), json.dumps(result, default=str), self.ttl)
+        except Exception as e:
+            logging.error("Result cache store failed: %s", str(e))
+
+    def invalidate(self, case_details):
+        """Remove the cached result for these case details"""
+        self.backend.delete(case_cache_key(case_details))
+
+    def clear(self):
+        self.backend.clear()
+
+    def stats(self):
+        return {'backend': type(self.backend).__name__, 'hits': self.hits, 'misses': self.misses}
+
+def create_result_cache(backend=None, ttl=None, max_entries=None):
+    """
+    Create the result cache from arguments or environment settings
+
+    Settings:
+        RESULT_CACHE_BACKEND: memory (default), sqlite, redis, fakeredis or none
+        RESULT_CACHE_TTL: Seconds results stay valid (default 3600)
+        RESULT_CACHE_SIZE: Maximum number of entries (default 1000)
+        RESULT_CACHE_PATH: SQLite file for the sqlite backend
+        REDIS_URL: Server for the redis backend
+
+    Returns:
+        ResultCache: The cache, or None when caching is disabled
+    """
+    backend = (backend or os.environ.get('RESULT_CACHE_BACKEND', 'memory')).lower()
+    ttl = ttl if ttl is not None else int(os.environ.get('RESULT_CACHE_TTL', '3600'))
+    max_entries = max_entries if max_entries is not None else int(os.environ.get('RESULT_CACHE_SIZE', '1000'))
+
+    if backend in ('none', 'off', 'disabled'):
+        logging.info("Result cache disabled")
+        return None
+    if backend == 'memory':
+        storage = MemoryCacheBackend(max_entries)
+    elif backend == 'sqlite':
+        storage = SQLiteCacheBackend(os.environ.get('RESULT_CACHE_PATH', 'result_cache.db'), max_entries)
+    elif backend == 'redis':
+        import redis
+        storage = RedisCacheBackend(redis.Redis.from_url(os.environ.get('REDIS_URL', 'redis://localhost:6379/0')))
+    elif backend == 'fakeredis':
+        storage = RedisCacheBackend(FakeRedis())
+    else:
+        raise ValueError(f"Unknown result cache backend: {backend}")
+
+    logging.info("Result cache enabled (%s backend, ttl %ds)", backend, ttl)
+    return ResultCache(storage, ttl)
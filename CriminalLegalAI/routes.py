@@ -1,51 +1,68 @@
-from flask import render_template, request, redirect, url_for, flash, session, jsonify
+from flask import render_template, request, redirect, url_for, flash, session, jsonify, Response, stream_with_context, send_file, abort
 from app import app, db
 from models import User, Case
 from nlp_processor import LegalQueryProcessor
-from datetime import datetime
+from analysis_jobs import AnalysisJobQueue
+from llm_client import llm_client, LLMUnavailable
+from result_cache import MemoryCacheBackend
+from metrics import Gauge, FALLBACKS, render_metrics
+from profiling import request_profiler, is_admin
+from datetime import datetime, timedelta
+import hashlib
+import json
 import logging
 import os
-import google.generativeai as genai
+import threading
+import time
 
 # Initialize the legal query processor
 legal_processor = LegalQueryProcessor()
 
-# Configure Google's Gemini API
-try:
-    GEMINI_API_KEY = os.environ.get("GEMINI_API_KEY")
-    if GEMINI_API_KEY:
-        genai.configure(api_key=GEMINI_API_KEY)
-        # Set up the model
-        generation_config = {
-            "temperature": 0.7,
-            "top_p": 0.95,
-            "top_k": 64,
-            "max_output_tokens": 1024,
-        }
-        safety_settings = [
-            {"category": "HARM_CATEGORY_HARASSMENT", "threshold": "BLOCK_MEDIUM_AND_ABOVE"},
-            {"category": "HARM_CATEGORY_HATE_SPEECH", "threshold": "BLOCK_MEDIUM_AND_ABOVE"},
-            {"category": "HARM_CATEGORY_SEXUALLY_EXPLICIT", "threshold": "BLOCK_MEDIUM_AND_ABOVE"},
-            {"category": "HARM_CATEGORY_DANGEROUS_CONTENT", "threshold": "BLOCK_MEDIUM_AND_ABOVE"},
-        ]
-        # Get available models
-        for m in genai.list_models():
-            logging.info(f"Available model: {m.name}")
-            
-        # Use a model that's available for the current API version
-        model_name = "models/gemini-1.5-pro"
-        gemini_model = genai.GenerativeModel(
-            model_name=model_name,
-            generation_config=generation_config,
-            safety_settings=safety_settings
-        )
-        logging.info("Gemini API configured successfully")
-    else:
-        logging.warning("GEMINI_API_KEY not found. Chat functionality will be limited.")
-        gemini_model = None
-except Exception as e:
-    logging.error(f"Error configuring Gemini API: {str(e)}")
-    gemini_model = None
+# How case analyses are generated:
+#   async  - in a background pool; the analysis page polls until it is ready (default)
+#   stream - by the analysis page itself, which streams the text as it is generated
+#   inline - during the submission request
+#   hedged - the template analysis is stored at once and the language model gets
+#            ANALYSIS_HEDGE_SECONDS to replace it before the page is shown; a later
+#            answer replaces it in the background
+ANALYSIS_MODES = ('async', 'stream', 'inline', 'hedged')
+ANALYSIS_MODE = os.environ.get('ANALYSIS_MODE', 'async').lower()
+if ANALYSIS_MODE not in ANALYSIS_MODES:
+    # Any other value would leave every new case's analysis pending forever
+    raise ValueError(f"Unknown ANALYSIS_MODE {ANALYSIS_MODE!r}; expected one of {', '.join(ANALYSIS_MODES)}")
+analysis_jobs = AnalysisJobQueue(app, legal_processor) if ANALYSIS_MODE in ('async', 'hedged') else None
+
+# A case still pending this long after submission has lost its job (the worker process
+# that queued it was restarted), and is queued again when its status or page is requested
+ANALYSIS_STALE_SECONDS = int(os.environ.get('ANALYSIS_STALE_SECONDS', '600'))
+
+# How long a hedged submission waits for the language model before showing the template analysis
+ANALYSIS_HEDGE_SECONDS = float(os.environ.get('ANALYSIS_HEDGE_SECONDS', '3'))
+
+# Rendered analysis pages, keyed on the case and a digest of its stored results
+ANALYSIS_PAGE_CACHE_SIZE = int(os.environ.get('ANALYSIS_PAGE_CACHE_SIZE', '256'))
+ANALYSIS_PAGE_CACHE_TTL = int(os.environ.get('ANALYSIS_PAGE_CACHE_TTL', '3600'))
+analysis_page_cache = MemoryCacheBackend(ANALYSIS_PAGE_CACHE_SIZE)
+
+# Cases whose analysis is being streamed by this process
+streaming_cases = set()
+streaming_lock = threading.Lock()
+
+# How long a server-sent events stream waits for an analysis, and how often it re-checks
+ANALYSIS_EVENTS_TIMEOUT = int(os.environ.get('ANALYSIS_EVENTS_TIMEOUT', '120'))
+ANALYSIS_EVENTS_INTERVAL = 1.0
+
+# Background analysis load, read when /metrics is scraped
+Gauge('legalai_analysis_jobs_queued', 'Analysis jobs waiting for a worker',
+      function=lambda: analysis_jobs.stats()['queued'] if analysis_jobs else 0)
+Gauge('legalai_analysis_jobs_running', 'Analysis jobs being generated',
+      function=lambda: analysis_jobs.stats()['running'] if analysis_jobs else 0)
+Gauge('legalai_analysis_streams_in_flight', 'Analyses being streamed to the browser',
+      function=lambda: len(streaming_cases))
+
+# Language model calls go through the shared client (see llm_client); nothing is fetched at import
+if not llm_client.available():
+    logging.warning("GEMINI_API_KEY not found. Chat functionality will be limited.")
 
 @app.route('/')
 def index():
@@ -142,6 +159,7 @@ def submit_case():
             }
             
             logging.info("Calling NLP processor")
+            hedge_analysis = False
             
             # Check for specific problematic case that has been causing issues
             if "phone" in offense_description.lower() and "group" in offense_description.lower() and "people" in offense_description.lower():
@@ -208,7 +226,14 @@ def submit_case():
                     'keywords': ['phone', 'stolen', 'group', 'people']
                 }
             else:
-                results = legal_processor.process_query(case_details)
+                # A "refresh" form field or a no-cache request recomputes the analysis
+                use_cache = not request.form.get('refresh') and 'no-cache' not in request.headers.get('Cache-Control', '')
+                results = legal_processor.process_query(case_details, use_cache=use_cache,
+                                                        include_analysis=ANALYSIS_MODE == 'inline')
+                # Hedged: store the template analysis now and give the language model a deadline to replace it
+                hedge_analysis = ANALYSIS_MODE == 'hedged' and results['analysis'] is None
+                if hedge_analysis:
+                    legal_processor.template_analysis(case_details, results)
                 
             logging.info("NLP processing completed successfully")
             
@@ -225,14 +250,17 @@ def submit_case():
             db.session.commit()
             logging.info("Case updated with analysis results")
             
-            # Store results in session for display
-            session['analysis_results'] = {
-                'case_details': case_details,
-                'ipc_sections': results['ipc_sections'],
-                'precedents': results['precedents'],
-                'analysis': results['analysis'],
-                'case_id': case.id
-            }
+            # Sections and precedents are shown right away; the analysis follows from the
+            # job queue, or is streamed when the analysis page opens. Hedged submissions
+            # wait at most ANALYSIS_HEDGE_SECONDS for the language model to replace the template
+            if hedge_analysis:
+                analysis_jobs.hedge(case.id, case_details, dict(results), ANALYSIS_HEDGE_SECONDS)
+            elif results['analysis'] is None and analysis_jobs:
+                analysis_jobs.submit(case.id, case_details, dict(results))
+            
+            # Remember only the case in the session; the analysis page reads the rest from the database
+            session.pop('analysis_results', None)
+            session['analysis_case_id'] = case.id
             
             logging.info("Redirecting to analysis page")
             return redirect(url_for('analysis'))
@@ -253,26 +281,223 @@ def submit_case():
 @app.route('/analysis')
 def analysis():
     """Render the analysis page"""
-    if 'analysis_results' not in session:
+    case_id = session.get('analysis_case_id')
+    case = db.session.query(Case).get(case_id) if case_id else None
+    if not case:
         flash("No analysis data found. Please submit a case first.", "warning")
         return redirect(url_for('index'))
     
-    results = session['analysis_results']
-    return render_template('analysis.html', results=results)
+    return render_case_analysis(case)
 
-@app.route('/case/<int:case_id>')
-def view_case(case_id):
-    """View a specific case by ID"""
+def render_case_analysis(case):
+    """
+    Render the analysis page of a stored case, reusing the cached page while
+    the case's sections, precedents and analysis are unchanged
+    
+    Args:
+        case (Case): The case
+        
+    Returns:
+        str: Rendered analysis page
+    """
+    requeue_stale_analysis(case)
+    digest = hashlib.sha256("\x1f".join([
+        case.ipc_sections or '', case.relevant_precedents or '', case.analysis or ''
+    ]).encode('utf-8')).hexdigest()
+    cache_key = f"{case.id}:{ANALYSIS_MODE}:{digest}"
+    
+    # Pages rendered with pending flash messages embed them, so they are never cached
+    cacheable = not session.get('_flashes')
+    if cacheable:
+        page = analysis_page_cache.get(cache_key)
+        if page is not None:
+            return page
+    
+    results = case_results_from_case(case)
+    page = render_template('analysis.html', results=results, stream_analysis=ANALYSIS_MODE == 'stream')
+    if cacheable:
+        analysis_page_cache.set(cache_key, page, ANALYSIS_PAGE_CACHE_TTL)
+    return page
+
+def processor_results_from_case(case):
+    """
+    Rebuild the processor results of a stored case, for completing its analysis.
+    These are exactly the process_query results, since the processor caches them
+    under the case's key
+    
+    Args:
+        case (Case): The case
+        
+    Returns:
+        tuple: (case details, results with 'analysis' None)
+    """
+    case_details = case_details_from_case(case)
+    results = legal_processor.results_from_matches(
+        case_details, case.ipc_sections.split(',') if case.ipc_sections else [],
+        case.relevant_precedents.split(',') if case.relevant_precedents else [])
+    return case_details, results
+
+def requeue_stale_analysis(case):
+    """
+    Queue the analysis of a case again if it has been pending for longer than
+    ANALYSIS_STALE_SECONDS with no job in this process. Jobs only live in the
+    worker process that accepted the case, so they are lost when it is
+    restarted (max-requests, out of memory, deploys); the case row is all that
+    survives. Each worker requeues a case at most once while its job runs.
+    
+    Args:
+        case (Case): The case
+        
+    Returns:
+        bool: True if the analysis was queued again
+    """
+    if not analysis_jobs or case.analysis or analysis_jobs.is_pending(case.id):
+        return False
+    if not case.created_at or datetime.utcnow() - case.created_at < timedelta(seconds=ANALYSIS_STALE_SECONDS):
+        return False
+    logging.warning("Analysis of case %s still pending after %ds; queueing it again", case.id, ANALYSIS_STALE_SECONDS)
+    case_details, results = processor_results_from_case(case)
+    analysis_jobs.submit(case.id, case_details, results)
+    return True
+
+def analysis_status(case):
+    """
+    Build the status payload for a case's analysis
+    
+    Args:
+        case (Case): The case
+        
+    Returns:
+        dict: Case id, 'complete' or 'pending' status, the analysis and queue depth
+    """
+    requeue_stale_analysis(case)
+    return {
+        'case_id': case.id,
+        'status': 'complete' if case.analysis else 'pending',
+        'analysis': case.analysis,
+        'queue_depth': analysis_jobs.depth() if analysis_jobs else 0
+    }
+
+@app.route('/case/<int:case_id>/status')
+def case_status(case_id):
+    """Return the analysis status of a case as JSON"""
     case = db.session.query(Case).get(case_id)
     if not case:
-        flash("Case not found.", "error")
-        return redirect(url_for('index'))
+        return jsonify({'error': 'Case not found'}), 404
+    return jsonify(analysis_status(case))
+
+@app.route('/case/<int:case_id>/events')
+def case_events(case_id):
+    """Stream the analysis of a case as server-sent events once it is ready"""
+    if not db.session.query(Case).get(case_id):
+        return jsonify({'error': 'Case not found'}), 404
     
-    # Check if the case belongs to the user (for future user authentication)
-    # For now, we'll allow anyone to view any case
+    def generate():
+        deadline = time.time() + ANALYSIS_EVENTS_TIMEOUT
+        while True:
+            # Re-read the case so analyses written by other workers are seen
+            db.session.expire_all()
+            status = analysis_status(db.session.query(Case).get(case_id))
+            if status['status'] == 'complete':
+                yield f"event: analysis\ndata: {json.dumps(status)}\n\n"
+                return
+            if time.time() >= deadline:
+                yield f"event: timeout\ndata: {json.dumps(status)}\n\n"
+                return
+            yield f"event: pending\ndata: {json.dumps(status)}\n\n"
+            if analysis_jobs:
+                analysis_jobs.wait(case_id, ANALYSIS_EVENTS_INTERVAL)
+            else:
+                time.sleep(ANALYSIS_EVENTS_INTERVAL)
+    
+    return Response(stream_with_context(generate()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/case/<int:case_id>/analysis_stream')
+def case_analysis_stream(case_id):
+    """Generate the analysis of a case, streaming the HTML to the browser as it is produced"""
+    case = db.session.query(Case).get(case_id)
+    if not case:
+        return jsonify({'error': 'Case not found'}), 404
+    if case.analysis:
+        return Response(case.analysis, mimetype='text/html')
+    
+    # Only one generation per case; other viewers poll the status endpoint
+    with streaming_lock:
+        if case_id in streaming_cases or (analysis_jobs and analysis_jobs.is_pending(case_id)):
+            return jsonify({'error': 'Analysis is already being generated'}), 409
+        streaming_cases.add(case_id)
+    
+    case_details, results = processor_results_from_case(case)
+    
+    def generate():
+        try:
+            for chunk in legal_processor.stream_analysis(case_details, results):
+                yield chunk
+            # Persist the complete text so later views and the status endpoint see it
+            stored_case = db.session.query(Case).get(case_id)
+            if stored_case:
+                stored_case.analysis = results['analysis']
+                db.session.commit()
+                logging.info(f"Streamed analysis stored for case {case_id}")
+        except Exception as e:
+            logging.error(f"Error streaming analysis for case {case_id}: {str(e)}")
+        finally:
+            with streaming_lock:
+                streaming_cases.discard(case_id)
+    
+    return Response(stream_with_context(generate()), mimetype='text/html',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/analysis_queue')
+def analysis_queue():
+    """Return the analysis job queue depth and counters as JSON"""
+    if not analysis_jobs:
+        return jsonify({'enabled': False})
+    return jsonify(dict(analysis_jobs.stats(), enabled=True))
+
+@app.route('/metrics')
+def metrics():
+    """Expose the application metrics in the Prometheus text format"""
+    return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/admin/profiles', methods=['GET', 'POST'])
+def admin_profiles():
+    """
+    List the request profile dumps, or (POST {"count": N}) profile the next N requests.
+    Requires the admin token; without PROFILE_ADMIN_TOKEN configured the route does not exist.
+    """
+    if not is_admin(request):
+        abort(404)
+    if request.method == 'POST':
+        data = request.get_json(silent=True) or {}
+        try:
+            request_profiler.arm(int(data.get('count', 1)))
+        except (TypeError, ValueError):
+            return jsonify({'error': 'count must be an integer'}), 400
+    return jsonify(dict(request_profiler.stats(), profiles=request_profiler.list()))
+
+@app.route('/admin/profiles/<name>')
+def admin_profile_download(name):
+    """Download a request profile dump (requires the admin token)"""
+    if not is_admin(request):
+        abort(404)
+    path = request_profiler.path(name)
+    if not path:
+        abort(404)
+    return send_file(os.path.abspath(path), mimetype='application/octet-stream', as_attachment=True, download_name=name)
+
+def case_details_from_case(case):
+    """
+    Build the case details dictionary used by the processor from a stored case
     
-    # Prepare case details
-    case_details = {
+    Args:
+        case (Case): The case
+        
+    Returns:
+        dict: Dictionary containing case details
+    """
+    return {
         'case_type': case.case_type,
         'offense_description': case.offense_description,
         'query': case.query,
@@ -282,7 +507,17 @@ def view_case(case_id):
         'accused_details': case.accused_details,
         'evidence_summary': case.evidence_summary
     }
+
+def case_results_from_case(case):
+    """
+    Rebuild the analysis results of a stored case from its section and precedent IDs
     
+    Args:
+        case (Case): The case
+        
+    Returns:
+        dict: Case details, IPC sections, precedents, analysis and case id
+    """
     # Get IPC sections
     from ipc_data import ipc_sections
     ipc_section_ids = case.ipc_sections.split(',') if case.ipc_sections else []
@@ -313,15 +548,26 @@ def view_case(case_id):
         for precedent_id in precedent_ids if precedent_id in legal_precedents
     ]
     
-    results = {
-        'case_details': case_details,
+    return {
+        'case_details': case_details_from_case(case),
         'ipc_sections': relevant_ipc_sections,
         'precedents': relevant_precedents,
         'analysis': case.analysis,
         'case_id': case.id
     }
+
+@app.route('/case/<int:case_id>')
+def view_case(case_id):
+    """View a specific case by ID"""
+    case = db.session.query(Case).get(case_id)
+    if not case:
+        flash("Case not found.", "error")
+        return redirect(url_for('index'))
+    
+    # Check if the case belongs to the user (for future user authentication)
+    # For now, we'll allow anyone to view any case
     
-    return render_template('analysis.html', results=results)
+    return render_case_analysis(case)
 
 @app.errorhandler(404)
 def page_not_found(e):
@@ -334,6 +580,8 @@ def chat_response():
     try:
         case_id = request.json.get('case_id')
         question = request.json.get('question')
+        # Stream the answer as plain text chunks instead of a single JSON response
+        stream = bool(request.json.get('stream'))
         
         if not case_id or not question:
             return jsonify({'error': 'Missing required parameters'}), 400
@@ -360,16 +608,7 @@ def chat_response():
         ]
         
         # Prepare case details for the Gemini API
-        case_details = {
-            'case_type': case.case_type,
-            'offense_description': case.offense_description,
-            'query': case.query,
-            'incident_date': case.incident_date.strftime('%Y-%m-%d') if case.incident_date else "Unknown",
-            'incident_location': case.incident_location if case.incident_location else "Unknown",
-            'victim_details': case.victim_details,
-            'accused_details': case.accused_details,
-            'evidence_summary': case.evidence_summary
-        }
+        case_details = case_details_from_case(case)
         
         # Create the enhanced prompt for Gemini with better follow-up handling
         prompt = f"""
@@ -415,33 +654,66 @@ def chat_response():
         """
         
         try:
-            # Check if Gemini API is configured
-            if gemini_model:
-                # Generate response using Gemini
-                response = gemini_model.generate_content(prompt)
+            # Check if a language model is configured
+            if llm_client.available():
+                if stream:
+                    fallback_response = generate_fallback_chat_response(question, case_details)
+                    return Response(stream_with_context(stream_chat_answer(prompt, fallback_response)), mimetype='text/plain',
+                                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
                 
-                # Extract the text from the response
-                if hasattr(response, 'text'):
-                    answer = response.text
-                elif hasattr(response, 'parts'):
-                    answer = "".join([part.text for part in response.parts])
-                else:
-                    answer = str(response)
-                    
+                # Generate response through the shared client (deadline, retries, circuit breaker)
+                answer = llm_client.generate(prompt, use='chat')
                 return jsonify({'response': answer})
             else:
-                logging.warning("Gemini API not available, using fallback response")
+                logging.warning("Language model not available, using fallback response")
+                FALLBACKS.inc(use='chat', reason='unavailable')
                 # Fallback response when Gemini is not available
                 fallback_response = generate_fallback_chat_response(question, case_details)
+                if stream:
+                    return Response(fallback_response, mimetype='text/plain')
                 return jsonify({'response': fallback_response})
+        except LLMUnavailable as e:
+            logging.warning(f"Serving the fallback chat response: {str(e)}")
+            FALLBACKS.inc(use='chat', reason=e.reason)
+            fallback_response = generate_fallback_chat_response(question, case_details)
+            if stream:
+                return Response(fallback_response, mimetype='text/plain')
+            return jsonify({'response': fallback_response})
         except Exception as e:
             logging.error(f"Error generating chat response with Gemini: {str(e)}")
+            FALLBACKS.inc(use='chat', reason='error')
             return jsonify({'response': "I'm sorry, I couldn't process your question at this time. Please try again later or rephrase your question."})
             
     except Exception as e:
         logging.error(f"Error in chat_response: {str(e)}")
         return jsonify({'error': 'Failed to generate response'}), 500
 
+def stream_chat_answer(prompt, fallback_response):
+    """
+    Yield the language model's answer to a chat prompt in chunks as it is generated
+    
+    Args:
+        prompt (str): The chat prompt
+        fallback_response (str): Answer to send instead if the language model cannot be called
+        
+    Yields:
+        str: Chunks of the answer
+    """
+    produced_output = False
+    try:
+        for text in llm_client.stream(prompt, use='chat'):
+            produced_output = True
+            yield text
+    except LLMUnavailable as e:
+        logging.warning(f"Serving the fallback chat response: {str(e)}")
+        FALLBACKS.inc(use='chat', reason=e.reason)
+        yield fallback_response
+    except Exception as e:
+        logging.error(f"Error streaming chat response with Gemini: {str(e)}")
+        if not produced_output:
+            FALLBACKS.inc(use='chat', reason='error')
+            yield "I'm sorry, I couldn't process your question at this time. Please try again later or rephrase your question."
+
 def generate_fallback_chat_response(question, case_details):
     """
     Generate a fallback response when Gemini API is not available
@@ -0,0 +1,165 @@
+import hashlib
+import json
+import os
+import re
+from startup import timed_startup
+import logging
+
+# Rule table location; override with SCORING_RULES_PATH to tune rules without
+# changing code (workers pick the file up when they start)
+DEFAULT_RULES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'scoring_rules.json')
+
+class ScoringRules:
+    """
+    Compiled form of the declarative rule table used by the section matcher
+    and the template analysis generator
+    """
+
+    def __init__(self, data):
+        """
+        Compile the rule table
+
+        Args:
+            data (dict): Parsed contents of the rules file
+        """
+        # Fingerprint of the table, so cached results scored under other rules are not reused
+        self.digest = hashlib.sha256(
+            json.dumps(data, sort_keys=True, separators=(',', ':')).encode('utf-8')).hexdigest()
+        self.crime_categories = data['crime_categories']
+        self.important_keywords = data['important_keywords']
+        self.scenario_section_phrases = data['scenario_section_phrases']
+
+        # "category" or "category+scenario" keys become (category, scenario, sections)
+        self.priority_rules = []
+        for combo, sections in data['priority_section_mapping'].items():
+            category, _, scenario = combo.partition('+')
+            self.priority_rules.append((combo, category, scenario or None, sections))
+
+        # All scenarios in one alternation with a named group per scenario, so a
+        # single scan of the case text yields every scenario present
+        self.scenario_names = list(data['scenarios'])
+        self.scenario_patterns = {name: re.compile(pattern) for name, pattern in data['scenarios'].items()}
+        self.scenario_pattern = re.compile('|'.join(
+            f"(?P<{name}>{pattern})" for name, pattern in data['scenarios'].items()
+        ))
+        self._scenarios_by_hit = {}
+
+        # Section boosts and exclusions, switched on by case features
+        # ("category:<name>" and "scenario:<name>")
+        self.section_boosts = [self._compile_section_rule(rule) for rule in data.get('section_boosts', [])]
+        self.section_exclusions = [self._compile_section_rule(rule) for rule in data.get('section_exclusions', [])]
+
+        self.template_details = [
+            (detail['name'], re.compile(detail['pattern'], re.I), detail.get('capture', True))
+            for detail in data['template_details']
+        ]
+        self.template_case_flags = {
+            flag: re.compile('|'.join(re.escape(word) for word in words))
+            for flag, words in data['template_case_flags'].items()
+        }
+
+    def _compile_section_rule(self, rule):
+        """
+        Parse the "when" conditions of a section rule. Every condition must
+        hold; a condition is a feature, alternatives separated by "|", or
+        either of those negated with a leading "!".
+        """
+        known_features = {f"category:{category}" for category in self.crime_categories}
+        known_features.update(f"scenario:{scenario}" for scenario in self.scenario_names)
+        conditions = []
+        for condition in rule['when']:
+            negated = condition.startswith('!')
+            alternatives = frozenset(condition.lstrip('!').split('|'))
+            unknown = alternatives - known_features
+            if unknown:
+                raise ValueError(f"Unknown feature in section rule {rule.get('name')}: {', '.join(sorted(unknown))}")
+            conditions.append((negated, alternatives))
+        return dict(rule, conditions=conditions)
+
+    def case_features(self, categories, scenarios):
+        """
+        Return the feature set section rules are evaluated against
+
+        Args:
+            categories (list): Crime categories of the case
+            scenarios (dict): Scenario name -> bool, from detect_scenarios
+
+        Returns:
+            set: "category:<name>" and "scenario:<name>" features present
+        """
+        features = {f"category:{category}" for category in categories}
+        features.update(f"scenario:{scenario}" for scenario, present in scenarios.items() if present)
+        return features
+
+    def active_rules(self, rules, features):
+        """Return the positions of the rules whose conditions all hold for features"""
+        return [
+            position for position, rule in enumerate(rules)
+            if all(bool(alternatives & features) != negated for negated, alternatives in rule['conditions'])
+        ]
+
+    def detect_scenarios(self, text):
+        """
+        Detect the contextual scenarios present in text
+
+        Args:
+            text (str): Lowercased case text
+
+        Returns:
+            dict: Scenario name -> bool, in rule table order
+        """
+        found = set()
+        for match in self.scenario_pattern.finditer(text):
+            found.add(match.lastgroup)
+            # A matched span can satisfy more than one scenario (e.g. "electronic"),
+            # but the alternation only reports the first, so check the others once
+            # per distinct hit
+            hit = match.group()
+            if hit not in self._scenarios_by_hit:
+                self._scenarios_by_hit[hit] = frozenset(
+                    name for name, pattern in self.scenario_patterns.items() if pattern.search(hit)
+                )
+            found.update(self._scenarios_by_hit[hit])
+        return {name: name in found for name in self.scenario_names}
+
+    def extract_template_details(self, text):
+        """
+        Pull personalization details (devices, places, times...) out of text
+
+        Args:
+            text (str): Offense description
+
+        Returns:
+            dict: Detail name -> matched text, or True for flag-only details
+        """
+        details = {}
+        for name, pattern, capture in self.template_details:
+            match = pattern.search(text)
+            if match:
+                details[name] = match.group(0) if capture else True
+        return details
+
+    def case_flags(self, text):
+        """Return the template case-type flags (is_theft_case, ...) for text"""
+        return {flag: pattern.search(text) is not None for flag, pattern in self.template_case_flags.items()}
+
+def load_scoring_rules(path=None):
+    """
+    Load and compile the rule table
+
+    Args:
+        path (str): Rules file; defaults to SCORING_RULES_PATH or scoring_rules.json
+
+    Returns:
+        ScoringRules: The compiled rules
+    """
+    path = path or os.environ.get('SCORING_RULES_PATH') or DEFAULT_RULES_PATH
+    with open(path, encoding='utf-8') as rules_file:
+        rules = ScoringRules(json.load(rules_file))
+    logging.info("Loaded scoring rules from %s (%d categories, %d scenarios)",
+                 path, len(rules.crime_categories), len(rules.scenario_names))
+    return rules
+
+# Shared rules compiled at import time
+with timed_startup('load scoring rules'):
+    scoring_rules = load_scoring_rules()
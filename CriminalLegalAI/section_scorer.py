@@ -0,0 +1,326 @@
+import math
+import os
+from legal_index import ipc_index
+from scoring_rules import scoring_rules
+from startup import timed_startup
+import logging
+
+# NumPy/SciPy are declared dependencies; an environment without them still works,
+# accumulating the scores from the posting lists instead of the sparse matrices
+try:
+    import numpy as np
+    from scipy import sparse
+except ImportError:
+    np = None
+    sparse = None
+
+# Term weighting of the section x term matrices:
+#   binary - 1 per matched term (plus its important-keyword weight), the original counting
+#   tfidf  - log-scaled term frequency times smoothed inverse document frequency
+SECTION_TERM_WEIGHTING = os.environ.get('SECTION_TERM_WEIGHTING', 'binary')
+
+# Points per case type token found in a section title
+TITLE_MATCH_WEIGHT = 3
+
+class SectionScorer:
+    """
+    Scores every IPC section against a case at once. Sections are rows of
+    two sparse section x term matrices, one for the title and one for the
+    title plus description; a case becomes a term vector and its keyword
+    score is a single sparse matrix-vector product. The rule table's section
+    boosts and exclusions are compiled into rule x section matrices, so
+    applying them is one product with the vector of active rules.
+    """
+
+    def __init__(self, index, rules, weighting='binary', vectorized=None):
+        """
+        Build the term and rule matrices
+
+        Args:
+            index (IpcIndex): Index over the IPC sections
+            rules (ScoringRules): Rule table with important keywords, section boosts and exclusions
+            weighting (str): 'binary' or 'tfidf'
+            vectorized (bool): Use NumPy/SciPy; defaults to whether they are installed
+        """
+        if weighting not in ('binary', 'tfidf'):
+            raise ValueError(f"Unknown section term weighting: {weighting}")
+        self.weighting = weighting
+        self.vectorized = (np is not None) if vectorized is None else vectorized
+        if self.vectorized and np is None:
+            raise ImportError("NumPy and SciPy are required for vectorized section scoring")
+
+        # Rows follow corpus order, so ties in score keep the corpus order
+        self.section_ids = [section_id for section_id, _ in index.ordered(index.sections)]
+        self.rows = {section_id: row for row, section_id in enumerate(self.section_ids)}
+        section_count = len(self.section_ids)
+
+        description_documents = {}
+        title_documents = {}
+        for section_id, indexed_section in index.items():
+            description_documents[self.rows[section_id]] = {
+                term: frequency for term, frequency in _term_frequencies(index, section_id, indexed_section)
+            }
+            title_documents[self.rows[section_id]] = {term: 1 for term in indexed_section.title_tokens}
+
+        # term -> {row: weight} for each field
+        self.description_postings = self._weigh(description_documents, section_count, rules.important_keywords, 1)
+        self.title_postings = self._weigh(title_documents, section_count, {}, TITLE_MATCH_WEIGHT)
+
+        # Rows of the sections each boost or exclusion rule applies to
+        self.rules = rules
+        self.boost_rows = [self._rule_rows(index, rule) for rule in rules.section_boosts]
+        self.exclusion_rows = [self._rule_rows(index, rule) for rule in rules.section_exclusions]
+
+        if self.vectorized:
+            self.terms = {term: column for column, term in enumerate(
+                sorted(set(self.description_postings) | set(self.title_postings)))}
+            self.description_matrix = self._matrix(self.description_postings, section_count)
+            self.title_matrix = self._matrix(self.title_postings, section_count)
+            self.boost_matrix = self._rule_matrix(self.boost_rows, [rule['points'] for rule in rules.section_boosts])
+            self.exclusion_matrix = self._rule_matrix(self.exclusion_rows, [1] * len(self.exclusion_rows))
+
+        logging.info("SectionScorer built for %d sections (%s weighting, %s)", section_count, weighting,
+                     "sparse matrices" if self.vectorized else "posting lists")
+
+    def _weigh(self, documents, section_count, important_keywords, field_weight):
+        document_frequency = {}
+        for terms in documents.values():
+            for term in terms:
+                document_frequency[term] = document_frequency.get(term, 0) + 1
+
+        postings = {}
+        for row, terms in documents.items():
+            for term, frequency in terms.items():
+                weight = field_weight * (1 + important_keywords.get(term, 0))
+                if self.weighting == 'tfidf':
+                    idf = math.log((1 + section_count) / (1 + document_frequency[term])) + 1
+                    weight *= (1 + math.log(frequency)) * idf
+                postings.setdefault(term, {})[row] = weight
+        return postings
+
+    def _matrix(self, postings, section_count):
+        # Column-compressed, so selecting the columns of a case's terms only touches their entries
+        rows, columns, weights = [], [], []
+        for term, posting in postings.items():
+            for row, weight in posting.items():
+                rows.append(row)
+                columns.append(self.terms[term])
+                weights.append(weight)
+        return sparse.csc_matrix((weights, (rows, columns)), shape=(section_count, len(self.terms)))
+
+    def _rule_rows(self, index, rule):
+        """Resolve a rule's section selector (ids, scenario, title_contains, title_excludes) to rows"""
+        selector = rule['sections']
+        section_ids = set(selector.get('ids', ()))
+        if 'scenario' in selector:
+            section_ids.update(index.scenario_sections[selector['scenario']])
+        for text in selector.get('title_contains', ()):
+            section_ids.update(index.sections_with_title_containing(text))
+        for text in selector.get('title_excludes', ()):
+            section_ids.difference_update(index.sections_with_title_containing(text))
+        return sorted(self.rows[section_id] for section_id in section_ids if section_id in self.rows)
+
+    def _rule_matrix(self, rule_rows, points):
+        # Rule x section, so the active rules' contributions are one product with their indicator vector
+        rows, columns, weights = [], [], []
+        for position, section_rows in enumerate(rule_rows):
+            rows.extend([position] * len(section_rows))
+            columns.extend(section_rows)
+            weights.extend([points[position]] * len(section_rows))
+        return sparse.csr_matrix((weights, (rows, columns)), shape=(len(rule_rows), len(self.section_ids)))
+
+    def _field_scores(self, matrix, postings, term_counts):
+        """Score every section for one field against the case's term counts"""
+        if self.vectorized:
+            columns = [self.terms[term] for term in term_counts if term in self.terms]
+            if not columns:
+                return np.zeros(len(self.section_ids))
+            counts = np.array([term_counts[term] for term in term_counts if term in self.terms], dtype=float)
+            return matrix[:, columns] @ counts
+        scores = {}
+        for term, count in term_counts.items():
+            for row, weight in postings.get(term, {}).items():
+                scores[row] = scores.get(row, 0) + weight * count
+        return scores
+
+    def keyword_scores(self, keywords, case_type_tokens):
+        """
+        Score every section on term overlap with the case
+
+        Args:
+            keywords (set): All case keywords
+            case_type_tokens (list): Tokens of the case type, matched against titles
+
+        Returns:
+            Score vector (NumPy array, or {row: score} without NumPy)
+        """
+        title_counts = {}
+        for token in case_type_tokens:
+            title_counts[token] = title_counts.get(token, 0) + 1
+        description_scores = self._field_scores(
+            self.description_matrix if self.vectorized else None, self.description_postings,
+            {keyword: 1 for keyword in keywords})
+        title_scores = self._field_scores(
+            self.title_matrix if self.vectorized else None, self.title_postings, title_counts)
+        if self.vectorized:
+            return description_scores + title_scores
+        for row, score in title_scores.items():
+            description_scores[row] = description_scores.get(row, 0) + score
+        return description_scores
+
+    def keyword_scores_many(self, queries):
+        """
+        Score every section against a batch of cases. With NumPy the cases
+        become the rows of a case x term matrix and all scores come from one
+        sparse matrix product per field.
+
+        Args:
+            queries (list): (keywords, case_type_tokens) pairs, one per case
+
+        Returns:
+            list: Score vectors as returned by keyword_scores, in input order
+        """
+        if not self.vectorized:
+            return [self.keyword_scores(keywords, case_type_tokens) for keywords, case_type_tokens in queries]
+        if not queries:
+            return []
+
+        description_query = self._query_matrix([{keyword: 1 for keyword in keywords} for keywords, _ in queries])
+        title_counts = []
+        for _, case_type_tokens in queries:
+            counts = {}
+            for token in case_type_tokens:
+                counts[token] = counts.get(token, 0) + 1
+            title_counts.append(counts)
+        title_query = self._query_matrix(title_counts)
+
+        # (case x term) @ (term x section); dense, since every case row is ranked anyway
+        scores = description_query @ self.description_matrix.T + title_query @ self.title_matrix.T
+        return list(np.asarray(scores.todense(), dtype=float))
+
+    def _query_matrix(self, term_counts_list):
+        """Build a case x term matrix from one {term: count} dict per case"""
+        rows, columns, counts = [], [], []
+        for row, term_counts in enumerate(term_counts_list):
+            for term, count in term_counts.items():
+                if term in self.terms:
+                    rows.append(row)
+                    columns.append(self.terms[term])
+                    counts.append(count)
+        return sparse.csr_matrix((counts, (rows, columns)), shape=(len(term_counts_list), len(self.terms)))
+
+    def add(self, scores, section_ids, points):
+        """Add points to the score of each of the given sections"""
+        rows = sorted({self.rows[section_id] for section_id in section_ids if section_id in self.rows})
+        if not rows:
+            return
+        if self.vectorized:
+            scores[rows] += points
+        else:
+            for row in rows:
+                scores[row] = scores.get(row, 0) + points
+
+    def add_each(self, scores, section_points):
+        """Add a different number of points to each section ({section_id: points})"""
+        for section_id, points in section_points.items():
+            if section_id in self.rows:
+                row = self.rows[section_id]
+                scores[row] = scores[row] + points if self.vectorized else scores.get(row, 0) + points
+
+    def apply_rules(self, scores, features):
+        """
+        Add the boosts of the rule table's active section rules to scores
+
+        Args:
+            scores: Score vector from keyword_scores; updated in place
+            features (set): Case features, from ScoringRules.case_features
+
+        Returns:
+            Exclusion mask (NumPy bool array, or set of rows without NumPy)
+        """
+        active_boosts = self.rules.active_rules(self.rules.section_boosts, features)
+        active_exclusions = self.rules.active_rules(self.rules.section_exclusions, features)
+        if self.vectorized:
+            if active_boosts:
+                scores += self.boost_matrix.T @ _indicator(active_boosts, len(self.boost_rows))
+            if not active_exclusions:
+                return np.zeros(len(self.section_ids), dtype=bool)
+            return (self.exclusion_matrix.T @ _indicator(active_exclusions, len(self.exclusion_rows))) > 0
+
+        for position in active_boosts:
+            points = self.rules.section_boosts[position]['points']
+            for row in self.boost_rows[position]:
+                scores[row] = scores.get(row, 0) + points
+        excluded = set()
+        for position in active_exclusions:
+            excluded.update(self.exclusion_rows[position])
+        return excluded
+
+    def score_of(self, scores, section_id):
+        """Return one section's score from a score vector"""
+        row = self.rows.get(section_id)
+        if row is None:
+            return 0
+        return float(scores[row]) if self.vectorized else scores.get(row, 0)
+
+    def rules_for(self, section_id, features):
+        """
+        Return the names of the active section rules that apply to a section
+
+        Args:
+            section_id (str): Section to explain
+            features (set): Case features, from ScoringRules.case_features
+
+        Returns:
+            tuple: (boost rule names, exclusion rule names)
+        """
+        row = self.rows.get(section_id)
+        boosts = [self.rules.section_boosts[position]['name']
+                  for position in self.rules.active_rules(self.rules.section_boosts, features)
+                  if row in self.boost_rows[position]]
+        exclusions = [self.rules.section_exclusions[position]['name']
+                      for position in self.rules.active_rules(self.rules.section_exclusions, features)
+                      if row in self.exclusion_rows[position]]
+        return boosts, exclusions
+
+    def top(self, scores, excluded=None, threshold=3, limit=5):
+        """
+        Select the best scoring sections
+
+        Args:
+            scores: Score vector from keyword_scores plus boosts
+            excluded: Exclusion mask from apply_rules; these sections are never returned
+            threshold (float): Minimum score
+            limit (int): Maximum number of sections
+
+        Returns:
+            list: (section_id, score) pairs, best first, ties in corpus order
+        """
+        if self.vectorized:
+            eligible = scores >= threshold
+            if excluded is not None:
+                eligible &= ~excluded
+            rows = np.flatnonzero(eligible)
+            # lexsort sorts by the last key first: score descending, then row ascending
+            order = rows[np.lexsort((rows, -scores[rows]))][:limit]
+            return [(self.section_ids[row], float(scores[row])) for row in order]
+        ranked = sorted(
+            (row for row, score in scores.items() if score >= threshold and row not in (excluded or ())),
+            key=lambda row: (-scores[row], row)
+        )
+        return [(self.section_ids[row], scores[row]) for row in ranked[:limit]]
+
+def _indicator(positions, length):
+    """Return a 0/1 vector with ones at the given positions"""
+    vector = np.zeros(length)
+    vector[positions] = 1
+    return vector
+
+def _term_frequencies(index, section_id, indexed_section):
+    """Yield (term, frequency) for the title plus description tokens of a section"""
+    for term in indexed_section.tokens:
+        yield term, index.inverted.get(term).get(section_id, 1)
+
+# Shared scorer built at import time
+with timed_startup('build section scorer'):
+    section_scorer = SectionScorer(ipc_index, scoring_rules, SECTION_TERM_WEIGHTING)
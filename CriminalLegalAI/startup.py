@@ -0,0 +1,31 @@
+import time
+from contextlib import contextmanager
+import logging
+
+# (stage, seconds) for each timed piece of import-time work, in completion order
+startup_timings = []
+
+@contextmanager
+def timed_startup(stage):
+    """
+    Time a piece of import-time work and record it in the startup report
+
+    Args:
+        stage (str): Name of the work being timed
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        startup_timings.append((stage, elapsed))
+        logging.info("Startup: %s took %.1f ms", stage, elapsed * 1000)
+
+def startup_report():
+    """
+    Return the recorded startup timings
+
+    Returns:
+        list: {'stage': name, 'ms': duration} entries in completion order
+    """
+    return [{'stage': stage, 'ms': round(elapsed * 1000, 1)} for stage, elapsed in startup_timings]
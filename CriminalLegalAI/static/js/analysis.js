@@ -51,6 +51,9 @@ document.addEventListener('DOMContentLoaded', function() {
             });
         });
     });
+
+    // Fetch the analysis if it is still being generated
+    waitForAnalysis();
 });
 
 // Print function with custom styling
@@ -65,3 +68,66 @@ function scrollToSection(sectionId) {
         element.scrollIntoView({ behavior: 'smooth' });
     }
 }
+
+// Fetch a URL and pass the text received so far to onText as each chunk arrives
+async function streamText(url, options, onText) {
+    const response = await fetch(url, options);
+    if (!response.ok) {
+        throw new Error(`Request failed with status ${response.status}`);
+    }
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let text = '';
+    while (true) {
+        const { done, value } = await reader.read();
+        if (done) {
+            break;
+        }
+        text += decoder.decode(value, { stream: true });
+        onText(text);
+    }
+    text += decoder.decode();
+    return text;
+}
+
+// Load the analysis if it is still being generated: stream it when the page
+// is in streaming mode, otherwise poll the case status endpoint until it is ready
+function waitForAnalysis() {
+    const analysisBody = document.getElementById('analysis-body');
+    if (!analysisBody || !analysisBody.dataset.pending) {
+        return;
+    }
+
+    const pollInterval = 2000;
+    const checkStatus = async () => {
+        try {
+            const response = await fetch(analysisBody.dataset.statusUrl, { cache: 'no-store' });
+            if (response.ok) {
+                const status = await response.json();
+                if (status.status === 'complete') {
+                    analysisBody.innerHTML = status.analysis;
+                    delete analysisBody.dataset.pending;
+                    return;
+                }
+            }
+        } catch (error) {
+            console.error('Error checking analysis status:', error);
+        }
+        setTimeout(checkStatus, pollInterval);
+    };
+
+    if (analysisBody.dataset.streamUrl && window.ReadableStream && window.TextDecoder) {
+        streamText(analysisBody.dataset.streamUrl, { cache: 'no-store' }, function(text) {
+            analysisBody.innerHTML = text;
+        }).then(function() {
+            delete analysisBody.dataset.pending;
+        }).catch(function(error) {
+            // Already being generated elsewhere, or the stream failed: wait for the stored result
+            console.error('Error streaming analysis:', error);
+            setTimeout(checkStatus, pollInterval);
+        });
+        return;
+    }
+    setTimeout(checkStatus, pollInterval);
+}
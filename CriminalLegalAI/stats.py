@@ -0,0 +1,9 @@
+def percentile(values, fraction):
+    """Return the value at a fraction (0-1) of the sorted values, interpolating linearly"""
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    position = (len(ordered) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the Gemini REST API, for load tests that must not call
+the real model.
+
+Answers generateContent and streamGenerateContent for any model with canned
+text, after a latency drawn from a configurable distribution, and fails a
+configurable share of calls. Point the application at it with:
+
+    GEMINI_API_KEY=stub GEMINI_API_ENDPOINT=http://127.0.0.1:8089 gunicorn ...
+
+    python stub_llm.py --port 8089 --latency-ms 800 --latency-sd-ms 300
+    python stub_llm.py --error-rate 0.05 --hang-rate 0.01 --hang-seconds 60
+"""
+import argparse
+import json
+import random
+import re
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import logging
+
+DEFAULT_PORT = 8089
+
+# Paths of the two calls the application makes: /v1beta/models/<model>:<method>
+CALL_PATH = re.compile(r'^/v1(?:beta)?/models/(?P<model>[^/:]+):(?P<method>generateContent|streamGenerateContent)$')
+
+STUB_ANSWER = ("<h2>Analysis of Your Case</h2>\n<p>This is a stub response generated for load testing. "
+               "The applicable sections and precedents are listed above.</p>\n"
+               "<ol><li>File an FIR at the nearest police station.</li><li>Preserve all evidence.</li>"
+               "<li>Consult a criminal lawyer.</li></ol>")
+
+class StubSettings:
+    """Latency and failure distribution of the stub, shared by its request handlers"""
+
+    def __init__(self, latency_ms=500, latency_sd_ms=0, error_rate=0.0, error_status=500,
+                 hang_rate=0.0, hang_seconds=60, stream_chunks=4, seed=None):
+        """
+        Args:
+            latency_ms (float): Mean response latency
+            latency_sd_ms (float): Standard deviation of the latency (normal, clipped at zero)
+            error_rate (float): Share of calls answered with error_status
+            error_status (int): HTTP status of failed calls
+            hang_rate (float): Share of calls that stall for hang_seconds before answering
+            hang_seconds (float): How long a stalled call takes
+            stream_chunks (int): Chunks a streamed answer is split into; the latency is spread over them
+            seed (int): Random seed, for a reproducible sequence of latencies and failures
+        """
+        self.latency_ms = latency_ms
+        self.latency_sd_ms = latency_sd_ms
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.hang_rate = hang_rate
+        self.hang_seconds = hang_seconds
+        self.stream_chunks = max(1, stream_chunks)
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.calls = 0
+        self.errors = 0
+
+    def draw(self):
+        """
+        Decide the fate of one call
+
+        Returns:
+            tuple: (latency in seconds, error status or None)
+        """
+        with self.lock:
+            self.calls += 1
+            if self.rng.random() < self.hang_rate:
+                return self.hang_seconds, None
+            latency = max(0.0, self.rng.gauss(self.latency_ms, self.latency_sd_ms)) / 1000
+            if self.rng.random() < self.error_rate:
+                self.errors += 1
+                return latency, self.error_status
+            return latency, None
+
+def _response_chunk(text, finished):
+    chunk = {'candidates': [{'content': {'parts': [{'text': text}], 'role': 'model'}, 'index': 0}]}
+    if finished:
+        chunk['candidates'][0]['finishReason'] = 'STOP'
+        chunk['usageMetadata'] = {'promptTokenCount': 0, 'candidatesTokenCount': 0, 'totalTokenCount': 0}
+    return chunk
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    settings = StubSettings()
+
+    def do_POST(self):
+        match = CALL_PATH.match(self.path.split('?', 1)[0])
+        length = int(self.headers.get('Content-Length') or 0)
+        if length:
+            self.rfile.read(length)
+        if not match:
+            self._send_json(404, {'error': {'code': 404, 'message': f'Unknown path {self.path}', 'status': 'NOT_FOUND'}})
+            return
+
+        latency, error_status = self.settings.draw()
+        if error_status:
+            time.sleep(latency)
+            self._send_json(error_status, {'error': {'code': error_status, 'message': 'Stub failure',
+                                                     'status': 'UNAVAILABLE' if error_status == 503 else 'INTERNAL'}})
+        elif match.group('method') == 'generateContent':
+            time.sleep(latency)
+            self._send_json(200, _response_chunk(STUB_ANSWER, True))
+        else:
+            self._stream(latency)
+
+    def _stream(self, latency):
+        # The REST transport reads a streamed answer as one JSON array, element by element
+        chunks = self.settings.stream_chunks
+        size = -(-len(STUB_ANSWER) // chunks)
+        parts = [STUB_ANSWER[start:start + size] for start in range(0, len(STUB_ANSWER), size)]
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        for position, part in enumerate(parts):
+            time.sleep(latency / len(parts))
+            prefix = '[' if position == 0 else ','
+            suffix = ']' if position == len(parts) - 1 else ''
+            self._write_chunk(prefix + json.dumps(_response_chunk(part, position == len(parts) - 1)) + suffix)
+        self.wfile.write(b'0\r\n\r\n')
+
+    def _write_chunk(self, text):
+        data = text.encode()
+        self.wfile.write(f'{len(data):x}\r\n'.encode() + data + b'\r\n')
+        self.wfile.flush()
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logging.debug("stub_llm: " + format, *args)
+
+class _StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Clients that gave up on a slow answer (their deadline passed) are expected
+        if isinstance(sys.exc_info()[1], ConnectionError):
+            return
+        super().handle_error(request, client_address)
+
+def start_stub_server(settings=None, host='127.0.0.1', port=DEFAULT_PORT):
+    """
+    Serve the stub from a background thread
+
+    Args:
+        settings (StubSettings): Latency and failure distribution
+        host (str): Interface to listen on
+        port (int): Port to listen on (0 picks a free one)
+
+    Returns:
+        ThreadingHTTPServer: The running server; its server_address has the actual port
+    """
+    handler = type('ConfiguredStubHandler', (StubHandler,), {'settings': settings or StubSettings()})
+    server = _StubServer((host, port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve a stand-in for the Gemini REST API')
+    parser.add_argument('--host', default='127.0.0.1', help='Interface to listen on')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help='Port to listen on')
+    parser.add_argument('--latency-ms', type=float, default=500, help='Mean response latency')
+    parser.add_argument('--latency-sd-ms', type=float, default=0, help='Standard deviation of the latency')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Share of calls that fail')
+    parser.add_argument('--error-status', type=int, default=500,
+                        help='HTTP status of failed calls (the client retries 503s by itself)')
+    parser.add_argument('--hang-rate', type=float, default=0.0, help='Share of calls that stall')
+    parser.add_argument('--hang-seconds', type=float, default=60, help='How long a stalled call takes')
+    parser.add_argument('--stream-chunks', type=int, default=4, help='Chunks per streamed answer')
+    parser.add_argument('--seed', type=int, help='Random seed')
+    args = parser.parse_args()
+
+    settings = StubSettings(args.latency_ms, args.latency_sd_ms, args.error_rate, args.error_status,
+                            args.hang_rate, args.hang_seconds, args.stream_chunks, args.seed)
+    server = start_stub_server(settings, args.host, args.port)
+    print(f"Stub LLM listening on http://{args.host}:{server.server_address[1]}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        print(f"Served {settings.calls} calls, {settings.errors} failed")
+        server.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+import os
+import re
+from functools import lru_cache
+from nltk.corpus import stopwords
+from nltk.stem import WordNetLemmatizer
+from prepare import missing_nltk_resources
+from startup import timed_startup
+
+# NLTK data read by this module (see prepare.NLTK_RESOURCES)
+REQUIRED_NLTK_RESOURCES = ('stopwords', 'wordnet')
+
+# NLTK data is installed ahead of time by prepare.py; nothing is downloaded at import.
+# All of it is checked here, since WordNet is otherwise first read while the indexes are built
+with timed_startup('check NLTK data'):
+    missing = missing_nltk_resources(REQUIRED_NLTK_RESOURCES)
+    if missing:
+        raise LookupError(f"NLTK data is missing ({', '.join(missing)}). Run `python prepare.py` to download it.")
+
+lemmatizer = WordNetLemmatizer()
+with timed_startup('load stop words'):
+    stop_words = set(stopwords.words('english'))
+
+# Additional legal stop words
+legal_stop_words = {
+    'section', 'act', 'law', 'legal', 'court', 'criminal', 'case',
+    'judge', 'prosecution', 'defense', 'plaintiff', 'defendant',
+    'evidence', 'witness', 'testimony', 'jury', 'verdict', 'sentence',
+    'appeal', 'hearing', 'trial', 'order', 'petition', 'ipc'
+}
+
+stop_words = stop_words.union(legal_stop_words)
+
+# Upper bound on distinct tokens kept in the lemma cache
+LEMMA_CACHE_SIZE = int(os.environ.get('LEMMA_CACHE_SIZE', '50000'))
+
+@lru_cache(maxsize=LEMMA_CACHE_SIZE)
+def lemmatize(token):
+    """
+    Lemmatize a single token, memoized in a bounded LRU cache.
+    Legal vocabulary is small and repetitive, so most calls skip WordNet.
+    """
+    return lemmatizer.lemmatize(token)
+
+def lemma_cache_stats():
+    """
+    Return lemma cache counters
+
+    Returns:
+        dict: hits, misses, current size and maximum size of the cache
+    """
+    info = lemmatize.cache_info()
+    return {
+        'hits': info.hits,
+        'misses': info.misses,
+        'size': info.currsize,
+        'maxsize': info.maxsize
+    }
+
+def preprocess_text(text):
+    """
+    Preprocess text for NLP analysis:
+    - Convert to lowercase
+    - Remove special characters
+    - Tokenize using simple split (avoiding NLTK issues)
+    - Remove stopwords
+    - Lemmatize
+    """
+    # Convert to lowercase
+    text = text.lower()
+    
+    # Remove special characters
+    text = re.sub(r'[^\w\s]', ' ', text)
+    
+    # Simple tokenization by splitting on whitespace
+    tokens = text.split()
+    
+    # Remove stopwords and lemmatize
+    processed_tokens = [lemmatize(token) for token in tokens if token not in stop_words]
+    
+    return processed_tokens
@@ -1,71 +1,59 @@
-import re
 import random
-from nltk.tokenize import word_tokenize
-from nltk.corpus import stopwords
-from nltk.stem import WordNetLemmatizer
-import nltk
 from ipc_data import ipc_sections
 from precedents_data import legal_precedents
-import os
-import google.generativeai as genai
+from text_processing import preprocess_text
+from legal_index import IpcIndex, PrecedentIndex, ipc_index, precedent_index
+from section_scorer import SectionScorer, SECTION_TERM_WEIGHTING, section_scorer
+from scoring_rules import scoring_rules
+from llm_client import llm_client, LLMUnavailable
+from startup import timed_startup
+from request_trace import current_trace
+from metrics import FALLBACKS
+import logging
 
-# Configure Gemini API
-GEMINI_API_KEY = os.environ.get('GEMINI_API_KEY')
-if GEMINI_API_KEY:
-    genai.configure(api_key=GEMINI_API_KEY)
-    gemini_model = genai.GenerativeModel('gemini-1.5-pro')
+# Crime categories with expanded keywords, from the rule table
+crime_categories = scoring_rules.crime_categories
 
-# Download necessary NLTK packages
-try:
-    nltk.data.find('tokenizers/punkt')
-    nltk.data.find('corpora/stopwords')
-    nltk.data.find('corpora/wordnet')
-except LookupError:
-    nltk.download('punkt')
-    nltk.download('stopwords')
-    nltk.download('wordnet')
+# Single-pass matcher over every section keyword phrase and crime category term
+with timed_startup('build phrase matcher'):
+    case_phrase_matcher = ipc_index.build_phrase_matcher(crime_categories)
 
-# Download punkt_tab if needed
-try:
-    nltk.data.find('tokenizers/punkt_tab')
-except LookupError:
-    nltk.download('punkt_tab')
-
-lemmatizer = WordNetLemmatizer()
-stop_words = set(stopwords.words('english'))
-
-# Additional legal stop words
-legal_stop_words = {
-    'section', 'act', 'law', 'legal', 'court', 'criminal', 'case',
-    'judge', 'prosecution', 'defense', 'plaintiff', 'defendant',
-    'evidence', 'witness', 'testimony', 'jury', 'verdict', 'sentence',
-    'appeal', 'hearing', 'trial', 'order', 'petition', 'ipc'
-}
+class MatchingIndexes:
+    """
+    Everything section and precedent matching run against: the section and
+    precedent indexes, the section scorer and the phrase matcher
+    """
+    __slots__ = ('ipc_index', 'precedent_index', 'section_scorer', 'phrase_matcher')
 
-stop_words = stop_words.union(legal_stop_words)
+    def __init__(self, ipc_index, precedent_index, section_scorer, phrase_matcher):
+        self.ipc_index = ipc_index
+        self.precedent_index = precedent_index
+        self.section_scorer = section_scorer
+        self.phrase_matcher = phrase_matcher
 
-def preprocess_text(text):
-    """
-    Preprocess text for NLP analysis:
-    - Convert to lowercase
-    - Remove special characters
-    - Tokenize using simple split (avoiding NLTK issues)
-    - Remove stopwords
-    - Lemmatize
+def build_matching_indexes(sections, precedents):
     """
-    # Convert to lowercase
-    text = text.lower()
+    Build matching indexes over another corpus, e.g. a synthetic one for benchmarks
     
-    # Remove special characters
-    text = re.sub(r'[^\w\s]', ' ', text)
-    
-    # Simple tokenization by splitting on whitespace
-    tokens = text.split()
-    
-    # Remove stopwords and lemmatize
-    processed_tokens = [lemmatizer.lemmatize(token) for token in tokens if token not in stop_words]
-    
-    return processed_tokens
+    Args:
+        sections (dict): IPC sections keyed by section id (see ipc_data)
+        precedents (dict): Precedents keyed by precedent id (see precedents_data)
+        
+    Returns:
+        MatchingIndexes: Indexes to pass to the matching functions
+    """
+    section_index = IpcIndex(sections)
+    return MatchingIndexes(section_index, PrecedentIndex(precedents),
+                           SectionScorer(section_index, scoring_rules, SECTION_TERM_WEIGHTING),
+                           section_index.build_phrase_matcher(crime_categories))
+
+# Indexes over the bundled corpus, used unless the matching functions are given others
+default_indexes = MatchingIndexes(ipc_index, precedent_index, section_scorer, case_phrase_matcher)
+
+# Points per word of a section keyword phrase found in the case text, and the
+# most a single section can gain from phrase matches
+PHRASE_WORD_WEIGHT = 0.5
+MAX_PHRASE_SCORE = 4
 
 def extract_keywords(text, threshold=0.4):
     """
@@ -76,16 +64,58 @@ def extract_keywords(text, threshold=0.4):
     # Return unique tokens
     return list(set(tokens))
 
-def find_relevant_ipc_sections(keywords, case_details):
+def find_relevant_ipc_sections(keywords, case_details, indexes=None):
     """
     Find relevant IPC sections based on keywords and case details
     with improved contextual filtering and semantic understanding
+    
+    Args:
+        keywords (list): Keywords extracted from the case
+        case_details (dict): Dictionary containing case details
+        indexes (MatchingIndexes): Indexes to match against; defaults to the bundled corpus
+    """
+    import logging
+    
+    indexes = indexes or default_indexes
+    logging.debug("Finding relevant IPC sections for case")
+    case_features = extract_section_features(keywords, case_details, indexes)
+    
+    # KEYWORD SCORING - Term overlap with every section in one pass over the
+    # section x term matrices (plain matches plus important keyword weights,
+    # and title matches for the case type)
+    scores = indexes.section_scorer.keyword_scores(case_features['keywords'], case_features['case_type_tokens'])
+    return rank_sections(scores, case_features, indexes)
+
+def find_relevant_ipc_sections_many(keywords_list, case_details_list, indexes=None):
+    """
+    Batch form of find_relevant_ipc_sections: the keyword scores of all
+    cases come from a single case x section matrix product
+    
+    Returns:
+        list: Relevant section IDs for each case, in input order
     """
     import logging
-    import re
     
-    logging.info("Finding relevant IPC sections for case")
-    relevant_sections = []
+    indexes = indexes or default_indexes
+    logging.debug("Finding relevant IPC sections for %d cases", len(case_details_list))
+    features_list = [
+        extract_section_features(keywords, case_details, indexes)
+        for keywords, case_details in zip(keywords_list, case_details_list)
+    ]
+    score_rows = indexes.section_scorer.keyword_scores_many(
+        [(case_features['keywords'], case_features['case_type_tokens']) for case_features in features_list])
+    return [rank_sections(scores, case_features, indexes) for scores, case_features in zip(score_rows, features_list)]
+
+def extract_section_features(keywords, case_details, indexes=None):
+    """
+    Extract everything the section scorer needs to know about a case:
+    its keywords, categories, scenarios and directly mapped sections
+    
+    Returns:
+        dict: keywords, case_type, case_type_tokens, priority_sections,
+              mentioned_sections, phrase_scores and rule_features
+    """
+    indexes = indexes or default_indexes
     
     # Extract detailed case information
     offense_description = case_details.get('offense_description', '').lower()
@@ -97,7 +127,6 @@ def find_relevant_ipc_sections(keywords, case_details):
     
     # Create a combined text for comprehensive context analysis
     combined_text = f"{case_type} {offense_description} {query} {victim_details} {accused_details} {evidence_summary}"
-    logging.info(f"Case type: {case_type}")
     
     # Preprocess and tokenize text
     case_type_tokens = preprocess_text(case_type)
@@ -106,289 +135,153 @@ def find_relevant_ipc_sections(keywords, case_details):
     
     # Combine all keywords for matching
     all_keywords = set(keywords + offense_tokens + case_type_tokens + query_tokens)
-    logging.info(f"Total unique keywords for matching: {len(all_keywords)}")
     
     # ENHANCED CASE CATEGORIZATION - More detailed classification
-    # Define crime categories with expanded keywords
-    crime_categories = {
-        'theft': ['theft', 'steal', 'stolen', 'took', 'take', 'taking', 'rob', 'robbed', 
-                 'burglary', 'shoplifting', 'pickpocket', 'loot', 'misappropriation', 
-                 'dishonest', 'removed', 'burglar', 'break-in', 'missing', 'lost', 'disappeared'],
-        
-        'robbery': ['robbery', 'armed', 'force', 'weapon', 'threat', 'gun', 'knife', 'intimidate',
-                   'forceful', 'forcibly', 'snatched', 'mugging', 'mugged', 'dacoity'],
-        
-        'assault': ['assault', 'hurt', 'injure', 'attack', 'beat', 'hit', 'punch', 'slap', 
-                   'wound', 'harm', 'injury', 'bodily', 'physical', 'violence', 'beaten', 
-                   'bruise', 'fracture', 'bleeding', 'pain', 'fighting'],
-        
-        'sexual_offense': ['rape', 'sexual', 'molest', 'touch', 'modesty', 'obscene', 'expose', 
-                          'indecent', 'harassment', 'outrage', 'eve teasing', 'non-consensual'],
-        
-        'fraud': ['fraud', 'cheat', 'deceive', 'dupe', 'swindle', 'misrepresentation', 
-                 'dishonest', 'false', 'fake', 'pretend', 'impersonate', 'forge', 'scam', 
-                 'trick', 'mislead', 'con', 'ponzi', 'scheme', 'duped', 'cheated'],
-        
-        'criminal_breach_of_trust': ['trust', 'misappropriate', 'breach', 'entrusted', 'fiduciary', 
-                                   'betrayal', 'embezzle', 'misuse', 'company', 'employer'],
-        
-        'kidnapping': ['kidnap', 'abduct', 'forcibly', 'detain', 'confine', 'illegal', 'captive', 
-                      'hostage', 'ransom', 'missing person', 'child abduction'],
-        
-        'murder': ['murder', 'kill', 'death', 'homicide', 'slay', 'fatal', 'deadly', 'lethal',
-                  'died', 'deceased', 'body', 'corpse', 'blood', 'weapon'],
-        
-        'domestic_violence': ['domestic', 'spouse', 'wife', 'husband', 'marriage', 'dowry', 'cruelty', 
-                             'matrimonial', 'in-laws', 'family', 'household', 'married', 'divorce'],
-        
-        'cybercrime': ['cyber', 'online', 'internet', 'computer', 'hacking', 'password', 'account', 
-                       'data', 'social media', 'email', 'identity', 'phishing', 'website', 'profile'],
-        
-        'extortion': ['extortion', 'blackmail', 'ransom', 'demand', 'threaten', 'coerce', 'pay',
-                     'intimidate', 'fear', 'consequences'],
-        
-        'defamation': ['defame', 'slander', 'libel', 'reputation', 'character', 'honor', 'dignity',
-                      'false accusation', 'rumor', 'social media', 'post', 'image']
-    }
-    
-    # Identify which crime categories apply to this case
-    case_categories = []
-    for category, category_keywords in crime_categories.items():
-        if any(keyword in combined_text for keyword in category_keywords):
-            case_categories.append(category)
-    
-    logging.info(f"Identified case categories: {case_categories}")
+    # Identify which crime categories apply to this case and which sections'
+    # keyword phrases occur in it, with one scan over the combined text
+    matched_categories = set()
+    section_phrase_hits = {}
+    for start, end, phrase, (kind, target) in indexes.phrase_matcher.find_all(combined_text):
+        if kind == 'category':
+            matched_categories.add(target)
+        else:
+            section_phrase_hits.setdefault(target, set()).add(phrase)
+    case_categories = [category for category in crime_categories if category in matched_categories]
     
     # CONTEXTUAL SCENARIO DETECTION - Identify specific scenarios in the case
     # This significantly improves the accuracy of section matching
-    scenarios = {
-        'group_crime': re.search(r'\b(group|gang|multiple|several|many|crowd|together)\s+(people|persons|men|women|thieves|individuals|accused)\b', combined_text) is not None,
-        
-        'weapon_used': re.search(r'\b(gun|pistol|knife|blade|sword|stick|rod|bat|weapon|firearm|revolver|sharp|weapon)\b', combined_text) is not None,
-        
-        'violence_involved': any(term in combined_text for term in ['hurt', 'injured', 'beat', 'hit', 'attack', 'harm', 'wound', 'force', 'violent']),
-        
-        'night_time': re.search(r'\b(night|dark|midnight|evening|after sunset|late hours)\b', combined_text) is not None,
-        
-        'dwelling_house': re.search(r'\b(house|home|apartment|residence|flat|dwelling)\b', combined_text) is not None,
-        
-        'public_place': re.search(r'\b(public|street|road|market|mall|station|bus|train|shop|store|restaurant)\b', combined_text) is not None,
-        
-        'electronic_device': re.search(r'\b(phone|mobile|smartphone|laptop|computer|tablet|device|electronic)\b', combined_text) is not None,
-        
-        'valuable_property': re.search(r'\b(jewellery|gold|cash|money|valuable|watch|wallet|expensive|worth)\b', combined_text) is not None,
-        
-        'vehicle_involved': re.search(r'\b(car|bike|bicycle|motorcycle|scooter|auto|vehicle|transport)\b', combined_text) is not None,
-        
-        'intoxication': re.search(r'\b(drunk|alcohol|intoxicated|drink|liquor|beer|wine|drug)\b', combined_text) is not None,
-        
-        'repeat_offense': re.search(r'\b(previous|before|history|repeatedly|again|once more|already)\b', combined_text) is not None,
-        
-        'minor_involved': re.search(r'\b(child|minor|kid|young|underage|juvenile|below 18|teenager)\b', combined_text) is not None,
-        
-        'online_component': re.search(r'\b(online|internet|website|email|cyber|digital|electronic|virtual|web)\b', combined_text) is not None,
-        
-        'professional_relationship': re.search(r'\b(employee|employer|company|office|business|work|job|professional|workplace)\b', combined_text) is not None
-    }
+    scenarios = scoring_rules.detect_scenarios(combined_text)
     
-    # Log detected scenarios
     detected_scenarios = [scenario for scenario, is_present in scenarios.items() if is_present]
-    logging.info(f"Detected scenarios: {detected_scenarios}")
-    
-    # ENHANCED KEYWORD IMPORTANCE - Assign weights to important terms
-    important_keywords = {
-        'theft': 3, 'robbery': 3, 'assault': 3, 'murder': 3, 'rape': 3, 'fraud': 3, 'kidnap': 3, 'abduct': 3,
-        'hurt': 2, 'injury': 2, 'weapon': 2, 'force': 2, 'threat': 2, 'violence': 2, 'stolen': 2, 'attacked': 2,
-        'property': 1, 'money': 1, 'valuable': 1, 'victim': 1, 'accused': 1, 'police': 1, 'report': 1, 'file': 1
-    }
     
-    # INTELLIGENCE MAPPING - Map certain case combinations to specific IPC sections
-    priority_section_mapping = {
-        'theft': ['ipc_378', 'ipc_379'],  # Basic theft
-        'theft+dwelling_house': ['ipc_380'],  # Theft in dwelling house
-        'theft+night_time': ['ipc_380'],  # Theft at night time
-        'theft+violence_involved': ['ipc_392'],  # Robbery
-        'theft+weapon_used': ['ipc_392', 'ipc_397'],  # Robbery with deadly weapon
-        'theft+group_crime': ['ipc_391', 'ipc_395'],  # Dacoity
-        'theft+electronic_device': ['ipc_378', 'ipc_379'],  # Mobile theft
-        'theft+valuable_property': ['ipc_379'],  # Theft of property
-        'theft+vehicle_involved': ['ipc_379'],  # Vehicle theft
-        
-        'assault': ['ipc_323'],  # Simple hurt
-        'assault+weapon_used': ['ipc_324', 'ipc_326'],  # Hurt by dangerous weapon
-        'assault+violence_involved': ['ipc_325'],  # Grievous hurt
-        'assault+group_crime': ['ipc_147', 'ipc_148'],  # Rioting
-        
-        'fraud': ['ipc_415', 'ipc_420'],  # Cheating
-        'fraud+professional_relationship': ['ipc_406', 'ipc_409'],  # Criminal breach of trust
-        'fraud+online_component': ['ipc_468', 'ipc_471'],  # Forgery for cheating
-        
-        'sexual_offense': ['ipc_354', 'ipc_354A'],  # Outraging modesty
-        'sexual_offense+minor_involved': ['ipc_376'],  # Rape of minor
-        
-        'domestic_violence': ['ipc_498A'],  # Cruelty by husband or relatives
-        'kidnapping': ['ipc_363', 'ipc_365'],  # Kidnapping
-        'murder': ['ipc_302', 'ipc_304'],  # Murder
-        'extortion': ['ipc_383', 'ipc_384'],  # Extortion
-        'defamation': ['ipc_499', 'ipc_500']  # Defamation
-    }
+    # ENHANCED KEYWORD IMPORTANCE - Important terms are weighted in the section scorer's term matrix
     
     # PRIORITY SECTIONS IDENTIFICATION - Determine directly applicable sections
+    # from the rule table's category (+scenario) to section mapping
     priority_sections = []
+    priority_combos = []
+    
+    for categories_combo, category, scenario, sections in scoring_rules.priority_rules:
+        # Check if main category matches, and the scenario component if there is one
+        if category in case_categories and (scenario is None or scenario in detected_scenarios):
+            priority_sections.extend(sections)
+            priority_combos.append(categories_combo)
+    
+    # Sections whose number is mentioned, and points for the sections' own keyword
+    # phrases found in the case (longer phrases are more specific, so they count for more)
+    mentioned_sections = indexes.ipc_index.sections_numbered_in(combined_text)
+    phrase_scores = {
+        section_id: min(MAX_PHRASE_SCORE, sum(PHRASE_WORD_WEIGHT * len(phrase.split()) for phrase in matched_phrases))
+        for section_id, matched_phrases in section_phrase_hits.items()
+    }
     
-    # Check for specific case+scenario combinations that directly map to certain sections
-    for categories_combo, sections in priority_section_mapping.items():
-        categories_split = categories_combo.split('+')
-        
-        # Check if main category matches
-        if categories_split[0] in case_categories:
-            # If there's a scenario component, check it too
-            if len(categories_split) == 1:
-                priority_sections.extend(sections)
-                logging.info(f"Adding priority sections {sections} for category {categories_split[0]}")
-            elif len(categories_split) == 2 and categories_split[1] in detected_scenarios:
-                priority_sections.extend(sections)
-                logging.info(f"Adding priority sections {sections} for {categories_combo}")
-    
-    # SCORING ALGORITHM - Enhanced relevance scoring
-    # Evaluate each IPC section for relevance
-    for section_id, section_data in ipc_sections.items():
-        section_title = section_data['title'].lower()
-        section_desc = section_data['description'].lower()
-        section_combined = f"{section_title} {section_desc}"
-        total_score = 0
-        
-        # Check if this is a priority section identified through direct mapping
-        if section_id in priority_sections:
-            total_score += 12  # Give high base score to mapped sections
-            logging.info(f"Section {section_id} is a priority section, base score: 12")
-        
-        # Skip sections that clearly don't match the case categorization
-        # If it's a pure theft case, skip sexual offense sections
-        if 'theft' in case_categories and not 'sexual_offense' in case_categories:
-            if any(term in section_title for term in ['rape', 'modesty', 'sexual']):
-                continue
-                
-        # If it's a pure assault case, skip specific theft sections
-        if 'assault' in case_categories and not 'theft' in case_categories:
-            if any(term in section_title for term in ['theft', 'robbery']) and not 'hurt' in section_title:
-                continue
-        
-        # Calculate keyword matching score with weighting
-        section_keywords = preprocess_text(section_combined)
-        
-        # Regular keyword matching
-        basic_matches = sum(1 for keyword in all_keywords if keyword in section_keywords)
-        
-        # Weighted matching for important keywords
-        weighted_matches = sum(important_keywords.get(keyword, 1) 
-                              for keyword in all_keywords 
-                              if keyword in section_keywords and keyword in important_keywords)
-        
-        # Title matching - higher weight for matches in the section title
-        title_keywords = preprocess_text(section_title)
-        title_matches = sum(3 for keyword in case_type_tokens if keyword in title_keywords)
-        
-        # Number matching - important for scenarios where section numbers are mentioned
-        section_number = section_data.get('number', '')
-        if section_number and section_number in combined_text:
-            total_score += 10
-            logging.info(f"Section number {section_number} explicitly mentioned, adding 10 points")
-        
-        # Add weighted scores
-        total_score += basic_matches + weighted_matches + title_matches
-        
-        # CONTEXT-SPECIFIC BOOSTING - Add scores based on specific conditions
-        
-        # Exact case type match (strong indicator)
-        if case_type in section_title:
-            total_score += 8
-            logging.info(f"Exact case type match for section {section_id}, adding 8 points")
-        
-        # Scenario-based section boosting
-        if 'group_crime' in detected_scenarios and ('unlawful assembly' in section_combined or 
-                                                   'common intention' in section_combined or 
-                                                   'conspiracy' in section_combined or
-                                                   'more than five persons' in section_combined):
-            total_score += 5
-            logging.info(f"Group crime match for section {section_id}, adding 5 points")
-            
-        if 'weapon_used' in detected_scenarios and ('weapon' in section_combined or 
-                                                   'armed' in section_combined or 
-                                                   'dangerous' in section_combined):
-            total_score += 5
-            logging.info(f"Weapon involved match for section {section_id}, adding 5 points")
-        
-        if 'violence_involved' in detected_scenarios and ('hurt' in section_combined or 
-                                                         'injury' in section_combined or 
-                                                         'assault' in section_combined):
-            total_score += 4
-            logging.info(f"Violence match for section {section_id}, adding 4 points")
-        
-        if 'night_time' in detected_scenarios and 'night' in section_combined:
-            total_score += 3
-            logging.info(f"Night time match for section {section_id}, adding 3 points")
-        
-        if 'dwelling_house' in detected_scenarios and ('house' in section_combined or 
-                                                     'dwelling' in section_combined or 
-                                                     'building' in section_combined):
-            total_score += 3
-            logging.info(f"Dwelling house match for section {section_id}, adding 3 points")
-        
-        # SPECIAL CASE HANDLING - Category-specific optimizations
-        if 'theft' in case_categories:
-            # For basic theft cases, prioritize foundational theft sections
-            if section_id in ['ipc_378', 'ipc_379']:
-                total_score += 4
-                logging.info(f"Basic theft section {section_id}, adding 4 points")
-            
-            # For thefts with force, boost robbery sections
-            if scenarios['violence_involved'] and section_id in ['ipc_390', 'ipc_392']:
-                total_score += 5
-                logging.info(f"Theft with violence match for section {section_id}, adding 5 points")
-                
-            # For house break-ins, boost house trespass sections
-            if scenarios['dwelling_house'] and section_id in ['ipc_380', 'ipc_454', 'ipc_457']:
-                total_score += 5
-                logging.info(f"House theft match for section {section_id}, adding 5 points")
-        
-        if 'assault' in case_categories:
-            # Distinguish between simple and grievous hurt
-            if 'simple hurt' in section_title and not scenarios['weapon_used']:
-                total_score += 3
-                logging.info(f"Simple hurt match for section {section_id}, adding 3 points")
-                
-            if 'grievous hurt' in section_title and (scenarios['weapon_used'] or scenarios['violence_involved']):
-                total_score += 5
-                logging.info(f"Grievous hurt match for section {section_id}, adding 5 points")
+    trace = current_trace()
+    if trace:
+        trace.record('section_features', case_type=case_type, keywords=len(all_keywords),
+                     categories=case_categories, scenarios=detected_scenarios, priority_rules=priority_combos,
+                     priority_sections=priority_sections, mentioned_sections=mentioned_sections,
+                     phrase_hits=section_phrase_hits)
+    
+    return {
+        'keywords': all_keywords,
+        'case_type': case_type,
+        'case_type_tokens': case_type_tokens,
+        'priority_sections': priority_sections,
+        'mentioned_sections': mentioned_sections,
+        'phrase_scores': phrase_scores,
+        'rule_features': scoring_rules.case_features(case_categories, scenarios)
+    }
+
+def rank_sections(scores, case_features, indexes=None):
+    """
+    Apply the context boosts to a case's keyword scores and select the top sections
+    
+    Args:
+        scores: Keyword score vector from the section scorer; updated in place
+        case_features (dict): Output of extract_section_features
+        indexes (MatchingIndexes): Indexes the scores come from
         
-        # Filter sections with sufficient relevance
-        if total_score >= 3:
-            relevant_sections.append({
-                'id': section_id,
-                'score': total_score
-            })
-            logging.info(f"Added section {section_id} with score {total_score}")
+    Returns:
+        list: Top 5 relevant section IDs
+    """
+    indexes = indexes or default_indexes
+    trace = current_trace()
+    if trace:
+        keyword_scores = scores.copy()
+    
+    # CONTEXT-SPECIFIC BOOSTING - Added to the score vector
+    
+    # Priority sections identified through direct mapping get a high base score
+    indexes.section_scorer.add(scores, case_features['priority_sections'], 12)
     
-    # Sort by relevance score
-    relevant_sections.sort(key=lambda x: x['score'], reverse=True)
+    # Number matching - important for scenarios where section numbers are mentioned
+    indexes.section_scorer.add(scores, case_features['mentioned_sections'], 10)
     
-    # Log the top sections found
-    top_sections = [section['id'] for section in relevant_sections[:5]]
-    logging.info(f"Top 5 selected sections: {top_sections}")
+    # Phrase matching - the section's own keyword phrases found in the case
+    indexes.section_scorer.add_each(scores, case_features['phrase_scores'])
+    
+    # Exact case type match (strong indicator)
+    indexes.section_scorer.add(scores, indexes.ipc_index.sections_with_title_containing(case_features['case_type']), 8)
+    
+    # Scenario and category boosts, and the pure theft / pure assault exclusions,
+    # come from the rule table's section rules
+    excluded_sections = indexes.section_scorer.apply_rules(scores, case_features['rule_features'])
+    
+    # Filter sections with sufficient relevance and keep the top 5 most relevant
+    relevant_sections = indexes.section_scorer.top(scores, excluded_sections, threshold=3, limit=5)
+    top_sections = [section_id for section_id, score in relevant_sections]
+    
+    if trace:
+        # Score breakdown of the selected sections and the next best candidates
+        candidates = indexes.section_scorer.top(scores, None, threshold=3, limit=10)
+        trace.record('sections', selected=top_sections, breakdown={
+            section_id: explain_section_score(section_id, score, keyword_scores, case_features, indexes)
+            for section_id, score in candidates
+        })
     
     # Return top 5 most relevant section IDs
     return top_sections
 
-def find_relevant_precedents(ipc_section_ids, keywords):
+def explain_section_score(section_id, score, keyword_scores, case_features, indexes=None):
+    """
+    Break a section's final score down into its components, for request traces
+    
+    Args:
+        section_id (str): Section to explain
+        score (float): Its final score
+        keyword_scores: Score vector before the context boosts
+        case_features (dict): Output of extract_section_features
+        
+    Returns:
+        dict: Points from keywords, priority mapping, mentioned number, phrases and
+              title, plus the names of the boost and exclusion rules that applied
+    """
+    indexes = indexes or default_indexes
+    boost_rules, exclusion_rules = indexes.section_scorer.rules_for(section_id, case_features['rule_features'])
+    return {
+        'score': score,
+        'keywords': indexes.section_scorer.score_of(keyword_scores, section_id),
+        'priority': 12 if section_id in case_features['priority_sections'] else 0,
+        'mentioned': 10 if section_id in case_features['mentioned_sections'] else 0,
+        'phrases': case_features['phrase_scores'].get(section_id, 0),
+        'title': 8 if section_id in indexes.ipc_index.sections_with_title_containing(case_features['case_type']) else 0,
+        'rules': boost_rules,
+        'excluded_by': exclusion_rules
+    }
+
+def find_relevant_precedents(ipc_section_ids, keywords, indexes=None):
     """
     Find relevant legal precedents based on IPC sections and keywords
     with enhanced matching for better accuracy
+    
+    Args:
+        ipc_section_ids (list): Matched IPC section IDs
+        keywords (list): Keywords extracted from the case
+        indexes (MatchingIndexes): Indexes to match against; defaults to the bundled corpus
     """
-    import logging
+    indexes = indexes or default_indexes
     relevant_precedents = []
-    
-    logging.info(f"Finding relevant precedents based on {len(ipc_section_ids)} IPC sections and {len(keywords)} keywords")
+    trace = current_trace()
     
     # Define important legal terms that should be weighted more heavily
     important_legal_terms = {
@@ -405,30 +298,29 @@ def find_relevant_precedents(ipc_section_ids, keywords):
     # Track precedents by section importance
     section_matched_precedents = {}
     
-    # First, find precedents directly related to the IPC sections
-    for precedent_id, precedent_data in legal_precedents.items():
-        # Section matching score - more weight for exact matches
-        section_match_score = 0
-        related_sections = precedent_data.get('related_sections', [])
-        
-        # Check for direct section matches
-        for section_id in ipc_section_ids:
-            if section_id in related_sections:
-                section_match_score += 5  # Base score for direct section match
-                logging.info(f"Precedent {precedent_id} matches section {section_id}")
-                
-                # Group precedents by section for later retrieval
-                if section_id not in section_matched_precedents:
-                    section_matched_precedents[section_id] = []
-                section_matched_precedents[section_id].append(precedent_id)
-        
-        # Skip precedents with no section matches (unlike previous implementation)
-        if section_match_score == 0:
-            continue
+    # First, find precedents directly related to the IPC sections through the
+    # section -> precedent postings (more weight for each matched section)
+    section_match_scores = {}
+    for section_id in ipc_section_ids:
+        for precedent_id in indexes.precedent_index.for_section(section_id):
+            section_match_scores[precedent_id] = section_match_scores.get(precedent_id, 0) + 5
+            
+            # Group precedents by section for later retrieval
+            section_matched_precedents.setdefault(section_id, []).append(precedent_id)
+    
+    # Sections in order of their first matching precedent, as the diversity pass expects
+    section_order = {section_id: position for position, section_id in enumerate(ipc_section_ids)}
+    section_matched_precedents = dict(sorted(
+        section_matched_precedents.items(),
+        key=lambda item: (indexes.precedent_index.get(item[1][0]).position, section_order[item[0]])
+    ))
+    
+    for precedent_id, indexed_precedent in indexes.precedent_index.ordered(section_match_scores):
+        precedent_data = indexed_precedent.data
+        section_match_score = section_match_scores[precedent_id]
         
         # Calculate relevance based on improved keyword matching
-        precedent_text = precedent_data.get('summary', '') + ' ' + precedent_data.get('implications', '')
-        precedent_keywords = preprocess_text(precedent_text)
+        precedent_keywords = indexed_precedent.tokens
         
         # Basic keyword matching
         basic_matches = sum(1 for keyword in keywords if keyword in precedent_keywords)
@@ -441,56 +333,41 @@ def find_relevant_precedents(ipc_section_ids, keywords):
         # Case-specific term matching (more weight)
         case_specific_matches = sum(2 for term in case_specific_terms if term in precedent_keywords)
         
-        # Calculate year recency factor (more recent cases get slightly higher scores)
-        year = precedent_data.get('year', 2000)
-        recency_factor = min(1.5, max(1.0, (year - 1950) / 50))  # 1.0 to 1.5 based on year
-        
-        # Supreme Court decisions get higher weight
-        court_weight = 1.5 if 'supreme' in precedent_data.get('court', '').lower() else 1.0
-        
-        # Calculate final relevance score
-        relevance = (section_match_score + basic_matches + weighted_matches + case_specific_matches) * recency_factor * court_weight
+        # Calculate final relevance score with the precedent's precomputed
+        # recency factor and court weight
+        relevance = (section_match_score + basic_matches + weighted_matches + case_specific_matches) * indexed_precedent.recency_factor * indexed_precedent.court_weight
         
         if relevance > 0:
-            logging.info(f"Precedent {precedent_id} relevance score: {relevance}")
             relevant_precedents.append({
                 'id': precedent_id,
                 'relevance': relevance,
-                'data': precedent_data
+                'data': precedent_data,
+                'source': 'sections'
             })
     
     # If we have too few precedents, try to add more based on keywords
     if len(relevant_precedents) < 2:
-        logging.info("Found fewer than 2 precedents with section matches, adding keyword-based matches")
-        for precedent_id, precedent_data in legal_precedents.items():
-            # Skip precedents we've already added
-            if any(p['id'] == precedent_id for p in relevant_precedents):
-                continue
-            
+        # Only precedents sharing a keyword can reach the keyword-only threshold;
+        # their match counts come straight from the token posting lists
+        keyword_matches = indexes.precedent_index.keyword_matches(keywords, important_legal_terms)
+        for p in relevant_precedents:
+            keyword_matches.pop(p['id'], None)
+        
+        for precedent_id, indexed_precedent in indexes.precedent_index.ordered(keyword_matches):
             # Match purely on keywords for backup precedents
-            precedent_text = precedent_data.get('summary', '') + ' ' + precedent_data.get('implications', '')
-            precedent_keywords = preprocess_text(precedent_text)
-            
-            # More aggressive keyword matching
-            basic_matches = sum(1 for keyword in keywords if keyword in precedent_keywords)
-            weighted_matches = sum(important_legal_terms.get(keyword, 1) 
-                                  for keyword in keywords 
-                                  if keyword in precedent_keywords and keyword in important_legal_terms)
-            
+            basic_matches, weighted_matches = keyword_matches[precedent_id]
             relevance = basic_matches + weighted_matches
             
             if relevance >= 3:  # Higher threshold for keyword-only matches
-                logging.info(f"Added keyword-only precedent {precedent_id} with score {relevance}")
                 relevant_precedents.append({
                     'id': precedent_id,
                     'relevance': relevance * 0.7,  # Lower weight than section matches
-                    'data': precedent_data
+                    'data': indexed_precedent.data,
+                    'source': 'keywords'
                 })
     
     # Ensure diversity of precedents - try to include at least one precedent from each matched section
     if len(relevant_precedents) < 3 and section_matched_precedents:
-        logging.info("Ensuring precedent diversity by section")
-        
         # Get current precedent IDs
         current_ids = [p['id'] for p in relevant_precedents]
         
@@ -502,13 +379,13 @@ def find_relevant_precedents(ipc_section_ids, keywords):
             # Find a precedent from this section that isn't already included
             for pid in precedent_ids:
                 if pid not in current_ids:
-                    precedent_data = legal_precedents.get(pid)
-                    if precedent_data:
-                        logging.info(f"Adding diverse precedent {pid} from section {section_id}")
+                    indexed_precedent = indexes.precedent_index.get(pid)
+                    if indexed_precedent:
                         relevant_precedents.append({
                             'id': pid,
                             'relevance': 1.0,  # Baseline relevance
-                            'data': precedent_data
+                            'data': indexed_precedent.data,
+                            'source': 'diversity'
                         })
                         current_ids.append(pid)
                         break
@@ -533,32 +410,55 @@ def find_relevant_precedents(ipc_section_ids, keywords):
                 # Replace the third precedent with this Supreme Court case
                 top_precedents = [p['id'] for p in relevant_precedents[:2]]
                 top_precedents.append(p['id'])
-                logging.info(f"Added Supreme Court precedent {p['id']} for diversity")
                 break
     
     # If we didn't do the Supreme Court replacement, use the standard top 3
     if not top_precedents:
         top_precedents = [p['id'] for p in relevant_precedents[:3]]
     
-    logging.info(f"Selected precedents: {top_precedents}")
+    if trace:
+        trace.record('precedents', sections=ipc_section_ids, selected=top_precedents, ranked=[
+            {'id': p['id'], 'relevance': round(p['relevance'], 3), 'source': p['source']}
+            for p in relevant_precedents[:10]
+        ])
     return top_precedents
 
 def generate_legal_analysis(case_details, ipc_section_ids, precedent_ids):
     """
     Generate a legal analysis based on case details, relevant IPC sections,
     and legal precedents with balanced terminology that's understandable.
-    Uses Gemini API if available, otherwise falls back to template-based generation.
+    Uses the language model if one is configured, otherwise falls back to template-based generation.
+    """
+    return generate_legal_analysis_with_source(case_details, ipc_section_ids, precedent_ids)[0]
+
+def generate_legal_analysis_with_source(case_details, ipc_section_ids, precedent_ids):
     """
-    # Check if Gemini API is available and configured
-    if GEMINI_API_KEY and 'gemini_model' in globals():
-        return generate_gemini_analysis(case_details, ipc_section_ids, precedent_ids)
+    Generate a legal analysis like generate_legal_analysis, and report whether
+    the language model wrote it or the template fallback was used
     
-    # Fall back to template-based generation if Gemini is not available
-    return generate_template_analysis(case_details, ipc_section_ids, precedent_ids)
+    Returns:
+        tuple: (HTML analysis, True if it came from the language model)
+    """
+    # Check if a language model provider is configured (see llm_client)
+    if not llm_client.available():
+        # Fall back to template-based generation if no language model is available
+        FALLBACKS.inc(use='analysis', reason='unavailable')
+        return generate_template_analysis(case_details, ipc_section_ids, precedent_ids), False
+    
+    try:
+        return generate_model_analysis(case_details, ipc_section_ids, precedent_ids), True
+    except LLMUnavailable as e:
+        logging.warning("Serving the template analysis: %s", str(e))
+        FALLBACKS.inc(use='analysis', reason=e.reason)
+    except Exception as e:
+        logging.error("Error generating analysis with the language model: %s", str(e))
+        # Fall back to template-based generation if the language model fails
+        FALLBACKS.inc(use='analysis', reason='error')
+    return generate_template_analysis(case_details, ipc_section_ids, precedent_ids), False
 
-def generate_gemini_analysis(case_details, ipc_section_ids, precedent_ids):
+def build_analysis_prompt(case_details, ipc_section_ids, precedent_ids):
     """
-    Generate a legal analysis using Google's Gemini AI based on case details, 
+    Build the Gemini prompt for a case analysis from the case details,
     relevant IPC sections, and legal precedents.
     """
     # Get case type and details for personalization
@@ -664,15 +564,50 @@ def generate_gemini_analysis(case_details, ipc_section_ids, precedent_ids):
     
     This analysis should feel like it was prepared by an experienced legal professional who has thoroughly reviewed the specific case and is providing thoughtful, customized guidance.
     """
+    return prompt
+
+def generate_model_analysis(case_details, ipc_section_ids, precedent_ids):
+    """
+    Generate a legal analysis with the configured language model only. Unlike
+    generate_legal_analysis there is no template fallback: LLMUnavailable or
+    the provider's error is raised instead.
+    """
+    prompt = build_analysis_prompt(case_details, ipc_section_ids, precedent_ids)
+    # Generate analysis through the shared client (deadline, retries, circuit breaker)
+    return llm_client.generate(prompt, use='analysis')
+
+def stream_legal_analysis(case_details, ipc_section_ids, precedent_ids):
+    """
+    Generate a legal analysis like generate_legal_analysis, but yield the
+    text in chunks as the language model produces them so they can be forwarded
+    to the client immediately. Without a language model, or if it fails before
+    producing any output, the template analysis is yielded as a single chunk.
+    The generator returns True if the language model wrote the analysis.
+    """
+    if not llm_client.available():
+        FALLBACKS.inc(use='analysis', reason='unavailable')
+        yield generate_template_analysis(case_details, ipc_section_ids, precedent_ids)
+        return False
     
+    prompt = build_analysis_prompt(case_details, ipc_section_ids, precedent_ids)
+    produced_output = False
     try:
-        # Generate analysis using Gemini
-        response = gemini_model.generate_content(prompt)
-        return response.text
+        for text in llm_client.stream(prompt, use='analysis'):
+            produced_output = True
+            yield text
+        return True
+    except LLMUnavailable as e:
+        logging.warning("Serving the template analysis: %s", str(e))
+        FALLBACKS.inc(use='analysis', reason=e.reason)
+        yield generate_template_analysis(case_details, ipc_section_ids, precedent_ids)
     except Exception as e:
-        print(f"Error generating analysis with Gemini: {str(e)}")
-        # Fall back to template-based generation if Gemini fails
-        return generate_template_analysis(case_details, ipc_section_ids, precedent_ids)
+        logging.error("Error streaming analysis with the language model: %s", str(e))
+        # Text already sent cannot be replaced, so only fall back before the first chunk
+        if produced_output:
+            raise
+        FALLBACKS.inc(use='analysis', reason='error')
+        yield generate_template_analysis(case_details, ipc_section_ids, precedent_ids)
+    return False
 
 def generate_template_analysis(case_details, ipc_section_ids, precedent_ids):
     """
@@ -693,62 +628,19 @@ def generate_template_analysis(case_details, ipc_section_ids, precedent_ids):
     evidence_summary = case_details.get('evidence_summary', '')
     
     # Extract specific items, locations, or circumstances from the descriptions for personalization
-    specific_details = {}
-    
-    # Look for smartphone/phone details
-    phone_match = re.search(r'(smartphone|phone|mobile|cell phone|iphone|samsung|galaxy|pixel|oneplus|mi|redmi|vivo|oppo)(\s+\w+)?\s+(s\d+|note\s*\d+|\d+|pro|max|ultra)', offense_description, re.I)
-    if phone_match:
-        specific_details['phone_model'] = phone_match.group(0)
-    elif 'phone' in offense_description or 'mobile' in offense_description:
+    # (phone/device/vehicle/valuables, locations, times, IMEI, delayed discovery, injuries)
+    specific_details = scoring_rules.extract_template_details(offense_description)
+    if 'phone_model' not in specific_details and ('phone' in offense_description or 'mobile' in offense_description):
         specific_details['phone_model'] = 'phone'
     
-    # Look for other electronic devices
-    device_match = re.search(r'(laptop|computer|tablet|ipad|macbook|camera|smartwatch|watch|airpods|headphones|tv|console)', offense_description, re.I)
-    if device_match:
-        specific_details['device'] = device_match.group(0)
-    
-    # Look for vehicle details
-    vehicle_match = re.search(r'(car|bike|motorcycle|scooter|bicycle|auto|truck|van)(\s+\w+)?', offense_description, re.I)
-    if vehicle_match:
-        specific_details['vehicle'] = vehicle_match.group(0)
-    
-    # Look for jewelry/valuables
-    valuables_match = re.search(r'(jewelry|gold|silver|diamond|necklace|ring|bracelet|chain|watch|purse|wallet|cash|money|bag|handbag|backpack)', offense_description, re.I)
-    if valuables_match:
-        specific_details['valuables'] = valuables_match.group(0)
-    
-    # Look for specific locations
-    location_match = re.search(r'(mall|shop|store|market|restaurant|hotel|house|apartment|office|building|street|road|park|station|bus|train|metro|theater|cinema|hospital|bank|atm|school|college)', offense_description, re.I)
-    if location_match:
-        specific_details['specific_location'] = location_match.group(0)
-    
-    # Look for time references
-    time_match = re.search(r'(morning|afternoon|evening|night|midnight|dawn|dusk|(\d{1,2}\s*(am|pm|o\'clock)))', offense_description, re.I)
-    if time_match:
-        specific_details['time_of_day'] = time_match.group(0)
-    
-    # Extract IMEI or identification numbers if mentioned
-    id_match = re.search(r'(imei|serial number|identification number|id number)', offense_description, re.I)
-    if id_match:
-        specific_details['has_id_number'] = True
-    
-    # Extract when they noticed the theft/incident
-    notice_match = re.search(r'noticed|realized|found out|discovered.{1,30}(after|later|missing)', offense_description, re.I)
-    if notice_match:
-        specific_details['delayed_discovery'] = True
-    
-    # Analysis of injuries for assault cases
-    injury_match = re.search(r'(injur(y|ies|ed)|hurt|wound|bruise|cut|bleeding|pain|hospital|doctor|medical)', offense_description, re.I)
-    if injury_match:
-        specific_details['has_injuries'] = True
-    
     # Determine distinctive case patterns for personalized responses
-    is_violent_case = any(word in query for word in ["hit", "beat", "attack", "hurt", "injure", "wound", "punch", "assault", "slap", "fight", "violence"])
-    is_theft_case = any(word in query for word in ["steal", "theft", "stole", "took", "robbed", "shoplifting", "missing", "burglar", "snatch", "pickpocket"])
-    is_fraud_case = any(word in query for word in ["fraud", "cheat", "deceive", "scam", "fake", "false", "misled", "lied", "trick", "ponzi", "scheme"])
-    is_harassment_case = any(word in query for word in ["harass", "stalk", "follow", "threat", "intimidate", "scare", "fear", "message", "call", "verbal"])
-    is_sexual_case = any(word in query for word in ["rape", "molest", "touch", "sexual", "modesty", "consent", "force", "inappropriate", "harass", "eve teasing"])
-    is_dowry_case = any(word in query for word in ["dowry", "bride", "marriage", "husband", "wife", "in-law", "gift", "demand", "harassment", "matrimonial"])
+    case_flags = scoring_rules.case_flags(query)
+    is_violent_case = case_flags['is_violent_case']
+    is_theft_case = case_flags['is_theft_case']
+    is_fraud_case = case_flags['is_fraud_case']
+    is_harassment_case = case_flags['is_harassment_case']
+    is_sexual_case = case_flags['is_sexual_case']
+    is_dowry_case = case_flags['is_dowry_case']
     
     # Dynamic title based on case type
     title_variations = {